@@ -0,0 +1,91 @@
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+# Cold-start benchmark of the market_risk CLI. Each case runs in a fresh
+# interpreter (best of --repeat runs), so what it measures is what a cron job
+# or container entry point pays before doing any work:
+#   python bench_imports.py                    # wall time per case
+#   python bench_imports.py --importtime       # plus the slowest imports of each case
+#   python bench_imports.py --max-seconds 0.3  # exits 1 when a --help case is slower
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.normpath(os.path.join(HERE, '..'))
+SOURCE_PATH = os.pathsep.join([BACKEND_DIR, os.path.join(BACKEND_DIR, 'dataset'), os.path.join(BACKEND_DIR, 'model')])
+
+# (name, interpreter arguments); --help cases must stay free of heavy imports
+HELP_CASES = [
+    ("python -c pass", ["-c", "pass"]),
+    ("import market_risk.cli", ["-c", "import market_risk.cli"]),
+    ("market_risk --help", ["-m", "market_risk", "--help"]),
+] + [(f"market_risk {command} --help", ["-m", "market_risk", command, "--help"])
+     for command in ("fetch", "train", "stats", "predict")] + [
+    # The scripts server.js runs hand over to the CLI before their own imports
+    ("fetch_latest_data.py --help", [os.path.join("dataset", "fetch_latest_data.py"), "--help"]),
+    ("train_update.py --help", [os.path.join("model", "train_update.py"), "--help"]),
+]
+
+# What each command imports once it runs (no MongoDB or network access)
+COMMAND_CASES = [
+    ("fetch imports", ["-c", "import fetch_latest_data, sensex_store"]),
+    ("train imports", ["-c", "import train_update"]),
+    ("stats imports", ["-c", "import model_stats, artifacts"]),
+    ("predict imports", ["-c", "from inference_server import InferenceService"]),
+]
+
+
+def run(args, importtime=False):
+    """(seconds, stderr) of one fresh interpreter"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SOURCE_PATH, os.environ.get('PYTHONPATH')])))
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + args
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} exited {result.returncode}: {result.stderr.strip()[-500:]}")
+    return elapsed, result.stderr
+
+
+def slowest_imports(stderr, top):
+    """Top-level packages by total self import time, from -X importtime output"""
+    totals = {}
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+\d+ \| *(\S+)", line)
+        if match:
+            package = match.group(2).split('.')[0]
+            totals[package] = totals.get(package, 0) + int(match.group(1))
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+def main(repeat=5, importtime=False, top=5, max_seconds=None, commands=True):
+    cases = HELP_CASES + (COMMAND_CASES if commands else [])
+    results, slow = {}, []
+    print(f"{'case':<32} {'best':>8} {'median':>8}")
+    for name, args in cases:
+        times = sorted(run(args)[0] for _ in range(repeat))
+        results[name] = times[0]
+        print(f"{name:<32} {times[0]:>7.3f}s {times[len(times) // 2]:>7.3f}s")
+        if importtime:
+            for module, micros in slowest_imports(run(args, importtime=True)[1], top):
+                print(f"    {module:<28} {micros / 1e6:>7.3f}s")
+        if max_seconds is not None and (name, args) in HELP_CASES and times[0] > max_seconds:
+            slow.append(name)
+    if slow:
+        print(f"[ERROR] Slower than {max_seconds}s: {', '.join(slow)}")
+    return results, slow
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start time of the market_risk CLI")
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per case; the best is reported')
+    parser.add_argument('--importtime', action='store_true', help='Show the slowest imports of each case')
+    parser.add_argument('--top', type=int, default=5, help='Imports shown per case with --importtime')
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='Exit 1 when a --help case takes longer than this')
+    parser.add_argument('--help-only', action='store_true', help='Skip the per-command import cases')
+    args = parser.parse_args()
+    _, slow = main(args.repeat, args.importtime, args.top, args.max_seconds, not args.help_only)
+    sys.exit(1 if slow else 0)
@@ -0,0 +1,320 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.normpath(os.path.join(HERE, '..', 'dataset')))
+sys.path.append(os.path.normpath(os.path.join(HERE, '..', 'model')))
+import db
+import features
+import ohlcv_store
+import sensex_store
+import fetch_latest_data
+import train_update
+from stats_publisher import StatsPublisher
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import train_test_split
+
+from synthetic import OfflineSource, synthetic_panel
+from fake_mongo import FakeMongoClient
+
+# Offline per-stage benchmarks of the ingestion and training pipeline.
+# Prices come from the seeded synthetic generator through the OHLCV store's
+# pluggable source, MongoDB is the in-memory stand-in, and nothing touches the
+# network. Timings can be saved as a baseline and later runs compared to it:
+#   python bench_pipeline.py --save-baseline
+#   python bench_pipeline.py --threshold 0.2     # exits 1 on a regression
+
+DEFAULT_BASELINE = os.path.join(HERE, 'results', 'baseline.json')
+
+# Rows of history used for model_stats (about a year, like save_model_stats)
+STATS_BARS = 252
+
+# Columns the read stages load into a panel
+READ_COLUMNS = ["Close", "Return", "Volatility", "Risk_Code"]
+
+# Differences below this many seconds are treated as noise
+MIN_DELTA = 0.005
+
+
+class Workload:
+    """Synthetic inputs for one (bars x tickers) size, built once and shared by the stages"""
+
+    def __init__(self, bars, tickers, seed=42):
+        self.bars = bars
+        self.source = OfflineSource(bars, seed)
+        self.frames = synthetic_panel(tickers, bars, seed)
+        self.tickers = list(self.frames)
+        self._cache = {}
+
+    def _get(self, name, build):
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+    @property
+    def ingested(self):
+        return self._get('ingested', lambda: features.compute_panel_features(self.frames, features.INGEST_FEATURES))
+
+    @staticmethod
+    def _label(ingested):
+        """Labelled documents as store_ticker_frame prepares them"""
+        rows = {}
+        for t, df in ingested.items():
+            df = df.dropna().reset_index()
+            df['Risk_Code'], df['Risk_Label'] = fetch_latest_data.assign_risk_label(df['Return'])
+            df['High_Risk'] = (df['Risk_Code'] == 2).astype(int)
+            df['Ticker'] = t
+            df['Last_Updated'] = datetime(2025, 1, 1)
+            rows[t] = df
+        return rows
+
+    @property
+    def rows(self):
+        return self._get('rows', lambda: self._label(self.ingested))
+
+    def daily_rows(self, day):
+        """Rows of the daily ingest on `day` (0 or 1): the next day's history has one
+        more bar and its window starts one bar later, as fetch_latest_data.main's does"""
+        def build():
+            frames = {t: df.iloc[:len(df) - 1 + day] for t, df in self.frames.items()}
+            start = self.frames[self.tickers[0]].index[self.bars // 10 + day]
+            return self._label(fetch_latest_data.window_features(frames, start))
+        return self._get(f'daily_rows_{day}', build)
+
+    @property
+    def engineered(self):
+        return self._get('engineered', lambda: {
+            t: train_update.engineer_features(df) for t, df in self.frames.items()
+        })
+
+    @property
+    def labelled(self):
+        return self._get('labelled', lambda: {
+            t: train_update.label_risk(df.copy()) for t, df in self.engineered.items()
+        })
+
+
+# Stages: name -> (setup(workload) -> state, run(workload, state))
+
+def _fresh_store(workload):
+    ohlcv_store.clear_cache()
+    ohlcv_store.set_source(workload.source)
+
+
+def _fetch(workload, state):
+    start, end = workload.source.range
+    for t in workload.tickers:
+        ohlcv_store.get_ohlcv(t, start, end)
+
+
+def _warm_store(workload):
+    _fresh_store(workload)
+    _fetch(workload, None)
+
+
+def _fresh_collection(workload):
+    return FakeMongoClient()['bench']['sensex_data']
+
+
+def _yesterday_collection(workload):
+    collection = _fresh_collection(workload)
+    for t, df in workload.daily_rows(0).items():
+        fetch_latest_data.write_ticker_frame(t, df, collection)
+    return collection
+
+
+def _write_today(workload, collection):
+    for t, df in workload.daily_rows(1).items():
+        fetch_latest_data.write_ticker_frame(t, df, collection)
+
+
+def _write_rows(workload, collection):
+    for t, df in workload.rows.items():
+        fetch_latest_data.write_ticker_frame(t, df, collection)
+
+
+def _write_buckets(workload, collection):
+    for t, df in workload.rows.items():
+        fetch_latest_data.write_bucket_frame(t, df, collection)
+
+
+def _write_timeseries(workload, collection):
+    for t, df in workload.rows.items():
+        fetch_latest_data.write_timeseries_frame(t, df, collection)
+
+
+def _stored(writer):
+    """Setup that writes the workload with `writer` and returns the collection"""
+    def setup(workload):
+        collection = _fresh_collection(workload)
+        writer(workload, collection)
+        return collection
+    return setup
+
+
+def _reader(storage):
+    def run(workload, collection):
+        sensex_store.load_panel(workload.tickers, READ_COLUMNS, storage=storage, collection=collection)
+    return run
+
+
+def _train(workload, state):
+    for data in workload.labelled.values():
+        feature_cols = [c for c in data.columns if c != 'Risk']
+        X_scaled = StandardScaler().fit_transform(data[feature_cols])
+        X_train, _, y_train, _ = train_test_split(
+            X_scaled, data['Risk'], test_size=0.2, stratify=data['Risk'], random_state=42
+        )
+        train_update.make_classifier().fit(X_train, y_train)
+
+
+def _model_stats(workload, collection):
+    recent = {t: df.iloc[-STATS_BARS:] for t, df in workload.frames.items()}
+    docs = train_update.stats_documents(recent, {t: 50.0 for t in recent})
+    publisher = StatsPublisher(collection)
+    publisher.extend(docs.values())
+    publisher.publish()
+
+
+STAGES = {
+    'fetch_cold': (_fresh_store, _fetch),
+    'fetch_warm': (_warm_store, _fetch),
+    'ingest_features': (None, lambda w, s: features.compute_panel_features(w.frames, features.INGEST_FEATURES)),
+    'compute_technical_indicators': (None, lambda w, s: [
+        fetch_latest_data.compute_technical_indicators(df) for df in w.frames.values()
+    ]),
+    'assign_risk_label': (None, lambda w, s: [
+        fetch_latest_data.assign_risk_label(df['Return'].dropna()) for df in w.ingested.values()
+    ]),
+    'write_rows': (_fresh_collection, _write_rows),
+    # Next day's write over the previous day's rows; only the new bar should change
+    'rewrite_unchanged': (_yesterday_collection, _write_today),
+    'write_timeseries': (_fresh_collection, _write_timeseries),
+    'write_buckets': (_fresh_collection, _write_buckets),
+    'read_rows': (_stored(_write_rows), _reader('rows')),
+    'read_buckets': (_stored(_write_buckets), _reader('buckets')),
+    'engineer_features': (None, lambda w, s: [train_update.engineer_features(df) for df in w.frames.values()]),
+    'label_risk': (None, lambda w, s: [train_update.label_risk(df.copy()) for df in w.engineered.values()]),
+    'train': (None, _train),
+    'save_model_stats': (lambda w: FakeMongoClient()['bench']['model_stats'], _model_stats),
+}
+
+
+def stage_rows(stage, bars, tickers):
+    """Input rows a stage processes, for the rows/s column"""
+    return (min(bars, STATS_BARS) if stage == 'save_model_stats' else bars) * tickers
+
+
+def measure(workload, stage, repeat):
+    """Best wall time of `repeat` runs, setup excluded; stage output is silenced"""
+    setup, run = STAGES[stage]
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            state = setup(workload) if setup else None
+            started = time.perf_counter()
+            run(workload, state)
+            timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def environment():
+    import xgboost
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "xgboost": xgboost.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Stages slower than baseline * (1 + threshold); returns [(key, baseline, current)]"""
+    regressions = []
+    for key, seconds in results.items():
+        before = baseline.get(key)
+        if before is not None and seconds > before * (1 + threshold) and seconds - before > MIN_DELTA:
+            regressions.append((key, before, seconds))
+    return regressions
+
+
+def main(bars_list, tickers, stages, repeat, seed, baseline_path, save_baseline, threshold):
+    db.set_client(FakeMongoClient())
+    # The store writes into a scratch directory, never the real cache
+    cache_dir = ohlcv_store.CACHE_DIR
+    ohlcv_store.CACHE_DIR = tempfile.mkdtemp(prefix='bench-ohlcv-')
+    baseline = {}
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    print(f"{'stage':<30} {'size':>14} {'seconds':>9} {'rows/s':>11} {'vs baseline':>12}")
+    try:
+        for bars in bars_list:
+            workload = Workload(bars, tickers, seed)
+            for stage in stages:
+                key = f"{stage}[{bars}x{tickers}]"
+                seconds = measure(workload, stage, repeat)
+                results[key] = seconds
+                change = ""
+                if key in baseline and not save_baseline:
+                    change = f"{(seconds / baseline[key] - 1) * 100:+.1f}%"
+                print(f"{stage:<30} {f'{bars}x{tickers}':>14} {seconds:>9.4f} "
+                      f"{stage_rows(stage, bars, tickers) / seconds:>11,.0f} {change:>12}")
+    finally:
+        ohlcv_store.set_source(None)
+        shutil.rmtree(ohlcv_store.CACHE_DIR, ignore_errors=True)
+        ohlcv_store.CACHE_DIR = cache_dir
+
+    if save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump({
+                "saved_at": datetime.now().isoformat(timespec='seconds'),
+                "environment": environment(),
+                "repeat": repeat,
+                # Sizes not measured in this run keep their previous timings
+                "results": {**baseline, **results},
+            }, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+
+    regressions = compare(results, baseline, threshold)
+    for key, before, now in regressions:
+        print(f"[REGRESSION] {key}: {before:.4f}s -> {now:.4f}s ({(now / before - 1) * 100:+.1f}%)")
+    if baseline and not regressions:
+        print(f"No regressions beyond {threshold:.0%} of the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline per-stage pipeline benchmarks")
+    parser.add_argument('--bars', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help='History lengths (bars per ticker)')
+    parser.add_argument('--tickers', type=int, default=4, help='Number of synthetic tickers')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='Stages to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    parser.add_argument('--seed', type=int, default=42, help='Synthetic data seed')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown relative to the baseline before failing')
+    args = parser.parse_args()
+    sys.exit(main(args.bars, args.tickers, args.stages, args.repeat, args.seed,
+                  args.baseline, args.save_baseline, args.threshold))
@@ -0,0 +1,228 @@
+import copy
+import itertools
+from types import SimpleNamespace
+
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateOne
+
+# In-memory stand-in for the parts of pymongo the pipeline uses: find with
+# equality/$in/range filters and inclusion projections (one level of dotted
+# paths), update_one, bulk_write with Insert/Replace/Update/Delete operations,
+# and index management. Lookups on equality filters go through a hash index per
+# field set, so upserting 100k rows stays linear. Install with
+# db.set_client(FakeMongoClient()).
+
+
+def _matches(doc, query):
+    for field, cond in query.items():
+        value = doc.get(field)
+        if isinstance(cond, dict):
+            for op, arg in cond.items():
+                if op == "$in":
+                    if value not in arg:
+                        return False
+                elif op == "$gte":
+                    if value is None or value < arg:
+                        return False
+                elif op == "$lte":
+                    if value is None or value > arg:
+                        return False
+                else:
+                    raise NotImplementedError(f"Unsupported query operator {op}")
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.copy(doc)
+    included = [f for f, on in projection.items() if on and f != "_id"]
+    out = {}
+    for path in included:
+        # "a.b" includes field b of the embedded document a
+        field, _, sub = path.partition(".")
+        if field not in doc:
+            continue
+        if sub and isinstance(doc[field], dict):
+            if sub in doc[field]:
+                out.setdefault(field, {})[sub] = doc[field][sub]
+        else:
+            out[field] = doc[field]
+    if projection.get("_id", 1) and "_id" in doc:
+        out["_id"] = doc["_id"]
+    return out
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self._docs = {}
+        self._ids = itertools.count(1)
+        # field names -> {field values: set of _id}
+        self._lookup = {}
+        self._indexes = {"_id_": {"key": [("_id", 1)]}}
+
+    # Indexing
+
+    def _key(self, fields, doc):
+        return tuple(doc.get(f) for f in fields)
+
+    def _lookup_for(self, fields):
+        if fields not in self._lookup:
+            table = {}
+            for _id, doc in self._docs.items():
+                table.setdefault(self._key(fields, doc), set()).add(_id)
+            self._lookup[fields] = table
+        return self._lookup[fields]
+
+    def _index_add(self, doc):
+        for fields, table in self._lookup.items():
+            table.setdefault(self._key(fields, doc), set()).add(doc["_id"])
+
+    def _index_remove(self, doc):
+        for fields, table in self._lookup.items():
+            ids = table.get(self._key(fields, doc))
+            if ids:
+                ids.discard(doc["_id"])
+
+    def _candidates(self, query):
+        equal = tuple(sorted(f for f, c in query.items() if not isinstance(c, dict)))
+        if equal:
+            ids = self._lookup_for(equal).get(tuple(query[f] for f in equal), ())
+            docs = [self._docs[i] for i in sorted(ids)]
+        else:
+            docs = list(self._docs.values())
+        return [d for d in docs if _matches(d, query)]
+
+    # Reads
+
+    def find(self, filter=None, projection=None):
+        return [_project(d, projection) for d in self._candidates(filter or {})]
+
+    def find_one(self, filter=None, projection=None):
+        found = self.find(filter, projection)
+        return found[0] if found else None
+
+    def count_documents(self, filter):
+        return len(self._candidates(filter))
+
+    # Writes
+
+    def _insert(self, doc):
+        doc = dict(doc)
+        doc.setdefault("_id", next(self._ids))
+        self._docs[doc["_id"]] = doc
+        self._index_add(doc)
+        return doc["_id"]
+
+    def _replace(self, old, new):
+        new = dict(new, _id=old["_id"])
+        if new == old:
+            return False
+        self._index_remove(old)
+        self._docs[old["_id"]] = new
+        self._index_add(new)
+        return True
+
+    def _upsert_doc(self, query):
+        return {f: c for f, c in query.items() if not isinstance(c, dict)}
+
+    def insert_many(self, docs, ordered=True):
+        return SimpleNamespace(inserted_ids=[self._insert(d) for d in docs])
+
+    def replace_one(self, filter, replacement, upsert=False):
+        return self.bulk_write([ReplaceOne(filter, replacement, upsert=upsert)])
+
+    def update_one(self, filter, update, upsert=False):
+        return self.bulk_write([UpdateOne(filter, update, upsert=upsert)])
+
+    def delete_many(self, filter):
+        return self.bulk_write([DeleteMany(filter)])
+
+    def bulk_write(self, requests, ordered=True):
+        counts = dict(inserted=0, matched=0, modified=0, deleted=0, upserted=0)
+        for op in requests:
+            if isinstance(op, InsertOne):
+                self._insert(op._doc)
+                counts["inserted"] += 1
+            elif isinstance(op, (ReplaceOne, UpdateOne)):
+                found = self._candidates(op._filter)[:1]
+                if isinstance(op, UpdateOne):
+                    unsupported = set(op._doc) - {"$set"}
+                    if unsupported:
+                        raise NotImplementedError(f"Unsupported update operators {unsupported}")
+                if found:
+                    old = found[0]
+                    new = dict(op._doc) if isinstance(op, ReplaceOne) else {**old, **op._doc["$set"]}
+                    counts["matched"] += 1
+                    counts["modified"] += self._replace(old, new)
+                elif op._upsert:
+                    base = self._upsert_doc(op._filter)
+                    new = {**base, **op._doc} if isinstance(op, ReplaceOne) else {**base, **op._doc["$set"]}
+                    self._insert(new)
+                    counts["upserted"] += 1
+            elif isinstance(op, (DeleteOne, DeleteMany)):
+                found = self._candidates(op._filter)
+                if isinstance(op, DeleteOne):
+                    found = found[:1]
+                for doc in found:
+                    self._index_remove(doc)
+                    del self._docs[doc["_id"]]
+                counts["deleted"] += len(found)
+            else:
+                raise NotImplementedError(f"Unsupported bulk operation {type(op).__name__}")
+        return SimpleNamespace(
+            inserted_count=counts["inserted"], matched_count=counts["matched"],
+            modified_count=counts["modified"], deleted_count=counts["deleted"],
+            upserted_count=counts["upserted"],
+            upserted_id=None, acknowledged=True,
+        )
+
+    # Index management
+
+    def create_index(self, keys, unique=False, name=None):
+        name = name or "_".join(f"{f}_{d}" for f, d in keys)
+        self._indexes[name] = {"key": list(keys), "unique": unique}
+        return name
+
+    def index_information(self):
+        return copy.deepcopy(self._indexes)
+
+    def drop_index(self, name):
+        self._indexes.pop(name, None)
+
+    def drop(self):
+        self.__init__(self.name)
+
+
+class FakeDatabase:
+    def __init__(self, name):
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+    def create_collection(self, name, **options):
+        # Options such as timeseries are accepted and ignored
+        collection = self[name]
+        collection.options = options
+        return collection
+
+    def list_collection_names(self):
+        return list(self._collections)
+
+
+class FakeMongoClient:
+    def __init__(self, *args, **kwargs):
+        self._databases = {}
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = FakeDatabase(name)
+        return self._databases[name]
+
+    def close(self):
+        pass
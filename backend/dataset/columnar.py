@@ -0,0 +1,139 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+from bson.binary import Binary
+
+# Encoders that turn a labelled ticker frame into MongoDB documents without
+# materializing the whole frame as Python objects.
+#
+# Row documents (one per ticker per day) are built chunk by chunk straight from
+# the column arrays. The compact (bucketed) schema stores one document per
+# ticker per calendar month or year instead:
+#   {Ticker, Period: "2024-05" or "2024", Start, End, Count, Version, Batch_Hash,
+#    Date: <int32 days since 1970-01-01>, Columns: {name: <little-endian array>},
+#    Dtypes: {name: numpy dtype string}}
+# Values are float32 unless a column needs float64, Risk_Code is int8, and the
+# derived fields (Risk_Label, High_Risk, Ticker, Row_Hash) are not stored;
+# decode_batch() adds them back.
+
+COMPACT_VERSION = 1
+
+# Bucket granularity -> numpy datetime unit of the Period key
+PERIOD_UNITS = {"month": "M", "year": "Y"}
+
+RISK_LABELS = np.array(["Low", "Medium", "High"], dtype=object)
+
+# Recomputed on read, never stored in the compact schema
+DERIVED_COLUMNS = ["Risk_Label", "High_Risk", "Ticker", "Row_Hash"]
+
+# Columns float32 cannot hold exactly (volumes pass 2**24 routinely)
+FLOAT64_COLUMNS = {"Volume"}
+
+# Explicit compact dtypes; other numeric columns are float32
+COMPACT_DTYPES = {"Risk_Code": np.dtype("<i1")}
+
+
+def _python_values(values):
+    """Array slice as a list of BSON-encodable Python objects"""
+    if np.issubdtype(values.dtype, np.datetime64):
+        return list(pd.DatetimeIndex(values).to_pydatetime())
+    return values.tolist()
+
+
+def iter_records(df, chunk_size=1000):
+    """Yield lists of at most `chunk_size` row documents built from the column arrays"""
+    names = list(df.columns)
+    arrays = [df[name].to_numpy() for name in names]
+    for start in range(0, len(df), chunk_size):
+        columns = [_python_values(values[start:start + chunk_size]) for values in arrays]
+        yield [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def compact_dtype(name, values):
+    if name in COMPACT_DTYPES:
+        return COMPACT_DTYPES[name]
+    if name in FLOAT64_COLUMNS or values.dtype.kind not in "fiub":
+        return np.dtype("<f8")
+    return np.dtype("<f4")
+
+
+def compact_arrays(df):
+    """(int32 day numbers, {column: array in its compact dtype}) for a frame with a Date column"""
+    days = df["Date"].to_numpy(dtype="datetime64[D]").astype(np.int64).astype("<i4")
+    arrays = {}
+    for name in df.columns:
+        if name == "Date" or name in DERIVED_COLUMNS:
+            continue
+        values = df[name].to_numpy()
+        arrays[name] = np.ascontiguousarray(values, dtype=compact_dtype(name, values))
+    return days, arrays
+
+
+def _encode(ticker, days, arrays, unit="M"):
+    first, last = days[[0, -1]].astype("datetime64[D]")
+    digest = hashlib.sha1(days.tobytes())
+    columns = {}
+    for name, values in arrays.items():
+        raw = values.tobytes()
+        digest.update(name.encode())
+        digest.update(raw)
+        columns[name] = Binary(raw)
+    return {
+        "Ticker": ticker,
+        "Period": str(first.astype(f"datetime64[{unit}]")),
+        "Start": pd.Timestamp(first).to_pydatetime(),
+        "End": pd.Timestamp(last).to_pydatetime(),
+        "Count": len(days),
+        "Version": COMPACT_VERSION,
+        "Batch_Hash": digest.hexdigest(),
+        "Date": Binary(days.tobytes()),
+        "Columns": columns,
+        "Dtypes": {name: values.dtype.str for name, values in arrays.items()},
+    }
+
+
+def encode_batch(ticker, df, period="month"):
+    """One compact document for the rows of `df` (Date column plus values)"""
+    return _encode(ticker, *compact_arrays(df), PERIOD_UNITS[period])
+
+
+def iter_batches(ticker, df, period="month"):
+    """Yield one compact document per calendar month (or year) of a date-sorted frame"""
+    if df.empty:
+        return
+    unit = PERIOD_UNITS[period]
+    # Columns are converted once; each bucket is a slice of the same arrays
+    days, arrays = compact_arrays(df)
+    buckets = days.astype("datetime64[D]").astype(f"datetime64[{unit}]")
+    bounds = np.concatenate([[0], np.flatnonzero(buckets[1:] != buckets[:-1]) + 1, [len(days)]])
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        yield _encode(ticker, days[start:stop], {name: values[start:stop] for name, values in arrays.items()}, unit)
+
+
+def decode_arrays(doc, columns=None):
+    """(datetime64[ns] dates, {column: stored array}) of one compact document, without copying values"""
+    dates = np.frombuffer(doc["Date"], dtype="<i4").astype("datetime64[D]").astype("datetime64[ns]")
+    arrays = {
+        name: np.frombuffer(raw, dtype=doc["Dtypes"][name])
+        for name, raw in doc["Columns"].items()
+        if columns is None or name in columns
+    }
+    return dates, arrays
+
+
+def add_derived(frame, ticker):
+    """Add the fields the compact schema drops back to a decoded frame"""
+    if "Risk_Code" in frame:
+        codes = frame["Risk_Code"].to_numpy()
+        frame["Risk_Label"] = RISK_LABELS[codes]
+        frame["High_Risk"] = (codes == 2).astype(int)
+    frame["Ticker"] = ticker
+    return frame
+
+
+def decode_batch(doc, columns=None, derived=True):
+    """DataFrame of one compact document; `columns` limits the value columns decoded"""
+    dates, arrays = decode_arrays(doc, columns)
+    frame = pd.DataFrame({"Date": dates, **arrays})
+    return add_derived(frame, doc["Ticker"]) if derived else frame
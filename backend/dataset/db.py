@@ -0,0 +1,92 @@
+import os
+import atexit
+import threading
+
+# Shared MongoDB connection for the dataset and model jobs.
+# One pooled client per process, created on first use, configured from the
+# environment so the same code runs inside docker-compose and locally:
+#   MONGO_URI                          connection string (default mongodb://mongo:27017/)
+#   MONGO_DB / dbName                  database name (dbName is what server.js reads)
+#   MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE
+#   MONGO_CONNECT_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS
+# pymongo itself is imported with the first client, so importing this module
+# (every job does, for instrumentation) costs nothing without a database.
+
+SENSEX_DATA = "sensex_data"
+# Alternative layouts of sensex_data (fetch_latest_data.py --storage)
+SENSEX_TIMESERIES = "sensex_data_ts"
+SENSEX_BUCKETS = "sensex_data_buckets"
+MODEL_STATS = "model_stats"
+PIPELINE_RUNS = "pipeline_runs"
+
+DEFAULT_URI = "mongodb://mongo:27017/"
+DEFAULT_DB = "market_risk_assessment"
+
+_client = None
+_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def settings():
+    """Connection settings from the environment"""
+    return {
+        "uri": os.environ.get("MONGO_URI", DEFAULT_URI),
+        # The database is named explicitly rather than taken from the URI path,
+        # so MONGO_URI=.../myDatabase in docker-compose does not move the data
+        "db": os.environ.get("MONGO_DB") or os.environ.get("dbName") or DEFAULT_DB,
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", 20),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", 0),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000),
+        "socketTimeoutMS": _env_int("MONGO_SOCKET_TIMEOUT_MS", 60000),
+    }
+
+
+def get_client():
+    """The process-wide MongoClient (thread-safe; pymongo pools connections internally)"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import pymongo
+                config = settings()
+                _client = pymongo.MongoClient(
+                    config["uri"],
+                    maxPoolSize=config["maxPoolSize"],
+                    minPoolSize=config["minPoolSize"],
+                    connectTimeoutMS=config["connectTimeoutMS"],
+                    serverSelectionTimeoutMS=config["serverSelectionTimeoutMS"],
+                    socketTimeoutMS=config["socketTimeoutMS"],
+                )
+    return _client
+
+
+def set_client(client):
+    """Use an existing client (e.g. a test double) instead of creating one"""
+    global _client
+    with _lock:
+        _client = client
+
+
+def get_db(name=None):
+    return get_client()[name or settings()["db"]]
+
+
+def get_collection(name, db_name=None):
+    return get_db(db_name)[name]
+
+
+def close():
+    """Close the shared client; the next get_client() opens a new one"""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close)
@@ -0,0 +1,110 @@
+import os
+import json
+import uuid
+import hashlib
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import features
+
+# Local feature store shared by the dataset job and model training.
+# One Parquet file per (ticker, feature-set version) holding the OHLCV columns
+# plus the engineered features, NaN warm-up rows already dropped. The date
+# range the features were computed over is kept in the file metadata; a read
+# is served when that range covers the requested one, otherwise the caller
+# computes the features and writes them back. The version combines
+# features.ENGINE_VERSION with a hash of the feature names, so changing either
+# the definitions or the set starts a new directory instead of mixing rows.
+STORE_DIR = os.environ.get(
+    "FEATURE_STORE_DIR",
+    os.path.normpath(os.path.join(os.path.dirname(__file__), "cache", "features"))
+)
+
+# Default start of the training window; the dataset job stores the training
+# features from here so a default training run finds them
+HISTORY_START = "2015-01-01"
+
+_META_KEY = b"feature_store"
+
+
+def feature_set_version(names):
+    digest = hashlib.sha1(",".join(names).encode()).hexdigest()[:8]
+    return f"v{features.ENGINE_VERSION}-{digest}"
+
+
+def _path(ticker, names):
+    return os.path.join(STORE_DIR, feature_set_version(names), f"{ticker}.parquet")
+
+
+def _day(value):
+    return pd.Timestamp(value).normalize()
+
+
+def stored_range(ticker, names):
+    """(start, end) the stored features were computed over, or None"""
+    path = _path(ticker, names)
+    if not os.path.exists(path):
+        return None
+    try:
+        meta = json.loads(pq.read_schema(path).metadata[_META_KEY])
+        return _day(meta["start"]), _day(meta["end"])
+    except Exception as e:
+        print(f"[WARNING] Ignoring unreadable feature store entry for {ticker}: {e}")
+        return None
+
+
+def read_features(ticker, names, start, end, columns=None):
+    """Stored frame for [start, end), or None when the store does not cover that range"""
+    start, end = _day(start), _day(end)
+    covered = stored_range(ticker, names)
+    if covered is None or covered[0] > start or covered[1] < end:
+        return None
+    # Memory-mapped, row groups outside the range skipped; float columns without
+    # nulls become pandas blocks without a copy
+    table = pq.read_table(
+        _path(ticker, names),
+        columns=None if columns is None else ["Date", *columns],
+        filters=[("Date", ">=", start), ("Date", "<", end)],
+        memory_map=True,
+    )
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def engineer(frames, names):
+    """{ticker: OHLCV plus features, warm-up rows dropped} for a {ticker: OHLCV frame} dict"""
+    return {t: df.dropna() for t, df in features.compute_panel_features(frames, names).items()}
+
+
+def write_features(ticker, frame, names, start, end):
+    """Store a Date-indexed frame of engineered features computed over [start, end)"""
+    path = _path(ticker, names)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(frame, preserve_index=True)
+    meta = dict(table.schema.metadata or {})
+    meta[_META_KEY] = json.dumps({
+        "ticker": ticker,
+        "version": feature_set_version(names),
+        "features": list(names),
+        "start": _day(start).strftime("%Y-%m-%d"),
+        "end": _day(end).strftime("%Y-%m-%d"),
+    }).encode()
+    table = table.replace_schema_metadata(meta)
+
+    # Write to a temporary file first so readers never see a partial file
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def clear(ticker=None):
+    """Remove one ticker (or every entry) from the store, across all versions"""
+    if not os.path.isdir(STORE_DIR):
+        return
+    for version in os.listdir(STORE_DIR):
+        directory = os.path.join(STORE_DIR, version)
+        for name in os.listdir(directory):
+            if ticker is None or name == f"{ticker}.parquet":
+                os.remove(os.path.join(directory, name))
@@ -0,0 +1,345 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from rolling_stats import rolling_quantiles
+
+# Feature engine shared by the dataset job and model training.
+# Indicators are computed for all tickers at once over a (bar x ticker) panel.
+# Each ticker's bars are right-aligned, so a shorter history only adds NaNs at
+# the top of its column and rolling windows never mix two tickers.
+
+# Bump when a feature definition changes so stored features can be told apart
+ENGINE_VERSION = 2
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+# Feature registry: name -> (function(ctx) -> 2D array, output dtype)
+FEATURES = {}
+
+
+def feature(name, dtype=np.float64):
+    """Register a panel feature under `name`"""
+    def register(fn):
+        FEATURES[name] = (fn, np.dtype(dtype))
+        return fn
+    return register
+
+
+# Columns stored in sensex_data by fetch_latest_data.py
+INGEST_FEATURES = [
+    "Return", "MA_5", "MA_10", "MA_50", "MA_200", "STD_5", "Range", "Range_Ratio",
+    "Price_to_MA5", "Price_to_MA10", "Momentum", "Volume_Change", "VaR_95",
+    "VaR_99", "VaR_90", "Volatility", "RSI", "MACD", "MACD_Signal", "BB_Upper", "BB_Lower", "ATR",
+]
+
+# Model inputs used by train_update.py (on top of the raw OHLCV columns)
+TRAIN_FEATURES = [
+    "Return", "Volatility_5", "MA_5", "MA_10", "EMA_5", "EMA_10",
+    "MACD", "MACD_Signal", "RSI",
+]
+
+
+class Panel:
+    """OHLCV fields for several tickers as (bar x ticker) float64 arrays"""
+
+    def __init__(self, frames, columns=OHLCV_COLUMNS):
+        self.tickers = list(frames)
+        self.index = {t: frames[t].index for t in self.tickers}
+        self.lengths = np.array([len(frames[t]) for t in self.tickers], dtype=np.int64)
+        self.n_bars = int(self.lengths.max()) if len(self.lengths) else 0
+        self.fields = {}
+        for col in columns:
+            if not any(col in frames[t].columns for t in self.tickers):
+                continue
+            values = np.full((self.n_bars, len(self.tickers)), np.nan)
+            for j, t in enumerate(self.tickers):
+                if col in frames[t].columns and len(frames[t]):
+                    values[self.n_bars - len(frames[t]):, j] = frames[t][col].to_numpy(dtype=np.float64)
+            self.fields[col] = values
+
+    def column(self, values, ticker):
+        """Rows of a panel array that belong to `ticker`"""
+        j = self.tickers.index(ticker)
+        return values[self.n_bars - self.lengths[j]:, j]
+
+
+class _Context(dict):
+    """Lazily computed feature arrays; features can depend on each other by name"""
+
+    def __init__(self, panel):
+        super().__init__(panel.fields)
+        self.panel = panel
+        # Intermediate results shared by several features
+        self.cache = {}
+
+    def __missing__(self, name):
+        if name not in FEATURES:
+            raise KeyError(f"Unknown feature or missing column: {name}")
+        fn, _ = FEATURES[name]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.asarray(fn(self), dtype=np.float64)
+        values[np.isinf(values)] = np.nan
+        self[name] = values
+        return values
+
+
+# Array kernels; every one works column-wise on a (bar x ticker) array
+
+def _shift(x, periods=1):
+    out = np.full_like(x, np.nan)
+    out[periods:] = x[:-periods]
+    return out
+
+
+def _pct_change(x):
+    return x / _shift(x) - 1
+
+
+def _rolling_mean(x, window):
+    valid = ~np.isnan(x)
+    sums = np.cumsum(np.where(valid, x, 0.0), axis=0)
+    counts = np.cumsum(valid, axis=0)
+    out = np.full_like(x, np.nan)
+    if len(x) < window:
+        return out
+    win_sums = sums[window - 1:].copy()
+    win_sums[1:] -= sums[:-window]
+    win_counts = counts[window - 1:].copy()
+    win_counts[1:] -= counts[:-window]
+    out[window - 1:] = np.where(win_counts == window, win_sums / window, np.nan)
+    return out
+
+
+def _rolling_apply(x, window, fn, chunk=4096):
+    # Strided windows reduced a chunk of rows at a time to bound the temporaries
+    out = np.full_like(x, np.nan)
+    if len(x) < window:
+        return out
+    windows = sliding_window_view(x, window, axis=0)
+    for s in range(0, len(windows), chunk):
+        out[window - 1 + s:window - 1 + s + chunk] = fn(windows[s:s + chunk])
+    return out
+
+
+def _rolling_std(x, window):
+    return _rolling_apply(x, window, lambda w: np.std(w, axis=-1, ddof=1))
+
+
+def _ewm(x, alpha, min_periods=0, block=64):
+    """pandas ewm(alpha=..., adjust=False).mean() for NaN-prefixed columns"""
+    n, k = x.shape
+    out = np.full_like(x, np.nan)
+    if n == 0:
+        return out
+    valid = ~np.isnan(x)
+    # Back-fill the NaN prefix with the first value: y[-1] = x[first] makes the
+    # recursion start exactly at the first observation, like pandas does
+    filled = pd.DataFrame(x).bfill().ffill().to_numpy()
+    filled = np.nan_to_num(filled)
+    decay = 1.0 - alpha
+
+    # Within a block y[s + j] = decay**(j+1) * y[s-1] + sum_i alpha * decay**(j-i) * x[s+i],
+    # so each block is one small matrix product instead of a Python loop per bar
+    lags = np.arange(block)[:, None] - np.arange(block)[None, :]
+    weights = np.where(lags >= 0, alpha * decay ** np.maximum(lags, 0), 0.0)
+    carry = decay ** np.arange(1, block + 1)
+    prev = filled[0]
+    for s in range(0, n, block):
+        chunk = filled[s:s + block]
+        m = len(chunk)
+        if m < block:
+            # A short last block still takes the full-size product: a product of
+            # another shape can round differently, and the same bars would get
+            # new last bits once a later bar is appended
+            chunk = np.vstack([chunk, np.zeros((block - m, k))])
+        ys = (weights @ chunk)[:m] + carry[:m, None] * prev
+        out[s:s + m] = ys
+        prev = ys[-1]
+
+    counts = np.cumsum(valid, axis=0)
+    out[counts < max(min_periods, 1)] = np.nan
+    return out
+
+
+def _wilder(x, window):
+    """Wilder smoothing seeded with the simple mean of the first `window` values"""
+    seed = _rolling_mean(x, window)
+    counts = np.cumsum(~np.isnan(x), axis=0)
+    start = counts == window
+    seeded = np.where(counts > window, x, np.nan)
+    seeded[start] = seed[start]
+    return _ewm(seeded, 1.0 / window)
+
+
+def _ema(x, span, min_periods=0):
+    return _ewm(x, 2.0 / (span + 1), min_periods)
+
+
+# Price and return features
+
+@feature("Return", np.float32)
+def _return(ctx):
+    return _pct_change(ctx["Close"])
+
+
+for _w in (5, 10, 20, 50, 200):
+    feature(f"MA_{_w}")(lambda ctx, w=_w: _rolling_mean(ctx["Close"], w))
+
+for _w in (5, 20):
+    feature(f"STD_{_w}")(lambda ctx, w=_w: _rolling_std(ctx["Close"], w))
+
+for _span in (5, 10):
+    feature(f"EMA_{_span}")(lambda ctx, span=_span: _ema(ctx["Close"], span))
+
+
+@feature("Range")
+def _range(ctx):
+    return ctx["High"] - ctx["Low"]
+
+
+@feature("Range_Ratio", np.float32)
+def _range_ratio(ctx):
+    return np.where(ctx["Close"] != 0, ctx["Range"] / ctx["Close"], 0)
+
+
+@feature("Price_to_MA5", np.float32)
+def _price_to_ma5(ctx):
+    return np.where(ctx["MA_5"] != 0, ctx["Close"] / ctx["MA_5"] - 1, 0)
+
+
+@feature("Price_to_MA10", np.float32)
+def _price_to_ma10(ctx):
+    return np.where(ctx["MA_10"] != 0, ctx["Close"] / ctx["MA_10"] - 1, 0)
+
+
+@feature("Momentum")
+def _momentum(ctx):
+    return ctx["Close"] - _shift(ctx["Close"], 5)
+
+
+@feature("Volume_Change", np.float32)
+def _volume_change(ctx):
+    if "Volume" not in ctx.panel.fields:
+        return np.zeros((ctx.panel.n_bars, len(ctx.panel.tickers)))
+    volume = ctx["Volume"]
+    change = _pct_change(volume)
+    # Tickers without volume data (e.g. indices) get 0 instead of NaN
+    return np.where(np.isnan(volume).all(axis=0), 0.0, change)
+
+
+# Risk features
+
+# Historical VaR over a rolling window of daily returns
+VAR_WINDOW = 250
+VAR_QUANTILES = {"VaR_99": 0.01, "VaR_95": 0.05, "VaR_90": 0.10}
+
+
+def _var(ctx, name):
+    if "var" not in ctx.cache:
+        returns = ctx["Return"]
+        qs = list(VAR_QUANTILES.values())
+        # All quantiles come out of one sorted-window pass per ticker
+        var = rolling_quantiles(returns, VAR_WINDOW, qs)
+        # Too little history for the rolling window: use the full-sample quantile
+        short = ctx.panel.lengths <= VAR_WINDOW
+        if short.any():
+            var[:, short] = np.nanquantile(returns[:, short], qs, axis=0).T
+        ctx.cache["var"] = dict(zip(VAR_QUANTILES, np.moveaxis(var, -1, 0)))
+    return ctx.cache["var"][name]
+
+
+for _name in VAR_QUANTILES:
+    feature(_name, np.float32)(lambda ctx, name=_name: _var(ctx, name))
+
+
+@feature("Volatility", np.float32)
+def _volatility(ctx):
+    return _rolling_std(ctx["Return"], 20)
+
+
+@feature("Volatility_5", np.float32)
+def _volatility_5(ctx):
+    return _rolling_std(ctx["Return"], 5)
+
+
+# Momentum and trend indicators (same definitions as the `ta` package)
+
+@feature("RSI", np.float32)
+def _rsi(ctx, window=14):
+    close = ctx["Close"]
+    diff = close - _shift(close)
+    observed = ~np.isnan(close)
+    up = np.where(observed, np.where(diff > 0, diff, 0.0), np.nan)
+    down = np.where(observed, np.where(diff < 0, -diff, 0.0), np.nan)
+    avg_up = _ewm(up, 1.0 / window, min_periods=window)
+    avg_down = _ewm(down, 1.0 / window, min_periods=window)
+    rsi = np.where(avg_down == 0, 100.0, 100 - 100 / (1 + avg_up / avg_down))
+    return np.where(np.isnan(avg_up) | np.isnan(avg_down), np.nan, rsi)
+
+
+@feature("MACD")
+def _macd(ctx):
+    return _ema(ctx["Close"], 12, 12) - _ema(ctx["Close"], 26, 26)
+
+
+@feature("MACD_Signal")
+def _macd_signal(ctx):
+    return _ema(ctx["MACD"], 9, 9)
+
+
+@feature("BB_Upper")
+def _bb_upper(ctx):
+    return ctx["MA_20"] + 2 * ctx["STD_20"]
+
+
+@feature("BB_Lower")
+def _bb_lower(ctx):
+    return ctx["MA_20"] - 2 * ctx["STD_20"]
+
+
+@feature("ATR")
+def _atr(ctx, window=14):
+    prev_close = _shift(ctx["Close"])
+    true_range = np.fmax(
+        ctx["High"] - ctx["Low"],
+        np.fmax(np.abs(ctx["High"] - prev_close), np.abs(ctx["Low"] - prev_close))
+    )
+    return _wilder(true_range, window)
+
+
+# Public API
+
+def compute_features(panel, names):
+    """Compute the named features for every ticker in the panel"""
+    ctx = _Context(panel)
+    return {name: ctx[name].astype(FEATURES[name][1], copy=False) for name in names}
+
+
+def panel_to_frames(panel, values):
+    """Split panel arrays back into one DataFrame per ticker"""
+    frames = {}
+    for t in panel.tickers:
+        frames[t] = pd.DataFrame(
+            {name: panel.column(arr, t) for name, arr in values.items()},
+            index=panel.index[t]
+        )
+    return frames
+
+
+def compute_panel_features(frames, names):
+    """Add the named features to every frame in a {ticker: OHLCV frame} dict"""
+    frames = {t: df for t, df in frames.items() if not df.empty}
+    if not frames:
+        return {}
+    panel = Panel(frames)
+    computed = panel_to_frames(panel, compute_features(panel, names))
+    return {t: pd.concat([frames[t], computed[t]], axis=1) for t in frames}
+
+
+def compute_frame_features(df, names):
+    """Add the named features to a single ticker's OHLCV frame"""
+    result = df.drop(columns=[n for n in names if n in df.columns])
+    if result.empty:
+        return df.copy()
+    return compute_panel_features({"_": result}, names)["_"]
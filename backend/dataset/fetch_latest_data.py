@@ -1,17 +1,41 @@
-import yfinance as yf
+import os
+import sys
+
+if __name__ == "__main__":
+    # Options are defined once, in the market_risk CLI (python -m market_risk fetch).
+    # It imports this module when the command runs, so the script hands over
+    # before pandas, pymongo and yfinance are loaded and --help stays fast.
+    sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..')))
+    from market_risk import cli
+    sys.exit(cli.main(["fetch", *sys.argv[1:]]))
+
 import pandas as pd
 import numpy as np
-import ta
 from datetime import datetime, timedelta
 import pymongo
-from pymongo import MongoClient
+from pymongo import ReplaceOne, DeleteMany
+from pymongo.errors import OperationFailure
 import time
-from tqdm import tqdm
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import ohlcv_store
+import features
+import db
+import columnar
+import feature_store
+import instrumentation
+
+# Documents per bulk_write round-trip
+WRITE_CHUNK_SIZE = 1000
+
+# Bucket documents per bulk_write round-trip
+BUCKET_CHUNK_SIZE = 50
 
-# MongoDB setup
-client = pymongo.MongoClient("mongodb://mongo:27017/")
-db = client["market_risk_assessment"]
-sensex_data_collection = db["sensex_data"]
+# Time-series measurements older than this are expired by MongoDB, which keeps
+# the collection at the 10-year window without per-date deletes
+TIMESERIES_RETENTION_SECONDS = 11 * 366 * 24 * 3600
 
 # List of Sensex companies (tickers)
 sensex_companies = [
@@ -45,15 +69,48 @@ def assign_risk_label(return_series):
     
     return risk_codes, risk_labels
 
-def fetch_data_with_retries(ticker, start_date, end_date, max_attempts=3, delay=2):
-    """Fetch data with retry logic"""
+class TokenBucket:
+    """Thread-safe token bucket limiting how often Yahoo Finance is called"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def backoff_delay(attempt, delay=2, max_delay=30):
+    """Exponential backoff with jitter so retrying workers do not fire in lockstep"""
+    return min(max_delay, delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def fetch_data_with_retries(ticker, start_date, end_date, max_attempts=3, delay=2, limiter=None):
+    """Fetch data with retry logic, downloading only what the local store is missing"""
+    def download(ticker, start, end):
+        if limiter is not None:
+            limiter.acquire()
+        return ohlcv_store.download(ticker, start, end)
+
     for attempt in range(max_attempts):
         try:
-            data = yf.download(ticker, start=start_date, end=end_date, auto_adjust=False)
+            with instrumentation.stage("fetch", ticker) as record:
+                data = ohlcv_store.get_ohlcv(ticker, start_date, end_date, fetch_fn=download)
+                record["rows"] = len(data)
+                record["attempt"] = attempt + 1
             if not data.empty:
-                # Handle multi-index columns if present
-                if isinstance(data.columns, pd.MultiIndex):
-                    data.columns = data.columns.get_level_values(0)
                 return data
             else:
                 print(f"[WARNING] Empty data retrieved for {ticker}, retrying ({attempt + 1}/{max_attempts})")
@@ -61,104 +118,37 @@ def fetch_data_with_retries(ticker, start_date, end_date, max_attempts=3, delay=
             print(f"[ERROR] Failed to fetch {ticker} on attempt {attempt + 1}: {str(e)}")
         
         if attempt < max_attempts - 1:
-            time.sleep(delay)  # Wait before retrying
+            time.sleep(backoff_delay(attempt, delay))  # Wait before retrying
     
     return pd.DataFrame()  # Return empty DataFrame if all attempts fail
 
 def compute_technical_indicators(df):
-    """Calculate technical indicators safely"""
-    result = df.copy()
-    
-    # Basic price and volume metrics
-    result['Return'] = result['Close'].pct_change()
-    result['MA_5'] = result['Close'].rolling(window=5).mean()
-    result['MA_10'] = result['Close'].rolling(window=10).mean()
-    result['MA_50'] = result['Close'].rolling(window=50).mean()
-    result['MA_200'] = result['Close'].rolling(window=200).mean()
-    result['STD_5'] = result['Close'].rolling(window=5).std()
-    result['Range'] = result['High'] - result['Low']
-    
-    # Safely calculate ratio metrics
-    result['Range_Ratio'] = np.where(result['Close'] != 0, 
-                                     (result['High'] - result['Low']) / result['Close'], 
-                                     0)
-    
-    result['Price_to_MA5'] = np.where(result['MA_5'] != 0, 
-                                     result['Close'] / result['MA_5'] - 1, 
-                                     0)
-    
-    result['Price_to_MA10'] = np.where(result['MA_10'] != 0, 
-                                      result['Close'] / result['MA_10'] - 1, 
-                                      0)
-    
-    # Momentum indicators
-    result['Momentum'] = result['Close'] - result['Close'].shift(5)
-    
-    # Volume metrics
-    if 'Volume' in result.columns and not result['Volume'].isna().all():
-        result['Volume_Change'] = result['Volume'].pct_change()
-    else:
-        result['Volume_Change'] = 0
-    
-    # Risk metrics
-    rolling_returns = result['Return'].rolling(100)
-    if len(result) >= 100:
-        result['VaR_95'] = rolling_returns.quantile(0.05)
-    else:
-        result['VaR_95'] = result['Return'].min()
-    
-    result['Volatility'] = result['Return'].rolling(20).std()
-    
-    # TA-Lib indicators (safely)
-    try:
-        result['RSI'] = ta.momentum.RSIIndicator(result['Close'], window=14).rsi()
-        
-        macd = ta.trend.MACD(result['Close'])
-        result['MACD'] = macd.macd()
-        result['MACD_Signal'] = macd.macd_signal()
-        
-        # Bollinger Bands
-        ma20 = result['Close'].rolling(20).mean()
-        std20 = result['Close'].rolling(20).std()
-        result['BB_Upper'] = ma20 + 2 * std20
-        result['BB_Lower'] = ma20 - 2 * std20
-        
-        # ATR
-        result['ATR'] = ta.volatility.AverageTrueRange(
-            result['High'], result['Low'], result['Close'], window=14
-        ).average_true_range()
-    except Exception as e:
-        print(f"[ERROR] Failed to compute some TA indicators: {str(e)}")
-    
-    # Replace infinities with NaN
-    result = result.replace([np.inf, -np.inf], np.nan)
-    
-    return result
+    """Calculate technical indicators from the shared feature registry"""
+    return features.compute_frame_features(df, features.INGEST_FEATURES)
+
+def window_features(frames, start_date):
+    """Ingest indicators of the rows from start_date on, computed over the whole fetched history"""
+    # The history starts at the fixed feature_store.HISTORY_START, so rows already
+    # stored get the same values again and keep their Row_Hash. Computed from the
+    # 10-year start date, which moves every day, the running sums and EMAs change
+    # in their last bits and every row of the window would be rewritten.
+    frames = features.compute_panel_features(frames, features.INGEST_FEATURES)
+    return {t: df.loc[start_date:] for t, df in frames.items()}
 
-def fetch_and_insert_data(ticker, start_date, end_date):
+def store_ticker_frame(ticker, df, storage="rows", bucket="month"):
+    """Label an indicator frame and write it to MongoDB"""
     now = datetime.now()
-    print(f"[{now:%Y-%m-%d %H:%M:%S}] Fetching data for {ticker}...")
-    
-    # Fetch historical data
-    df = fetch_data_with_retries(ticker, start_date, end_date)
-    
-    if df.empty:
-        print(f"[ERROR] Could not fetch data for {ticker}. Skipping.")
-        return 0
-    
-    # Compute technical indicators
-    df = compute_technical_indicators(df)
     
     # Drop rows with NaN values and reset index
-    df.dropna(inplace=True)
-    df.reset_index(inplace=True)
+    df = df.dropna().reset_index()
     
     if df.empty:
         print(f"[WARNING] No valid data after processing for {ticker}. Skipping.")
         return 0
     
     # Compute risk labels (both codes and labels)
-    risk_codes, risk_labels = assign_risk_label(df['Return'])
+    with instrumentation.stage("label", ticker, rows=len(df)):
+        risk_codes, risk_labels = assign_risk_label(df['Return'])
     df['Risk_Code'] = risk_codes
     df['Risk_Label'] = risk_labels
     
@@ -174,42 +164,262 @@ def fetch_and_insert_data(ticker, start_date, end_date):
     print(f"  - Risk Distribution: {df['Risk_Label'].value_counts(normalize=True) * 100}")
     
     try:
-        # Convert DataFrame to dictionary format for MongoDB
-        data_dict = df.to_dict(orient='records')
-        
-        # First remove existing data for this ticker
-        sensex_data_collection.delete_many({"Ticker": ticker})
-        
-        # Then insert new data
-        if data_dict:
-            result = sensex_data_collection.insert_many(data_dict)
-            print(f"[{now:%Y-%m-%d %H:%M:%S}] {len(result.inserted_ids)} records for {ticker} inserted into MongoDB.")
-            return len(result.inserted_ids)
-        else:
-            print(f"[WARNING] No data to insert for {ticker}.")
-            return 0
+        with instrumentation.stage("write", ticker, rows=len(df)) as record:
+            if storage == "buckets":
+                written = write_bucket_frame(ticker, df, period=bucket)
+            else:
+                written = STORAGE_WRITERS[storage](ticker, df)
+            record["written"] = written
+        print(f"[{now:%Y-%m-%d %H:%M:%S}] {written} records for {ticker} written to MongoDB.")
+        return written
     except Exception as e:
         print(f"[ERROR] Failed to insert data for {ticker}: {str(e)}")
         return 0
 
+def fetch_and_insert_data(ticker, start_date, end_date, limiter=None, storage="rows", bucket="month"):
+    now = datetime.now()
+    print(f"[{now:%Y-%m-%d %H:%M:%S}] Fetching data for {ticker}...")
+    
+    # Fetch historical data
+    df = fetch_data_with_retries(ticker, start_date, end_date, limiter=limiter)
+    
+    if df.empty:
+        print(f"[ERROR] Could not fetch data for {ticker}. Skipping.")
+        return 0
+    
+    # Compute technical indicators
+    with instrumentation.stage("features", ticker, rows=len(df)):
+        df = compute_technical_indicators(df)
+    return store_ticker_frame(ticker, df, storage, bucket)
+
+def run_per_ticker(fn, tickers, workers=1, desc=None):
+    """Run fn(ticker) for every ticker, concurrently when workers > 1; returns {ticker: result}"""
+    from tqdm import tqdm
+    results = {}
+    if workers <= 1:
+        for ticker in tqdm(tickers, desc=desc):
+            try:
+                results[ticker] = fn(ticker)
+            except Exception as e:
+                print(f"[ERROR] {desc or 'Task'} failed for {ticker}: {str(e)}")
+        return results
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fn, ticker): ticker for ticker in tickers}
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            ticker = futures[future]
+            try:
+                results[ticker] = future.result()
+            except Exception as e:
+                print(f"[ERROR] {desc or 'Task'} failed for {ticker}: {str(e)}")
+    return results
+
+def ensure_indexes(collection=None):
+    """Create the unique (Ticker, Date) index the incremental writer relies on"""
+    collection = collection if collection is not None else db.get_collection(db.SENSEX_DATA)
+    try:
+        collection.create_index(
+            [("Ticker", pymongo.ASCENDING), ("Date", pymongo.ASCENDING)],
+            unique=True, name="ticker_date"
+        )
+    except OperationFailure as e:
+        print(f"[ERROR] Could not create unique (Ticker, Date) index: {str(e)}")
+        raise
+    # The compound index serves Ticker-only queries, so the old index is just write overhead
+    if "Ticker_1" in collection.index_information():
+        collection.drop_index("Ticker_1")
+
+def row_hashes(df):
+    """Per-row content hash used to detect rows that changed since the last run"""
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    # BSON has no unsigned 64-bit integer type
+    return hashes.view(np.int64)
+
+def write_ticker_frame(ticker, df, collection=None, chunk_size=WRITE_CHUNK_SIZE):
+    """Upsert new or changed rows for one ticker and drop rows that left the window"""
+    collection = collection if collection is not None else db.get_collection(db.SENSEX_DATA)
+    df = df.drop(columns=['Row_Hash'], errors='ignore')
+    df['Row_Hash'] = row_hashes(df)
+
+    # Only Date and hash are read back, not the stored documents themselves
+    existing = {
+        pd.Timestamp(doc['Date']): doc.get('Row_Hash')
+        for doc in collection.find({"Ticker": ticker}, {"_id": 0, "Date": 1, "Row_Hash": 1})
+    }
+    dates = pd.DatetimeIndex(df['Date'])
+    changed = np.fromiter(
+        (existing.get(date) != h for date, h in zip(dates, df['Row_Hash'])),
+        dtype=bool, count=len(df)
+    )
+    stale = sorted(set(existing) - set(dates))
+
+    # Documents are built one chunk at a time, so memory does not grow with history length
+    written = 0
+    for docs in columnar.iter_records(df.loc[changed], chunk_size):
+        result = collection.bulk_write([
+            ReplaceOne({"Ticker": ticker, "Date": doc['Date']}, doc, upsert=True) for doc in docs
+        ], ordered=False)
+        written += result.upserted_count + result.modified_count
+    for i in range(0, len(stale), chunk_size):
+        collection.bulk_write([
+            DeleteMany({"Ticker": ticker, "Date": {"$in": [d.to_pydatetime() for d in stale[i:i + chunk_size]]}})
+        ], ordered=False)
+
+    print(f"[INFO] {ticker}: {int(changed.sum())} new or changed, "
+          f"{len(df) - int(changed.sum())} unchanged, {len(stale)} removed")
+    return written
+
+def ensure_bucket_indexes(collection=None):
+    """Unique (Ticker, Period) index for the bucketed layout"""
+    collection = collection if collection is not None else db.get_collection(db.SENSEX_BUCKETS)
+    collection.create_index(
+        [("Ticker", pymongo.ASCENDING), ("Period", pymongo.ASCENDING)],
+        unique=True, name="ticker_period"
+    )
+
+def write_bucket_frame(ticker, df, collection=None, chunk_size=BUCKET_CHUNK_SIZE, period="month"):
+    """Upsert changed bucket documents for one ticker and drop buckets that left the window"""
+    collection = collection if collection is not None else db.get_collection(db.SENSEX_BUCKETS)
+    existing = {
+        doc['Period']: doc.get('Batch_Hash')
+        for doc in collection.find({"Ticker": ticker}, {"_id": 0, "Period": 1, "Batch_Hash": 1})
+    }
+
+    seen, ops = set(), []
+    written = unchanged = 0
+
+    def flush():
+        collection.bulk_write(ops, ordered=False)
+        ops.clear()
+
+    for doc in columnar.iter_batches(ticker, df, period):
+        seen.add(doc['Period'])
+        if existing.get(doc['Period']) == doc['Batch_Hash']:
+            unchanged += doc['Count']
+            continue
+        ops.append(ReplaceOne({"Ticker": ticker, "Period": doc['Period']}, doc, upsert=True))
+        written += doc['Count']
+        if len(ops) >= chunk_size:
+            flush()
+    stale = sorted(set(existing) - seen)
+    if stale:
+        ops.append(DeleteMany({"Ticker": ticker, "Period": {"$in": stale}}))
+    if ops:
+        flush()
+
+    print(f"[INFO] {ticker}: {written} rows in new or changed buckets, "
+          f"{unchanged} unchanged, {len(stale)} buckets removed")
+    return written
+
+def ensure_timeseries_collection(database=None):
+    """Create the time-series collection (Date as timeField, Ticker as metaField) if missing"""
+    database = database if database is not None else db.get_db()
+    if db.SENSEX_TIMESERIES not in database.list_collection_names():
+        database.create_collection(
+            db.SENSEX_TIMESERIES,
+            timeseries={"timeField": "Date", "metaField": "Ticker", "granularity": "hours"},
+            expireAfterSeconds=TIMESERIES_RETENTION_SECONDS,
+        )
+    return database[db.SENSEX_TIMESERIES]
+
+def write_timeseries_frame(ticker, df, collection=None, chunk_size=WRITE_CHUNK_SIZE):
+    """Append new rows for one ticker to the time-series collection and replace revised ones"""
+    collection = collection if collection is not None else db.get_collection(db.SENSEX_TIMESERIES)
+    df = df.drop(columns=['Row_Hash'], errors='ignore')
+    df['Row_Hash'] = row_hashes(df)
+
+    existing = {
+        pd.Timestamp(doc['Date']): doc.get('Row_Hash')
+        for doc in collection.find({"Ticker": ticker}, {"_id": 0, "Date": 1, "Row_Hash": 1})
+    }
+    dates = pd.DatetimeIndex(df['Date'])
+    known = dates.isin(list(existing))
+    hashes = df['Row_Hash'].to_numpy()
+    revised = np.zeros(len(df), dtype=bool)
+    revised[known] = [existing[date] != h for date, h in zip(dates[known], hashes[known])]
+    rewritten = False
+    if revised.any():
+        try:
+            # MongoDB 7 deletes time-series measurements by any filter
+            collection.delete_many({"Ticker": ticker,
+                                    "Date": {"$in": [d.to_pydatetime() for d in dates[revised]]}})
+            new = ~known | revised
+        except OperationFailure:
+            # MongoDB 6 deletes by metaField only, so the ticker is rewritten as a whole
+            collection.delete_many({"Ticker": ticker})
+            new = np.ones(len(df), dtype=bool)
+            rewritten = True
+    else:
+        new = ~known
+
+    written = 0
+    for docs in columnar.iter_records(df.loc[new], chunk_size):
+        collection.insert_many(docs, ordered=False)
+        written += len(docs)
+
+    print(f"[INFO] {ticker}: {written} rows appended ({int(revised.sum())} revised"
+          f"{', ticker rewritten' if rewritten else ''}), {int((known & ~revised).sum())} already stored")
+    return written
+
+STORAGE_WRITERS = {
+    "rows": write_ticker_frame,
+    "timeseries": write_timeseries_frame,
+    "buckets": write_bucket_frame,
+}
+
+def prepare_storage(storage):
+    """Create the collection and indexes a storage layout writes into"""
+    if storage == "timeseries":
+        ensure_timeseries_collection()
+    elif storage == "buckets":
+        ensure_bucket_indexes()
+    else:
+        ensure_indexes()
+
 # Main execution
-def main():
+def main(workers=4, rate=2.0, storage="rows", bucket="month", tickers=None):
+    tickers = list(tickers or sensex_companies)
     # Set date range
     end_date = datetime.today().strftime('%Y-%m-%d')
     start_date = (datetime.today() - timedelta(days=365*10)).strftime('%Y-%m-%d')  # 10 years of data
+    # Training features are stored from the start of the training window
+    history_start = min(start_date, feature_store.HISTORY_START)
     
-    print(f"Fetching data from {start_date} to {end_date}")
-    
-    # Create index on Ticker field for faster queries
-    sensex_data_collection.create_index([("Ticker", pymongo.ASCENDING)])
+    print(f"Fetching data from {history_start} to {end_date}")
+    instrumentation.start_run("ingest")
+    status, total_records = "failed", 0
     
-    # Fetch and insert data for all Sensex companies
-    total_records = 0
-    for company in tqdm(sensex_companies):
-        records = fetch_and_insert_data(company, start_date, end_date)
-        total_records += records
+    try:
+        # Collection and unique index the incremental writer of this layout relies on
+        prepare_storage(storage)
+        
+        # Fetch all tickers concurrently; Yahoo calls share one rate limiter
+        limiter = TokenBucket(rate, capacity=max(1, workers)) if rate else None
+        frames = run_per_ticker(
+            lambda t: fetch_data_with_retries(t, history_start, end_date, limiter=limiter),
+            tickers, workers, desc="fetch"
+        )
+        for company in tickers:
+            if company not in frames or frames[company].empty:
+                print(f"[ERROR] Could not fetch data for {company}. Skipping.")
+        
+        # Model features go to the feature store once, so training neither
+        # downloads nor recomputes them
+        with instrumentation.stage("train_features", rows=sum(len(df) for df in frames.values())):
+            for ticker, df in feature_store.engineer(frames, features.TRAIN_FEATURES).items():
+                feature_store.write_features(ticker, df, features.TRAIN_FEATURES, history_start, end_date)
+        
+        # Indicators for every ticker in one pass over the (bar x ticker) panel
+        with instrumentation.stage("features", rows=sum(len(df) for df in frames.values())):
+            frames = window_features(frames, start_date)
+        
+        # Label and write each ticker
+        written = run_per_ticker(
+            lambda t: store_ticker_frame(t, frames[t], storage, bucket), list(frames), workers, desc="write"
+        )
+        total_records = sum(written.values())
+        status = "ok"
+    finally:
+        instrumentation.finish_run(status, tickers=len(tickers), workers=workers,
+                                   records_written=total_records, storage=storage)
     
-    print(f"Data collection complete. Total records inserted: {total_records}")
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+    print(f"Data collection complete. Total records written: {total_records}")
@@ -0,0 +1,270 @@
+import math
+from bisect import bisect_left, insort
+
+import numpy as np
+
+import features
+
+# Bar-at-a-time versions of the feature engine's indicators, for the streaming
+# risk daemon. A TickerState holds the running state of one ticker:
+#   rolling means and standard deviations   ring buffer + running mean / sum of
+#                                            squared deviations (O(1) per bar)
+#   EMA, MACD, RSI, ATR (Wilder)            exponential accumulators (O(1))
+#   Momentum                                ring buffer of closes
+#   VaR quantiles                           sorted 250-bar window (binary search)
+# Feeding a ticker's bars through update() one by one gives the same values
+# compute_frame_features() gives for the whole frame (to float rounding), with
+# the same NaN warm-up rows and the same float32 outputs. The batch engine
+# falls back to a full-sample VaR for tickers with at most VAR_WINDOW bars; the
+# streaming state reports NaN until its window is full instead.
+
+# Features update() maintains; covers features.TRAIN_FEATURES and INGEST_FEATURES
+STREAM_FEATURES = [
+    "Return", "MA_5", "MA_10", "MA_20", "MA_50", "MA_200", "STD_5", "STD_20", "EMA_5", "EMA_10",
+    "Range", "Range_Ratio", "Price_to_MA5", "Price_to_MA10", "Momentum", "Volume_Change",
+    "VaR_99", "VaR_95", "VaR_90", "Volatility", "Volatility_5", "RSI", "MACD", "MACD_Signal",
+    "BB_Upper", "BB_Lower", "ATR",
+]
+
+# Running sums are recomputed from the ring buffer every this many windows to
+# stop floating-point drift from accumulating over a long-running process
+_RESYNC_WINDOWS = 64
+
+
+class RollingWindow:
+    """The last `size` values with their mean and sum of squared deviations"""
+
+    def __init__(self, size):
+        self.size = size
+        self.values = np.zeros(size)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    @property
+    def full(self):
+        return self.count >= self.size
+
+    def push(self, x):
+        slot = self.count % self.size
+        if self.full:
+            # Replace the oldest value: mean and M2 of a fixed-size window
+            old = self.values[slot]
+            mean = self.mean + (x - old) / self.size
+            self.m2 += (x - old) * (x - mean + old - self.mean)
+            self.mean = mean
+        else:
+            # Welford's update while the window fills
+            delta = x - self.mean
+            self.mean += delta / (self.count + 1)
+            self.m2 += delta * (x - self.mean)
+        self.values[slot] = x
+        self.count += 1
+        if self.count % (self.size * _RESYNC_WINDOWS) == 0:
+            self.mean = float(self.values.mean())
+            self.m2 = float(((self.values - self.mean) ** 2).sum())
+
+    def average(self):
+        return self.mean if self.full else math.nan
+
+    def std(self):
+        """Sample standard deviation (ddof=1), like pandas rolling().std()"""
+        return math.sqrt(max(self.m2, 0.0) / (self.size - 1)) if self.full else math.nan
+
+    def oldest(self):
+        """Value pushed `size - 1` bars before the latest one"""
+        return self.values[self.count % self.size] if self.full else math.nan
+
+
+class Ewm:
+    """pandas ewm(alpha=..., adjust=False).mean() fed one value at a time"""
+
+    def __init__(self, alpha, min_periods=0):
+        self.alpha = alpha
+        self.min_periods = max(min_periods, 1)
+        self.value = math.nan
+        self.count = 0
+
+    def push(self, x):
+        self.value = x if self.count == 0 else self.value + self.alpha * (x - self.value)
+        self.count += 1
+
+    def current(self):
+        return self.value if self.count >= self.min_periods else math.nan
+
+
+def ema(span, min_periods=0):
+    return Ewm(2.0 / (span + 1), min_periods)
+
+
+class Wilder:
+    """Wilder smoothing seeded with the simple mean of the first `window` values"""
+
+    def __init__(self, window):
+        self.window = window
+        self.total = 0.0
+        self.count = 0
+        self.value = math.nan
+
+    def push(self, x):
+        self.count += 1
+        if self.count < self.window:
+            self.total += x
+        elif self.count == self.window:
+            self.value = (self.total + x) / self.window
+        else:
+            self.value += (x - self.value) / self.window
+
+
+class RollingQuantiles:
+    """Quantiles (linear interpolation) of the last `size` values, kept sorted"""
+
+    def __init__(self, size, qs):
+        self.window = RollingWindow(size)
+        self.sorted = []
+        positions = [q * (size - 1) for q in qs]
+        self.positions = [(int(math.floor(p)), min(int(math.floor(p)) + 1, size - 1), p - math.floor(p))
+                          for p in positions]
+
+    def push(self, x):
+        if self.window.full:
+            del self.sorted[bisect_left(self.sorted, self.window.oldest())]
+        self.window.push(x)
+        insort(self.sorted, x)
+
+    def values(self):
+        if not self.window.full:
+            return [math.nan] * len(self.positions)
+        return [self.sorted[lo] + (self.sorted[hi] - self.sorted[lo]) * frac for lo, hi, frac in self.positions]
+
+
+def _ratio(numerator, denominator):
+    """numerator / denominator with the feature engine's inf -> NaN rule"""
+    if denominator == 0 or math.isnan(denominator) or math.isnan(numerator):
+        return math.nan
+    return numerator / denominator
+
+
+class TickerState:
+    """Incremental feature state of one ticker; update() costs the same on bar 10 and bar 10,000"""
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.last_date = None
+        self.bars = 0
+        self.prev_close = math.nan
+        self.prev_volume = math.nan
+        self.volume_seen = False
+        self.close_windows = {w: RollingWindow(w) for w in (5, 10, 20, 50, 200)}
+        self.closes = RollingWindow(6)  # Close five bars back, for Momentum
+        self.return_windows = {w: RollingWindow(w) for w in (5, 20)}
+        self.ema = {span: ema(span) for span in (5, 10)}
+        self.ema12, self.ema26, self.signal = ema(12, 12), ema(26, 26), ema(9, 9)
+        self.avg_up, self.avg_down = Ewm(1.0 / 14, 14), Ewm(1.0 / 14, 14)
+        self.atr = Wilder(14)
+        self.var = RollingQuantiles(features.VAR_WINDOW, list(features.VAR_QUANTILES.values()))
+
+    @classmethod
+    def from_history(cls, ticker, frame):
+        """State after replaying a Date-indexed OHLCV frame (O(n) once, at startup)"""
+        state = cls(ticker)
+        columns = [c for c in features.OHLCV_COLUMNS if c in frame.columns]
+        for date, values in zip(frame.index, frame[columns].to_numpy(dtype=np.float64)):
+            state.update(dict(zip(columns, values)), date)
+        return state
+
+    def update(self, bar, date=None):
+        """Apply one bar ({column: value}); returns {feature: value} for that bar"""
+        close, high, low = float(bar["Close"]), float(bar["High"]), float(bar["Low"])
+        volume = float(bar.get("Volume", math.nan))
+        prev_close = self.prev_close
+        out = {}
+
+        ret = _ratio(close, prev_close) - 1
+        out["Return"] = ret
+        for w, window in self.close_windows.items():
+            window.push(close)
+            out[f"MA_{w}"] = window.average()
+        for w in (5, 20):
+            out[f"STD_{w}"] = self.close_windows[w].std()
+        for span, acc in self.ema.items():
+            acc.push(close)
+            out[f"EMA_{span}"] = acc.current()
+
+        out["Range"] = high - low
+        out["Range_Ratio"] = out["Range"] / close if close != 0 else 0.0
+        for w in (5, 10):
+            ma = out[f"MA_{w}"]
+            out[f"Price_to_MA{w}"] = close / ma - 1 if ma != 0 else 0.0
+        self.closes.push(close)
+        out["Momentum"] = close - self.closes.oldest()
+
+        self.volume_seen = self.volume_seen or not math.isnan(volume)
+        out["Volume_Change"] = _ratio(volume, self.prev_volume) - 1 if self.volume_seen else 0.0
+
+        # Return-based windows start with the second bar, like the NaN-prefixed batch columns
+        if not math.isnan(ret):
+            for w, window in self.return_windows.items():
+                window.push(ret)
+            self.var.push(ret)
+        out["Volatility_5"] = self.return_windows[5].std()
+        out["Volatility"] = self.return_windows[20].std()
+        out.update(zip(features.VAR_QUANTILES, self.var.values()))
+
+        diff = close - prev_close
+        self.avg_up.push(diff if diff > 0 else 0.0)
+        self.avg_down.push(-diff if diff < 0 else 0.0)
+        up, down = self.avg_up.current(), self.avg_down.current()
+        if math.isnan(up) or math.isnan(down):
+            out["RSI"] = math.nan
+        else:
+            out["RSI"] = 100.0 if down == 0 else 100 - 100 / (1 + up / down)
+
+        self.ema12.push(close)
+        self.ema26.push(close)
+        out["MACD"] = self.ema12.current() - self.ema26.current()
+        if not math.isnan(out["MACD"]):
+            self.signal.push(out["MACD"])
+        out["MACD_Signal"] = self.signal.current()
+
+        out["BB_Upper"] = out["MA_20"] + 2 * out["STD_20"]
+        out["BB_Lower"] = out["MA_20"] - 2 * out["STD_20"]
+
+        true_range = high - low
+        if not math.isnan(prev_close):
+            true_range = max(true_range, abs(high - prev_close), abs(low - prev_close))
+        self.atr.push(true_range)
+        out["ATR"] = self.atr.value
+
+        self.prev_close, self.prev_volume = close, volume
+        self.last_date = date
+        self.bars += 1
+        # Same output precision as the batch engine (several features are stored as float32)
+        return {name: float(features.FEATURES[name][1].type(value)) for name, value in out.items()}
+
+    def copy(self):
+        """Independent copy, for scoring a provisional bar without committing it"""
+        clone = TickerState.__new__(TickerState)
+        clone.__dict__.update(self.__dict__)
+        clone.close_windows = {w: _copy_window(v) for w, v in self.close_windows.items()}
+        clone.closes = _copy_window(self.closes)
+        clone.return_windows = {w: _copy_window(v) for w, v in self.return_windows.items()}
+        clone.ema = {span: _copy_plain(v) for span, v in self.ema.items()}
+        for name in ("ema12", "ema26", "signal", "avg_up", "avg_down", "atr"):
+            setattr(clone, name, _copy_plain(getattr(self, name)))
+        clone.var = RollingQuantiles.__new__(RollingQuantiles)
+        clone.var.window, clone.var.sorted, clone.var.positions = (
+            _copy_window(self.var.window), list(self.var.sorted), self.var.positions)
+        return clone
+
+
+def _copy_plain(obj):
+    clone = obj.__class__.__new__(obj.__class__)
+    clone.__dict__.update(obj.__dict__)
+    return clone
+
+
+def _copy_window(window):
+    clone = _copy_plain(window)
+    clone.values = window.values.copy()
+    return clone
@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import threading
+import contextlib
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+import db
+
+# Per-stage timing, memory and throughput records for the dataset and training jobs.
+#
+#   run = instrumentation.start_run("train")
+#   with instrumentation.stage("fit", ticker) as record:
+#       model.fit(X, y)
+#       record["rows"] = len(X)
+#   instrumentation.finish_run()
+#
+# Every stage becomes one JSON log line; finish_run() writes a Prometheus
+# textfile-collector file and a run summary document in MongoDB. Stages run in
+# worker processes are returned to the parent with Run.records and merged with
+# Run.extend. Configuration comes from the environment:
+#   PIPELINE_LOG              JSON lines file ('-' for stderr, '' to disable)
+#   PIPELINE_METRICS_DIR      textfile-collector directory (unset: no .prom file)
+#   PIPELINE_PROFILE          'cprofile' or 'tracemalloc' to profile stages
+#   PIPELINE_PROFILE_STAGES   comma-separated stage names to profile (default: all)
+#   PIPELINE_PROFILE_DIR      where profiles are written
+
+LOG_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'logs'))
+DEFAULT_LOG = os.path.join(LOG_DIR, 'pipeline.jsonl')
+
+_current = None
+_log_lock = threading.Lock()
+
+
+def peak_rss_bytes():
+    """High-water mark of this process's resident set size"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def rss_bytes():
+    """Current resident set size of this process (Linux only)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _emit(record):
+    target = os.environ.get('PIPELINE_LOG', DEFAULT_LOG)
+    if not target:
+        return
+    line = json.dumps(record, default=str)
+    with _log_lock:
+        if target == '-':
+            print(line, file=sys.stderr, flush=True)
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        with open(target, 'a') as f:
+            f.write(line + '\n')
+
+
+class _Profiler:
+    """Opt-in cProfile / tracemalloc wrapper for one stage"""
+
+    def __init__(self, run, name, ticker):
+        self.mode = os.environ.get('PIPELINE_PROFILE', '').lower()
+        stages = [s.strip() for s in os.environ.get('PIPELINE_PROFILE_STAGES', '').split(',') if s.strip()]
+        if stages and name not in stages:
+            self.mode = ''
+        self.path = os.path.join(
+            os.environ.get('PIPELINE_PROFILE_DIR', os.path.join(LOG_DIR, 'profiles')),
+            f"{run.job}-{run.run_id[:8]}-{name}-{(ticker or 'all').replace('/', '_')}-{os.getpid()}"
+        )
+        self._profile = None
+
+    def start(self):
+        if self.mode == 'cprofile':
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.mode == 'tracemalloc':
+            import tracemalloc
+            # Traces every thread: concurrent stages share the numbers
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+            tracemalloc.reset_peak()
+
+    def stop(self, record):
+        if not self.mode:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if self.mode == 'cprofile' and self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.path + '.prof')
+            record["profile"] = self.path + '.prof'
+        elif self.mode == 'tracemalloc':
+            import tracemalloc
+            _, peak = tracemalloc.get_traced_memory()
+            record["traced_peak_bytes"] = peak
+            top = tracemalloc.take_snapshot().statistics('lineno')[:25]
+            with open(self.path + '.tracemalloc.txt', 'w') as f:
+                f.write('\n'.join(str(stat) for stat in top) + '\n')
+            record["profile"] = self.path + '.tracemalloc.txt'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Run:
+    def __init__(self, job, run_id=None):
+        self.job = job
+        self.run_id = run_id or uuid.uuid4().hex
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self._records = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name, ticker=None, rows=None):
+        """Time one stage; the yielded record can be given `rows` and extra fields"""
+        record = {
+            "run_id": self.run_id, "job": self.job, "stage": name, "ticker": ticker,
+            "rows": rows, "pid": os.getpid(), "thread": threading.current_thread().name,
+        }
+        profiler = _Profiler(self, name, ticker)
+        profiler.start()
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        rss_started = rss_bytes()
+        try:
+            yield record
+            record["status"] = "ok"
+        except BaseException as e:
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 6)
+            # Process CPU time: includes other threads working at the same time
+            record["cpu_seconds"] = round(time.process_time() - cpu_started, 6)
+            # ru_maxrss is the process's high-water mark so far, not this stage's;
+            # what the stage itself added is the change in current RSS
+            rss_finished = rss_bytes()
+            if rss_started is not None and rss_finished is not None:
+                record["rss_delta_bytes"] = rss_finished - rss_started
+            record["process_peak_rss_bytes"] = peak_rss_bytes()
+            if record["rows"] and record["seconds"] > 0:
+                record["rows_per_sec"] = round(record["rows"] / record["seconds"], 1)
+            record["finished_at"] = datetime.now().isoformat(timespec='milliseconds')
+            profiler.stop(record)
+            with self._lock:
+                self._records.append(record)
+            _emit(record)
+
+    @property
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def extend(self, records):
+        """Merge stage records produced by worker processes"""
+        with self._lock:
+            self._records.extend(records)
+
+    def summary(self, status="ok", top=10):
+        records = self.records
+        stages = {}
+        for r in records:
+            s = stages.setdefault(r["stage"], {"count": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                               "rows": 0, "errors": 0, "slowest_ticker": None})
+            s["count"] += 1
+            s["seconds"] += r["seconds"]
+            s["rows"] += r.get("rows") or 0
+            s["errors"] += r["status"] != "ok"
+            if r["seconds"] >= s["max_seconds"]:
+                s["max_seconds"], s["slowest_ticker"] = r["seconds"], r["ticker"]
+        for s in stages.values():
+            s["seconds"] = round(s["seconds"], 6)
+            s["rows_per_sec"] = round(s["rows"] / s["seconds"], 1) if s["rows"] and s["seconds"] else None
+
+        peaks = [r["process_peak_rss_bytes"] for r in records if r.get("process_peak_rss_bytes")]
+        return {
+            "run_id": self.run_id,
+            "job": self.job,
+            "status": status,
+            "host": socket.gethostname(),
+            "started_at": self.started_at,
+            "finished_at": datetime.now(),
+            "seconds": round(time.perf_counter() - self._started, 3),
+            # Highest RSS of any process that took part (parent or worker)
+            "peak_rss_bytes": max(peaks + [peak_rss_bytes() or 0]),
+            "stages": stages,
+            "slowest": [
+                {k: r.get(k) for k in ("stage", "ticker", "seconds", "rows", "pid")}
+                for r in sorted(records, key=lambda r: r["seconds"], reverse=True)[:top]
+            ],
+            "errors": [
+                {k: r.get(k) for k in ("stage", "ticker", "error")}
+                for r in records if r["status"] != "ok"
+            ],
+        }
+
+    def prometheus(self, summary):
+        """Metrics in the Prometheus text exposition format"""
+        def labels(**values):
+            return ",".join(f'{k}="{_escape_label(v)}"' for k, v in values.items() if v is not None)
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for label_values, value in samples:
+                lines.append(f"{name}{{{labels(**label_values)}}} {value}")
+
+        # One sample per label set: a retried or repeated stage is summed (the
+        # textfile collector rejects a file with duplicate samples)
+        per_ticker = {}
+        for r in self.records:
+            key = (r["stage"], r["ticker"] or "all")
+            a = per_ticker.setdefault(key, {"seconds": 0.0, "rows": 0, "rss_delta_bytes": None})
+            a["seconds"] += r["seconds"]
+            a["rows"] += r.get("rows") or 0
+            delta = r.get("rss_delta_bytes")
+            if delta is not None:
+                a["rss_delta_bytes"] = delta if a["rss_delta_bytes"] is None else max(a["rss_delta_bytes"], delta)
+        samples = [({"job": self.job, "stage": stage, "ticker": ticker}, a)
+                   for (stage, ticker), a in per_ticker.items()]
+        metric("market_risk_stage_seconds", "gauge", "Wall time of one stage for one ticker in the last run",
+               [(label_values, round(a["seconds"], 6)) for label_values, a in samples])
+        metric("market_risk_stage_rows_per_second", "gauge", "Rows processed per second by one stage",
+               [(label_values, round(a["rows"] / a["seconds"], 1))
+                for label_values, a in samples if a["rows"] and a["seconds"] > 0])
+        metric("market_risk_stage_rss_delta_bytes", "gauge",
+               "Largest change in resident memory over one stage for one ticker",
+               [(label_values, a["rss_delta_bytes"])
+                for label_values, a in samples if a["rss_delta_bytes"] is not None])
+        metric("market_risk_stage_total_seconds", "gauge", "Wall time of a stage summed over tickers",
+               [({"job": self.job, "stage": name}, s["seconds"]) for name, s in summary["stages"].items()])
+        metric("market_risk_stage_errors", "gauge", "Failed stage executions in the last run",
+               [({"job": self.job, "stage": name}, s["errors"]) for name, s in summary["stages"].items()])
+        metric("market_risk_run_seconds", "gauge", "Wall time of the last run",
+               [({"job": self.job}, summary["seconds"])])
+        metric("market_risk_run_peak_rss_bytes", "gauge", "Peak resident memory of the last run",
+               [({"job": self.job}, summary["peak_rss_bytes"])])
+        metric("market_risk_run_success", "gauge", "1 if the last run finished without errors",
+               [({"job": self.job}, int(summary["status"] == "ok" and not summary["errors"]))])
+        metric("market_risk_run_finished_timestamp_seconds", "gauge", "When the last run finished",
+               [({"job": self.job}, round(summary["finished_at"].timestamp(), 3))])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, summary, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"market_risk_{self.job}.prom")
+        # The collector may read at any moment, so replace the file atomically
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus(summary))
+        os.replace(tmp_path, path)
+        return path
+
+
+def start_run(job, run_id=None):
+    """Make a new run the current one for stage()"""
+    global _current
+    _current = Run(job, run_id)
+    return _current
+
+
+def current_run():
+    return _current
+
+
+@contextlib.contextmanager
+def activate(run):
+    """Make `run` current for the duration of the block (e.g. one job in a worker process)"""
+    global _current
+    previous, _current = _current, run
+    try:
+        yield run
+    finally:
+        _current = previous
+
+
+def stage(name, ticker=None, rows=None):
+    """Stage of the current run; starts a run named after the script if there is none"""
+    run = _current or start_run(os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0])
+    return run.stage(name, ticker, rows)
+
+
+def finish_run(status="ok", collection=None, **extra):
+    """Summarize the current run, write the .prom file and store the summary in MongoDB"""
+    global _current
+    run = _current
+    if run is None:
+        return None
+    summary = run.summary(status)
+    summary.update(extra)
+    _current = None
+
+    metrics_dir = os.environ.get('PIPELINE_METRICS_DIR')
+    if metrics_dir:
+        try:
+            run.write_prometheus(summary, metrics_dir)
+        except OSError as e:
+            print(f"[WARNING] Could not write Prometheus metrics: {e}")
+    try:
+        collection = collection if collection is not None else db.get_collection(db.PIPELINE_RUNS)
+        collection.insert_one(dict(summary))
+    except Exception as e:
+        print(f"[WARNING] Could not store run summary: {e}")
+
+    slowest = summary["slowest"][:3]
+    print(f"[INFO] {run.job} run {run.run_id[:8]} took {summary['seconds']}s, peak RSS "
+          f"{summary['peak_rss_bytes'] / 2**20:.0f} MiB; slowest: " +
+          ", ".join(f"{s['stage']}/{s['ticker'] or 'all'} {s['seconds']:.2f}s" for s in slowest))
+    return summary
@@ -0,0 +1,183 @@
+import os
+import json
+import uuid
+from datetime import timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Local OHLCV store shared by the dataset job and model training.
+# One Parquet file per ticker; the date range that has already been requested
+# from Yahoo is kept in the file metadata so weekends and holidays at the edges
+# of the range are not fetched again.
+CACHE_DIR = os.environ.get(
+    "OHLCV_CACHE_DIR",
+    os.path.normpath(os.path.join(os.path.dirname(__file__), "cache", "ohlcv"))
+)
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+_RANGE_KEY = b"ohlcv_range"
+
+# An empty answer for a gap longer than this is treated as a failed download
+# rather than a stretch of non-trading days, so the gap is retried next time
+MAX_EMPTY_GAP = timedelta(days=7)
+
+# Replaces the Yahoo download when set (offline runs, benchmarks)
+_source = None
+
+
+def set_source(fn):
+    """Route downloads through fn(ticker, start, end), e.g. an offline data set; None restores Yahoo"""
+    global _source
+    _source = fn
+
+
+def download(ticker, start, end):
+    """Download through the configured source; OHLCV_OFFLINE=1 turns every download into an error"""
+    if os.environ.get("OHLCV_OFFLINE") == "1":
+        raise ConnectionError(f"Offline: {ticker} from {start} to {end} is not in the local store")
+    return (_source or download_ohlcv)(ticker, start, end)
+
+
+def download_ohlcv(ticker, start, end):
+    """Download daily bars for [start, end) from Yahoo Finance"""
+    # Imported here: most runs are served from the store and never download
+    import yfinance as yf
+    # Ticker.history keeps its state per Ticker object, unlike yf.download which
+    # shares module-level buffers and is not safe to call from several threads
+    data = yf.Ticker(ticker).history(start=start, end=end, auto_adjust=False, actions=False)
+    return normalize_ohlcv(data)
+
+
+def normalize_ohlcv(data):
+    """Flatten yfinance output into a plain Date-indexed OHLCV frame"""
+    if data is None or data.empty:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+    data = data.copy()
+    # Handle multi-index columns if present
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    data.index = pd.to_datetime(data.index)
+    if data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
+    data.index.name = "Date"
+    columns = [c for c in OHLCV_COLUMNS if c in data.columns]
+    return data[columns]
+
+
+def _cache_path(ticker):
+    return os.path.join(CACHE_DIR, f"{ticker}.parquet")
+
+
+def _to_day(value):
+    return pd.Timestamp(value).normalize()
+
+
+def read_cached(ticker):
+    """Return (frame, (start, end)) from the local store, or (empty, None)"""
+    path = _cache_path(ticker)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=OHLCV_COLUMNS), None
+    try:
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[_RANGE_KEY])
+        frame = table.to_pandas()
+        return frame, (_to_day(meta["start"]), _to_day(meta["end"]))
+    except Exception as e:
+        print(f"[WARNING] Ignoring unreadable OHLCV cache for {ticker}: {e}")
+        return pd.DataFrame(columns=OHLCV_COLUMNS), None
+
+
+def cached_version(ticker):
+    """Token that changes whenever the ticker's stored bars are rewritten, or None when
+    nothing is stored; a stat call, so it can be checked on every request"""
+    try:
+        stat = os.stat(_cache_path(ticker))
+    except FileNotFoundError:
+        return None
+    # Files are replaced, never written in place, so a new write is a new mtime/inode
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+def _write_cached(ticker, frame, start, end):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    table = pa.Table.from_pandas(frame, preserve_index=True)
+    meta = dict(table.schema.metadata or {})
+    meta[_RANGE_KEY] = json.dumps({
+        "start": start.strftime("%Y-%m-%d"),
+        "end": end.strftime("%Y-%m-%d"),
+    }).encode()
+    table = table.replace_schema_metadata(meta)
+
+    # Write to a temporary file first so readers never see a partial file
+    path = _cache_path(ticker)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _merge(frames):
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+    merged = pd.concat(frames)
+    # Later downloads win, so a partial bar from a previous run gets replaced
+    merged = merged[~merged.index.duplicated(keep="last")]
+    return merged.sort_index()
+
+
+def get_ohlcv(ticker, start, end, fetch_fn=None, refresh=False):
+    """Return daily bars for [start, end), downloading only what is missing locally"""
+    fetch_fn = fetch_fn or download
+    start, end = _to_day(start), _to_day(end)
+
+    cached, cached_range = (pd.DataFrame(columns=OHLCV_COLUMNS), None) if refresh else read_cached(ticker)
+
+    if cached_range is None:
+        frame = normalize_ohlcv(fetch_fn(ticker, start, end))
+        if frame.empty:
+            return frame
+        _write_cached(ticker, frame, start, end)
+        return frame.loc[start:end - timedelta(days=1)]
+
+    cached_start, cached_end = cached_range
+    new_start, new_end = cached_start, cached_end
+    parts = [cached]
+
+    # Missing history before the first cached day
+    if start < cached_start:
+        head = normalize_ohlcv(fetch_fn(ticker, start, cached_start))
+        if not head.empty or cached_start - start <= MAX_EMPTY_GAP:
+            parts.insert(0, head)
+            new_start = start
+
+    # Missing trailing range; start from the last cached bar so it gets refreshed
+    if end > cached_end:
+        tail_start = cached_end
+        if not cached.empty:
+            tail_start = min(tail_start, cached.index[-1].normalize())
+        tail = normalize_ohlcv(fetch_fn(ticker, tail_start, end))
+        if not tail.empty or end - tail_start <= MAX_EMPTY_GAP:
+            parts.append(tail)
+            new_end = end
+
+    if (new_start, new_end) != (cached_start, cached_end):
+        cached = _merge(parts)
+        _write_cached(ticker, cached, new_start, new_end)
+
+    return cached.loc[start:end - timedelta(days=1)]
+
+
+def clear_cache(ticker=None):
+    """Remove one ticker (or every ticker) from the local store"""
+    if ticker is not None:
+        path = _cache_path(ticker)
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    if os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith(".parquet"):
+                os.remove(os.path.join(CACHE_DIR, name))
@@ -0,0 +1,120 @@
+import numpy as np
+
+# Rolling order statistics for every column of a (bar x ticker) array at once,
+# by the van Herk / Gil-Werman block decomposition used for rolling minima.
+# The bars are cut into blocks of one window; a window that does not start a
+# block is the tail of one block plus the head of the next. For the r-th
+# smallest value only the r + 1 smallest of each part matter, so every block
+# gets the sorted K smallest of each of its heads (prefixes) and tails
+# (suffixes), built by inserting one bar at a time into a K-long sorted run:
+# w NumPy steps per group of blocks, each over every block and ticker of the
+# group. A window's r-th smallest is then the r-th smallest of the union of one
+# tail run and one head run, r + 2 elementwise min/max passes over all windows.
+# High ranks are low ranks of the negated values, so K never exceeds half a
+# window; the VaR quantiles need K = 26 of 250.
+
+# Run values per array in a group of blocks; bounds the temporaries to ~32 MB
+CHUNK_ELEMENTS = 1 << 21
+
+
+def _quantile_positions(qs, window):
+    """Order-statistic ranks below and above each quantile and the interpolation weight
+    (linear, the pandas/NumPy default)"""
+    pos = np.asarray(qs, dtype=np.float64) * (window - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, window - 1)
+    return lo, hi, pos - lo
+
+
+def _sorted_runs(blocks, K, forward=True):
+    """Sorted K smallest values of every head (forward) or tail of each (block, bar, ticker)
+    block, as a (K, block, bar, ticker) array"""
+    groups, window, k = blocks.shape
+    out = np.empty((K, groups, window, k))
+    # run[j] is the j-th smallest so far; shifted[j] = run[j - 1], -inf before the first
+    buffer = np.full((K + 1, groups, k), np.inf)
+    buffer[0] = -np.inf
+    run, shifted = buffer[1:], buffer[:-1]
+    for t in (range(window) if forward else range(window - 1, -1, -1)):
+        # Inserting v into a sorted run: run[j] stays if run[j] <= v, else max(v, run[j - 1])
+        np.minimum(run, np.maximum(blocks[:, t], shifted), out=run)
+        out[:, :, t] = run
+    return out
+
+
+def _union_rank(tails, heads, r):
+    """r-th smallest (0-based) of the union of two sorted runs: taking j values from the
+    tail run and r + 1 - j from the head run, the smallest max(tails[j-1], heads[r-j])"""
+    value = np.minimum(tails[r], heads[r])
+    pair = np.empty_like(value)
+    for j in range(1, r + 1):
+        np.maximum(tails[j - 1], heads[r - j], out=pair)
+        np.minimum(value, pair, out=value)
+    return value
+
+
+def _order_statistics(x, window, ranks):
+    """The ranks-th smallest values (0-based) of every trailing window of every column"""
+    n, k = x.shape
+    K = int(max(ranks)) + 1
+    n_blocks = -(-n // window)
+    # NaN and the padding after the last bar sort last; windows with NaN are masked by the caller
+    blocks = np.full((n_blocks * window, k), np.inf)
+    blocks[:n] = np.where(np.isnan(x), np.inf, x)
+    blocks = blocks.reshape(n_blocks, window, k)
+
+    out = np.empty((n_blocks * window, k, len(ranks)))
+    group = max(1, CHUNK_ELEMENTS // (window * k * K))
+    for g0 in range(0, n_blocks, group):
+        g1 = min(n_blocks, g0 + group)
+        heads = _sorted_runs(blocks[g0:g1], K)
+        # The window ending at bar t of a block is the previous block's tail after t
+        # plus this block's head up to t; the last bar's window is the block alone
+        tails = np.full_like(heads, np.inf)
+        first = max(g0 - 1, 0)
+        if g1 - 1 > first:
+            # The first block has no previous block
+            skip = 0 if g0 else 1
+            tails[:, skip:, :-1] = _sorted_runs(blocks[first:g1 - 1], K, forward=False)[:, :, 1:]
+        for i, r in enumerate(ranks):
+            out[g0 * window:g1 * window, :, i] = _union_rank(tails, heads, r).reshape(-1, k)
+    return out[:n]
+
+
+def rolling_quantiles(x, window, qs):
+    """Rolling quantiles of every column of `x`.
+
+    `x` is a 1D series or a (bar x ticker) array whose columns may start with
+    or contain NaNs. Returns an array of shape x.shape + (len(qs),) matching
+    pandas rolling(window).quantile(q): NaN for any window without `window`
+    observations.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    squeeze = x.ndim == 1
+    if squeeze:
+        x = x[:, None]
+    n, k = x.shape
+    lo, hi, frac = _quantile_positions(qs, window)
+    out = np.full((n, k, len(lo)), np.nan)
+
+    if n >= window:
+        ranks = np.unique(np.concatenate([lo, hi]))
+        stats = np.empty((n, k, len(ranks)))
+        low = ranks <= window - 1 - ranks
+        if low.any():
+            stats[..., low] = _order_statistics(x, window, ranks[low])
+        if not low.all():
+            stats[..., ~low] = -_order_statistics(-x, window, window - 1 - ranks[~low])
+        below = stats[..., np.searchsorted(ranks, lo)]
+        above = stats[..., np.searchsorted(ranks, hi)]
+        with np.errstate(invalid="ignore"):
+            out = below + (above - below) * frac
+
+        # Windows that are not full or have a missing value have no quantile
+        missing = np.cumsum(np.isnan(x), axis=0)
+        gaps = missing[window - 1:].copy()
+        gaps[1:] -= missing[:-window]
+        out[:window - 1] = np.nan
+        out[window - 1:][gaps > 0] = np.nan
+
+    return out[:, 0] if squeeze else out
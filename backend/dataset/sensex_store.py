@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import db
+import columnar
+
+# Reader for the ticker data fetch_latest_data.py writes to MongoDB, whichever
+# layout it was written in:
+#   rows        one document per ticker per day (sensex_data)
+#   timeseries  the same documents in a time-series collection (Date/Ticker)
+#   buckets     one columnar document per ticker per month or year
+# The layout defaults to $SENSEX_STORAGE (rows when unset), so writers and
+# readers agree without passing it around.
+#
+#   panel = sensex_store.load_panel(["TCS.NS", "INFY.NS"], ["Close", "Return"], start="2020-01-01")
+#   panel["Return"]   # (date x ticker) DataFrame
+
+STORAGE_COLLECTIONS = {
+    "rows": db.SENSEX_DATA,
+    "timeseries": db.SENSEX_TIMESERIES,
+    "buckets": db.SENSEX_BUCKETS,
+}
+
+
+def default_storage():
+    storage = os.environ.get("SENSEX_STORAGE") or "rows"
+    if storage not in STORAGE_COLLECTIONS:
+        raise ValueError(f"Unknown SENSEX_STORAGE {storage!r}; expected one of {', '.join(STORAGE_COLLECTIONS)}")
+    return storage
+
+
+def get_collection(storage=None):
+    return db.get_collection(STORAGE_COLLECTIONS[storage or default_storage()])
+
+
+def _bound(value):
+    return None if value is None else pd.Timestamp(value).to_pydatetime()
+
+
+def _range_filter(low, high):
+    condition = {}
+    if low is not None:
+        condition["$gte"] = low
+    if high is not None:
+        condition["$lte"] = high
+    return condition
+
+
+def _read_rows(collection, tickers, columns, start, end):
+    query = {"Ticker": {"$in": tickers}}
+    dates = _range_filter(start, end)
+    if dates:
+        query["Date"] = dates
+    projection = {"_id": 0, "Ticker": 1, "Date": 1, **{c: 1 for c in columns}}
+    rows = pd.DataFrame(list(collection.find(query, projection)), columns=["Ticker", "Date", *columns])
+    rows["Date"] = pd.to_datetime(rows["Date"])
+    return {
+        ticker: group.set_index("Date")[columns].sort_index()
+        for ticker, group in rows.groupby("Ticker", sort=False)
+    }
+
+
+def _read_buckets(collection, tickers, columns, start, end):
+    query = {"Ticker": {"$in": tickers}}
+    # A bucket is needed when its [Start, End] span overlaps the requested range
+    if start is not None:
+        query["End"] = {"$gte": start}
+    if end is not None:
+        query["Start"] = {"$lte": end}
+    stored = set(columns) - {"Risk_Label", "High_Risk", "Ticker"}
+    if stored != set(columns):
+        stored.add("Risk_Code")
+    projection = {"_id": 0, "Ticker": 1, "Date": 1, "Dtypes": 1, **{f"Columns.{c}": 1 for c in stored}}
+
+    # Arrays are concatenated per ticker, so one DataFrame is built per ticker, not per bucket
+    parts = {}
+    for doc in collection.find(query, projection):
+        parts.setdefault(doc["Ticker"], []).append(columnar.decode_arrays(doc, stored))
+    frames = {}
+    for ticker, pieces in parts.items():
+        pieces.sort(key=lambda piece: piece[0][0])
+        dates = np.concatenate([d for d, _ in pieces])
+        frame = pd.DataFrame(
+            {name: np.concatenate([arrays[name] for _, arrays in pieces]) for name in pieces[0][1]},
+            index=pd.DatetimeIndex(dates, name="Date"),
+        )
+        frame = columnar.add_derived(frame, ticker)
+        if start is not None or end is not None:
+            frame = frame.loc[start:end]
+        frames[ticker] = frame.reindex(columns=columns)
+    return frames
+
+
+def load_frames(tickers, columns, start=None, end=None, storage=None, collection=None):
+    """{ticker: DataFrame indexed by Date} of `columns` for dates in [start, end]"""
+    storage = storage or default_storage()
+    collection = collection if collection is not None else get_collection(storage)
+    reader = _read_buckets if storage == "buckets" else _read_rows
+    return reader(collection, list(tickers), list(columns), _bound(start), _bound(end))
+
+
+def load_panel(tickers, columns=("Return",), start=None, end=None, storage=None, collection=None):
+    """{column: (date x ticker) DataFrame}; numeric columns come back as float64"""
+    frames = load_frames(tickers, columns, start, end, storage, collection)
+    index = pd.DatetimeIndex(sorted(set().union(*(f.index for f in frames.values()))), name="Date")
+    panel = {}
+    for column in columns:
+        panel[column] = pd.DataFrame(
+            {t: f[column].reindex(index) for t, f in frames.items()}, index=index,
+            columns=[t for t in tickers if t in frames],
+        )
+        if all(pd.api.types.is_numeric_dtype(dtype) for dtype in panel[column].dtypes):
+            panel[column] = panel[column].astype(np.float64)
+    return panel
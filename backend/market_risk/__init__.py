@@ -0,0 +1,2 @@
+# Command-line entry point for the market risk jobs; see market_risk/cli.py.
+# Importing the package loads nothing beyond the standard library.
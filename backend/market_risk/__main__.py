@@ -0,0 +1,5 @@
+import sys
+
+from market_risk.cli import main
+
+sys.exit(main())
@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import argparse
+
+# One entry point for the dataset and model jobs:
+#   python -m market_risk fetch     prices -> indicators -> sensex_data (dataset/fetch_latest_data.py)
+#   python -m market_risk train     baseline and per-ticker models (model/train_update.py)
+#   python -m market_risk stats     rebuild model_stats from the saved models, no retraining
+#   python -m market_risk predict   score tickers with the saved models
+# Only argparse is imported up front. Each command imports its own modules
+# (and with them pandas, XGBoost, pymongo, yfinance) when it runs, and MongoDB
+# is connected on the first query, so --help, argument errors and importing
+# this package cost no more than starting Python. Defaults that live in those
+# modules are resolved by the command, not here. fetch_latest_data.py and
+# train_update.py still run as scripts and take the same options.
+
+BACKEND_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+SOURCE_DIRS = [os.path.join(BACKEND_DIR, 'dataset'), os.path.join(BACKEND_DIR, 'model')]
+
+
+def _use_sources():
+    """Make the dataset and model modules importable, as the scripts do for each other"""
+    for directory in SOURCE_DIRS:
+        if directory not in sys.path:
+            sys.path.append(directory)
+
+
+def _fetch(args):
+    _use_sources()
+    import fetch_latest_data
+    import sensex_store
+    fetch_latest_data.main(args.workers, args.rate, args.storage or sensex_store.default_storage(),
+                           args.bucket, args.tickers)
+
+
+def _train(args):
+    if args.offline:
+        # Inherited by spawned workers
+        os.environ["OHLCV_OFFLINE"] = "1"
+    _use_sources()
+    import train_update
+    tickers = args.tickers or train_update.DEFAULT_TICKERS
+    start = args.start or train_update.feature_store.HISTORY_START
+    end = args.end or train_update.datetime.today().strftime('%Y-%m-%d')
+    if args.tune:
+        import tuning
+        tuning.main(tickers, start, end, args.workers, args.threads,
+                    {"trials": args.trials} if args.trials else None)
+    elif args.pooled:
+        import pooled_model
+        pooled_model.main(tickers, start, end, args.threads)
+    else:
+        incremental = None
+        if args.incremental:
+            incremental = {k: v for k, v in (("full_refit_days", args.full_refit_days),
+                                             ("warm_rounds", args.warm_rounds)) if v is not None}
+        train_update.main(tickers, start, end, args.workers, args.threads, incremental)
+
+
+def _stats(args):
+    if args.offline:
+        os.environ["OHLCV_OFFLINE"] = "1"
+    _use_sources()
+    import model_stats
+    if args.tickers:
+        tickers = args.tickers
+    else:
+        import artifacts
+        tickers = ['^BSESN'] + artifacts.ArtifactStore().tickers()
+    model_stats.refresh(tickers, args.method)
+
+
+def _predict(args):
+    _use_sources()
+    from inference_server import InferenceService
+    weights = None
+    if args.weights:
+        weights = {}
+        for item in args.weights:
+            ticker, _, weight = item.partition('=')
+            weights[ticker] = float(weight)
+    result = InferenceService(n_jobs=args.threads).predict(args.tickers, weights)
+    print(json.dumps(result, indent=2))
+    return 1 if result["errors"] and not result["predictions"] else 0
+
+
+def add_fetch_arguments(parser):
+    parser.add_argument('--tickers', nargs='+', default=None,
+                        help='Tickers to ingest (default: every Sensex ticker in fetch_latest_data.py)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of tickers ingested concurrently (1 = serial)')
+    parser.add_argument('--rate', type=float, default=2.0,
+                        help='Maximum Yahoo Finance requests per second (0 = unlimited)')
+    parser.add_argument('--storage', choices=['rows', 'timeseries', 'buckets'], default=None,
+                        help='rows: one document per ticker per day (sensex_data); '
+                             'timeseries: MongoDB time-series collection; '
+                             'buckets: one columnar document per ticker per --bucket '
+                             '(default: $SENSEX_STORAGE or rows)')
+    parser.add_argument('--bucket', choices=['month', 'year'], default='month',
+                        help='Bucket span for --storage buckets')
+
+
+def add_train_arguments(parser):
+    parser.add_argument('--tickers', nargs='+', default=None,
+                        help='Company tickers (default: train_update.DEFAULT_TICKERS; ^BSESN is always trained)')
+    parser.add_argument('--start', type=str, default=None, help='Start date (default: 2015-01-01)')
+    parser.add_argument('--end', type=str, default=None, help='End date (default: today)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Tickers trained in parallel processes (1 = serial); trials run in parallel with --tune')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Total thread budget shared by all workers (default: all cores)')
+    parser.add_argument('--pooled', action='store_true',
+                        help='Train one pooled cross-ticker model (pooled_model.py) instead of per-ticker models')
+    parser.add_argument('--tune', action='store_true',
+                        help='Search hyperparameters (tuning.py) for the baseline and each ticker instead of training')
+    parser.add_argument('--trials', type=int, default=None,
+                        help='Configurations tried per ticker with --tune (default: 27)')
+    parser.add_argument('--offline', action='store_true',
+                        help='Never download: train from the feature store and the local OHLCV store only')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip unchanged tickers and warm-start changed ones from the saved model')
+    parser.add_argument('--full-refit-days', type=int, default=None,
+                        help='Force a full refit when the last one is at least this old (default: 7)')
+    parser.add_argument('--warm-rounds', type=int, default=None,
+                        help='Boosting rounds added by a warm update (default: 10)')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='market_risk', description='Market risk data and model jobs')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    fetch = commands.add_parser('fetch', help='Download prices, compute indicators and write them to MongoDB')
+    add_fetch_arguments(fetch)
+    fetch.set_defaults(handler=_fetch)
+
+    train = commands.add_parser('train', help='Train the baseline and per-ticker models')
+    add_train_arguments(train)
+    train.set_defaults(handler=_train)
+
+    stats = commands.add_parser('stats', help='Rebuild model_stats from the saved models without retraining')
+    stats.add_argument('--tickers', nargs='+', default=None,
+                       help='Tickers to refresh (default: ^BSESN and every ticker with a saved model)')
+    stats.add_argument('--method', choices=['historical', 'parametric', 'cornish_fisher'], default='historical',
+                       help='VaR estimator (risk_metrics.py)')
+    stats.add_argument('--offline', action='store_true', help='Use the local OHLCV store only')
+    stats.set_defaults(handler=_stats)
+
+    predict = commands.add_parser('predict', help='Risk class probabilities from the saved models')
+    predict.add_argument('--tickers', nargs='+', required=True, help='Tickers to score on their latest stored bar')
+    predict.add_argument('--weights', nargs='+', metavar='TICKER=WEIGHT',
+                         help='Portfolio weights for a combined risk distribution')
+    predict.add_argument('--threads', type=int, default=1, help='XGBoost threads')
+    predict.set_defaults(handler=_predict)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args) or 0
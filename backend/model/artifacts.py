@@ -0,0 +1,250 @@
+import os
+import json
+import pickle
+import threading
+from datetime import datetime
+
+import numpy as np
+
+# Versioned model artifacts.
+# Each model directory (model/baseline, model/models/<ticker>) holds
+#   model.ubj      booster in XGBoost's native UBJSON format
+#   scaler.npy     float64 array of shape (3, n_features): mean, scale, var
+#   manifest.json  format version, features, training window, fingerprint, metrics
+#   params.json    tuned hyperparameters (tuning.py); optional, kept across retrains
+# Old pickled directories get native files next to their pickles (which are
+# tracked in git and left alone) the first time they are read; the native
+# files win from then on. Pickles do not record the model's feature list, so a
+# converted manifest is marked needs_retrain and the next training run refits
+# the model in full.
+# The pooled cross-ticker model (model/pooled) stores per-ticker scaling
+# instead: scalers.npy has shape (n_tickers, 2, n_features) with mean and scale
+# in the ticker order of its manifest.
+# XGBoost and scikit-learn are imported by the functions that need them, so
+# reading manifests and tuned parameters stays cheap for the CLI.
+
+FORMAT_VERSION = 1
+
+MODEL_FILE = 'model.ubj'
+SCALER_FILE = 'scaler.npy'
+POOLED_SCALERS_FILE = 'scalers.npy'
+MANIFEST_FILE = 'manifest.json'
+PARAMS_FILE = 'params.json'
+
+# Pickle names written before the native format existed
+LEGACY_MODEL_FILES = ('model.pkl', 'baseline_model.pkl')
+LEGACY_SCALER_FILE = 'scaler.pkl'
+
+MODELS_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), 'models'))
+BASELINE_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), 'baseline'))
+POOLED_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), 'pooled'))
+
+
+def _atomic_write(path, write):
+    # Keep the extension: XGBoost picks the file format from it
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{os.getpid()}.{threading.get_ident()}.{name}")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_json(path, data):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2, default=str)
+    _atomic_write(path, write)
+
+
+def read_manifest(model_dir):
+    """Manifest dict for a model directory, or None if it has no native artifacts"""
+    path = os.path.join(model_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version', 0) > FORMAT_VERSION:
+        raise ValueError(f"{path} has format {manifest['format_version']}, "
+                         f"newer than supported version {FORMAT_VERSION}")
+    return manifest
+
+
+def has_artifacts(model_dir):
+    return (os.path.exists(os.path.join(model_dir, MANIFEST_FILE))
+            or any(os.path.exists(os.path.join(model_dir, f)) for f in LEGACY_MODEL_FILES))
+
+
+def save_artifacts(model_dir, model, scaler, **manifest):
+    """Write booster, scaler and manifest; extra keyword arguments go into the manifest"""
+    import xgboost as xgb
+    os.makedirs(model_dir, exist_ok=True)
+
+    _atomic_write(os.path.join(model_dir, MODEL_FILE), model.save_model)
+
+    def write_scaler(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.vstack([scaler.mean_, scaler.scale_, scaler.var_]).astype(np.float64))
+    _atomic_write(os.path.join(model_dir, SCALER_FILE), write_scaler)
+
+    manifest = dict(manifest)
+    manifest.update({
+        "format_version": FORMAT_VERSION,
+        "model_file": MODEL_FILE,
+        "scaler_file": SCALER_FILE,
+        "n_features": int(len(scaler.mean_)),
+        "scaler_samples": int(np.max(scaler.n_samples_seen_)),
+        "scaler_features": [str(c) for c in getattr(scaler, 'feature_names_in_', [])],
+        "xgboost_version": xgb.__version__,
+        "saved_at": datetime.now().isoformat(timespec='seconds'),
+    })
+    _write_json(os.path.join(model_dir, MANIFEST_FILE), manifest)
+    return manifest
+
+
+def update_manifest(model_dir, **fields):
+    """Merge fields into an existing manifest without touching the model files"""
+    manifest = read_manifest(model_dir) or {}
+    manifest.update(fields)
+    _write_json(os.path.join(model_dir, MANIFEST_FILE), manifest)
+    return manifest
+
+
+def save_params(model_dir, params, **details):
+    """Persist tuned XGBClassifier keyword arguments; extra keyword arguments describe the search"""
+    import xgboost as xgb
+    os.makedirs(model_dir, exist_ok=True)
+    _write_json(os.path.join(model_dir, PARAMS_FILE), {
+        "format_version": FORMAT_VERSION,
+        "params": params,
+        **details,
+        "xgboost_version": xgb.__version__,
+        "saved_at": datetime.now().isoformat(timespec='seconds'),
+    })
+
+
+def read_params(model_dir):
+    """Tuned XGBClassifier keyword arguments for a model directory, or None when untuned"""
+    path = os.path.join(model_dir, PARAMS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["params"]
+
+
+def migrate_legacy(model_dir):
+    """Convert pickled model/scaler files to the native format; returns the manifest or None"""
+    legacy = next((f for f in LEGACY_MODEL_FILES if os.path.exists(os.path.join(model_dir, f))), None)
+    if legacy is None or not os.path.exists(os.path.join(model_dir, LEGACY_SCALER_FILE)):
+        return None
+    with open(os.path.join(model_dir, legacy), 'rb') as f:
+        model = pickle.load(f)
+    with open(os.path.join(model_dir, LEGACY_SCALER_FILE), 'rb') as f:
+        scaler = pickle.load(f)
+
+    manifest = save_artifacts(model_dir, model, scaler, migrated_from=legacy, needs_retrain=True)
+    print(f"[INFO] Migrated pickled artifacts in {model_dir} to format {FORMAT_VERSION}")
+    return manifest
+
+
+def _require_manifest(model_dir):
+    manifest = read_manifest(model_dir) or migrate_legacy(model_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No model artifacts in {model_dir}")
+    return manifest
+
+
+def load_model(model_dir, n_jobs=None):
+    """XGBClassifier for a model directory"""
+    import xgboost as xgb
+    manifest = _require_manifest(model_dir)
+    model = xgb.XGBClassifier(n_jobs=n_jobs)
+    model.load_model(os.path.join(model_dir, manifest['model_file']))
+    return model
+
+
+def load_scaler(model_dir, mmap=True):
+    """StandardScaler rebuilt from scaler.npy (memory-mapped by default)"""
+    from sklearn.preprocessing import StandardScaler
+    manifest = _require_manifest(model_dir)
+    values = np.load(os.path.join(model_dir, manifest['scaler_file']), mmap_mode='r' if mmap else None)
+    scaler = StandardScaler()
+    scaler.mean_, scaler.scale_, scaler.var_ = values[0], values[1], values[2]
+    scaler.n_features_in_ = manifest['n_features']
+    scaler.n_samples_seen_ = manifest['scaler_samples']
+    if manifest.get('scaler_features'):
+        scaler.feature_names_in_ = np.array(manifest['scaler_features'], dtype=object)
+    return scaler
+
+
+def load_artifacts(model_dir, n_jobs=None):
+    """(model, scaler, manifest) for one model directory"""
+    manifest = _require_manifest(model_dir)
+    return load_model(model_dir, n_jobs), load_scaler(model_dir), manifest
+
+
+def save_pooled_artifacts(model_dir, model, tickers, means, scales, **manifest):
+    """Write the pooled booster, per-ticker scaling (rows follow `tickers`) and manifest"""
+    import xgboost as xgb
+    os.makedirs(model_dir, exist_ok=True)
+    _atomic_write(os.path.join(model_dir, MODEL_FILE), model.save_model)
+
+    def write_scalers(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.stack([np.asarray(means), np.asarray(scales)], axis=1).astype(np.float64))
+    _atomic_write(os.path.join(model_dir, POOLED_SCALERS_FILE), write_scalers)
+
+    manifest = dict(manifest)
+    manifest.update({
+        "format_version": FORMAT_VERSION,
+        "model_file": MODEL_FILE,
+        "scalers_file": POOLED_SCALERS_FILE,
+        "tickers": list(tickers),
+        "xgboost_version": xgb.__version__,
+        "saved_at": datetime.now().isoformat(timespec='seconds'),
+    })
+    _write_json(os.path.join(model_dir, MANIFEST_FILE), manifest)
+    return manifest
+
+
+def load_pooled_artifacts(model_dir=POOLED_DIR, n_jobs=None):
+    """(model, {ticker: (mean, scale)}, manifest) for the pooled model"""
+    import xgboost as xgb
+    manifest = read_manifest(model_dir)
+    if manifest is None or 'scalers_file' not in manifest:
+        raise FileNotFoundError(f"No pooled model artifacts in {model_dir}")
+    model = xgb.XGBClassifier(n_jobs=n_jobs)
+    model.load_model(os.path.join(model_dir, manifest['model_file']))
+    values = np.load(os.path.join(model_dir, manifest['scalers_file']), mmap_mode='r')
+    scalers = {t: (values[i, 0], values[i, 1]) for i, t in enumerate(manifest['tickers'])}
+    return model, scalers, manifest
+
+
+class ArtifactStore:
+    """Lazy, thread-safe access to per-ticker artifacts under model/models"""
+
+    def __init__(self, root=MODELS_DIR):
+        self.root = root
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def model_dir(self, ticker):
+        return os.path.join(self.root, ticker)
+
+    def tickers(self):
+        """Tickers that have artifacts, without opening any of them"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(t for t in os.listdir(self.root) if has_artifacts(self.model_dir(t)))
+
+    def manifest(self, ticker):
+        return _require_manifest(self.model_dir(ticker))
+
+    def get(self, ticker):
+        """(model, scaler, manifest) for one ticker, loaded on first use"""
+        with self._lock:
+            if ticker not in self._loaded:
+                self._loaded[ticker] = load_artifacts(self.model_dir(ticker))
+            return self._loaded[ticker]
+
+    def evict(self, ticker):
+        with self._lock:
+            self._loaded.pop(ticker, None)
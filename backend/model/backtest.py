@@ -0,0 +1,249 @@
+import os
+import sys
+import math
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import xgboost as xgb
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset')))
+import instrumentation
+import train_update
+
+# Walk-forward backtest of the risk classifier.
+# The whole history of a ticker goes into one DMatrix; every fold trains on a
+# slice of it (expanding from the first bar, or a rolling window) and predicts
+# the bars that follow. Risk thresholds (5%/10% return quantiles) come from the
+# training slice only, so the test labels never see the future. Folds of all
+# tickers run on one thread pool (XGBoost releases the GIL while training).
+# Reported per fold and aggregated per ticker:
+#   accuracy, multi-class Brier score, expected calibration error (ECE),
+#   VaR95 breaches of the training-window threshold with Kupiec's POF test.
+
+DEFAULTS = {
+    "mode": "expanding",   # or "rolling"
+    "min_train": 750,      # bars before the first test fold (about 3 years)
+    "window": 750,         # training bars in rolling mode
+    "step": 63,            # bars per test fold (about a quarter)
+    "horizon": 1,          # label each bar by the next bar's return; 0 = the bar's own return
+    "rounds": 100,         # boosting rounds (XGBClassifier's default)
+    "bins": 10,            # confidence bins for the calibration error
+    "var_level": 0.05,
+}
+
+PARAMS = {'objective': 'multi:softprob', 'num_class': 3, 'eval_metric': 'mlogloss', 'tree_method': 'hist'}
+
+
+def risk_labels(returns, q05, q10):
+    """label_risk for given thresholds: 2=High, 1=Medium, 0=Low"""
+    return np.select([returns < q05, returns < q10], [2, 1], 0)
+
+
+def fold_bounds(n, mode, min_train, window, step):
+    """[(train_start, test_start, test_end)] row bounds for a series of n bars"""
+    bounds = []
+    for test_start in range(min_train, n, step):
+        train_start = 0 if mode == "expanding" else max(0, test_start - window)
+        bounds.append((train_start, test_start, min(n, test_start + step)))
+    return bounds
+
+
+def kupiec(breaches, n, p):
+    """(LR statistic, p-value) of Kupiec's proportion-of-failures test"""
+    if n == 0:
+        return None, None
+
+    def loglik(q):
+        ll = 0.0
+        if breaches:
+            ll += breaches * math.log(q) if q > 0 else -math.inf
+        if n - breaches:
+            ll += (n - breaches) * math.log(1 - q) if q < 1 else -math.inf
+        return ll
+
+    lr = max(0.0, -2 * (loglik(p) - loglik(breaches / n)))
+    # Survival function of chi-squared with one degree of freedom
+    return lr, math.erfc(math.sqrt(lr / 2))
+
+
+class TickerData:
+    """Features as one DMatrix plus the return each row is labelled by"""
+
+    def __init__(self, ticker, data, horizon, nthread):
+        self.ticker = ticker
+        returns = data['Return'].to_numpy(dtype=np.float64)
+        n = len(data) - horizon
+        # Row t is labelled by the return `horizon` bars later
+        self.target = returns[horizon:]
+        self.dates = data.index[:n]
+        if horizon == 0:
+            # A bar's own Return is its label; as a feature it scores ~99% without
+            # predicting anything. The indicators still include the bar's close.
+            data = data.drop(columns=['Return'])
+        self.dmatrix = xgb.DMatrix(data.to_numpy(dtype=np.float32)[:n],
+                                   feature_names=[str(c) for c in data.columns], nthread=nthread)
+
+    def __len__(self):
+        return len(self.target)
+
+
+def run_fold(data, bounds, options, nthread):
+    train_start, test_start, test_end = bounds
+    # Rows whose label reaches into the test period are purged from training
+    train_idx = np.arange(train_start, test_start - options["horizon"])
+    test_idx = np.arange(test_start, test_end)
+
+    q05, q10 = np.quantile(data.target[train_idx], [options["var_level"], 0.10])
+    dtrain = data.dmatrix.slice(train_idx)
+    dtrain.set_label(risk_labels(data.target[train_idx], q05, q10))
+    booster = xgb.train({**PARAMS, 'nthread': nthread}, dtrain, num_boost_round=options["rounds"])
+
+    proba = booster.predict(data.dmatrix.slice(test_idx))
+    returns = data.target[test_idx]
+    y = risk_labels(returns, q05, q10)
+    predicted = proba.argmax(axis=1)
+    correct = predicted == y
+
+    # Calibration of the top-class probability, kept as bin sums so folds aggregate exactly
+    confidence = proba.max(axis=1)
+    bins = np.minimum((confidence * options["bins"]).astype(int), options["bins"] - 1)
+    calibration = np.stack([
+        np.bincount(bins, minlength=options["bins"]),
+        np.bincount(bins, weights=confidence, minlength=options["bins"]),
+        np.bincount(bins, weights=correct, minlength=options["bins"]),
+    ])
+
+    onehot = np.eye(3)[y]
+    breaches = int((returns < q05).sum())
+    return {
+        "ticker": data.ticker,
+        "train_start": data.dates[train_start].strftime('%Y-%m-%d'),
+        "test_start": data.dates[test_start].strftime('%Y-%m-%d'),
+        "test_end": data.dates[test_end - 1].strftime('%Y-%m-%d'),
+        "train_rows": int(len(train_idx)),
+        "test_rows": int(len(test_idx)),
+        "accuracy": float(correct.mean()),
+        "brier": float(((proba - onehot) ** 2).sum(axis=1).mean()),
+        "ece": expected_calibration_error(calibration),
+        "var95": float(q05),
+        "breaches": breaches,
+        "high_risk_predicted": int((predicted == 2).sum()),
+        "_calibration": calibration,
+    }
+
+
+def expected_calibration_error(calibration):
+    counts, confidence, correct = calibration
+    filled = counts > 0
+    gaps = np.abs(correct[filled] - confidence[filled])
+    return float(gaps.sum() / counts.sum()) if counts.sum() else None
+
+
+def summarize(folds, var_level):
+    """Row-weighted aggregates of a list of fold results"""
+    rows = sum(f["test_rows"] for f in folds)
+    breaches = sum(f["breaches"] for f in folds)
+    lr, pvalue = kupiec(breaches, rows, var_level)
+    return {
+        "folds": len(folds),
+        "test_rows": rows,
+        "accuracy": sum(f["accuracy"] * f["test_rows"] for f in folds) / rows,
+        "brier": sum(f["brier"] * f["test_rows"] for f in folds) / rows,
+        "ece": expected_calibration_error(sum(f["_calibration"] for f in folds)),
+        "breaches": breaches,
+        "breach_rate": breaches / rows,
+        "expected_breaches": var_level * rows,
+        "kupiec_lr": lr,
+        "kupiec_pvalue": pvalue,
+    }
+
+
+def backtest(tickers, start, end, options=None, workers=None, threads=None):
+    """Walk-forward results: {"options", "folds", "tickers": {ticker: summary}, "overall"}"""
+    options = dict(DEFAULTS, **(options or {}))
+    threads = threads or os.cpu_count() or 1
+    workers = max(1, min(workers or threads, threads))
+    nthread = max(1, threads // workers)
+
+    datasets = []
+    for ticker in tickers:
+        try:
+            data = train_update.load_features(ticker, start, end)
+        except Exception as e:
+            print(f"[ERROR] Skipping {ticker}: {e}")
+            continue
+        datasets.append(TickerData(ticker, data, options["horizon"], threads))
+
+    jobs = [
+        (data, bounds) for data in datasets
+        for bounds in fold_bounds(len(data), options["mode"], options["min_train"],
+                                  options["window"], options["step"])
+    ]
+    with instrumentation.stage("backtest", rows=sum(b[2] - b[1] for _, b in jobs)) as record:
+        record["folds"] = len(jobs)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            folds = list(pool.map(lambda job: run_fold(job[0], job[1], options, nthread), jobs))
+
+    by_ticker = {}
+    for fold in folds:
+        by_ticker.setdefault(fold["ticker"], []).append(fold)
+    result = {
+        "options": options,
+        "tickers": {t: summarize(f, options["var_level"]) for t, f in by_ticker.items()},
+        "overall": summarize(folds, options["var_level"]) if folds else None,
+        "folds": [{k: v for k, v in f.items() if not k.startswith('_')} for f in folds],
+    }
+    return result
+
+
+def print_report(result):
+    print(f"{'ticker':<16} {'folds':>5} {'rows':>6} {'acc':>7} {'brier':>7} {'ece':>6} "
+          f"{'breach':>7} {'kupiec p':>9}")
+    rows = list(result["tickers"].items()) + [("ALL", result["overall"])]
+    for ticker, s in rows:
+        if s is None:
+            continue
+        print(f"{ticker:<16} {s['folds']:>5} {s['test_rows']:>6} {s['accuracy']:>7.2%} {s['brier']:>7.4f} "
+              f"{s['ece']:>6.3f} {s['breach_rate']:>7.2%} {s['kupiec_pvalue']:>9.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the risk classifier")
+    parser.add_argument('--tickers', nargs='+', default=['^BSESN'] + train_update.DEFAULT_TICKERS,
+                        help='Tickers to backtest (default: ^BSESN and train_update.DEFAULT_TICKERS)')
+    parser.add_argument('--start', default=train_update.feature_store.HISTORY_START, help='Start date')
+    parser.add_argument('--end', default=datetime.today().strftime('%Y-%m-%d'), help='End date')
+    parser.add_argument('--mode', choices=['expanding', 'rolling'], default=DEFAULTS['mode'],
+                        help='Expanding window from the first bar, or a rolling --window')
+    parser.add_argument('--min-train', type=int, default=DEFAULTS['min_train'],
+                        help='Bars before the first test fold')
+    parser.add_argument('--window', type=int, default=DEFAULTS['window'], help='Training bars in rolling mode')
+    parser.add_argument('--step', type=int, default=DEFAULTS['step'], help='Bars per test fold')
+    parser.add_argument('--horizon', type=int, default=DEFAULTS['horizon'],
+                        help='Label each bar by the return this many bars ahead '
+                             '(0 = same bar, with Return left out of the features)')
+    parser.add_argument('--rounds', type=int, default=DEFAULTS['rounds'], help='Boosting rounds per fold')
+    parser.add_argument('--workers', type=int, default=None, help='Folds trained at once (default: all cores)')
+    parser.add_argument('--threads', type=int, default=None, help='Total thread budget (default: all cores)')
+    parser.add_argument('--output', help='Write the full result (every fold) to this JSON file')
+    args = parser.parse_args()
+
+    instrumentation.start_run("backtest")
+    started, status = time.perf_counter(), "failed"
+    try:
+        result = backtest(args.tickers, args.start, args.end, {
+            "mode": args.mode, "min_train": args.min_train, "window": args.window,
+            "step": args.step, "horizon": args.horizon, "rounds": args.rounds,
+        }, args.workers, args.threads)
+        print_report(result)
+        print(f"[INFO] {len(result['folds'])} folds in {time.perf_counter() - started:.1f}s")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(result, f, indent=2)
+        status = "ok"
+    finally:
+        instrumentation.finish_run(status)
@@ -0,0 +1,288 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset')))
+import ohlcv_store
+import features
+import artifacts
+
+# Local HTTP inference service over the trained artifacts.
+#   GET  /health   cache statistics
+#   POST /predict  {"tickers": [...], "weights": {ticker: w}, "rows": {ticker: [{feature: value}]}}
+# Hot models stay in a size-bounded LRU cache. Each request runs one
+# predict_proba call per distinct model: tickers without their own model are
+# stacked into a single call on the baseline model.
+
+RISK_LABELS = ["Low", "Medium", "High"]
+
+# Bars used to rebuild the latest feature row; long enough for the EMA-based
+# indicators (MACD, RSI) to settle to the values seen in training
+FEATURE_LOOKBACK = 400
+
+
+class ModelCache:
+    """Thread-safe LRU cache of (model, scaler, manifest) per model directory"""
+
+    def __init__(self, capacity=16, n_jobs=1):
+        self.capacity = capacity
+        self.n_jobs = n_jobs
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model_dir):
+        with self._lock:
+            entry = self._entries.get(model_dir)
+            if entry is not None:
+                self._entries.move_to_end(model_dir)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        if artifacts.read_manifest(model_dir) is None:
+            # Converting pickles writes into the model directory; that is left to
+            # training (python -m market_risk train), not done while serving
+            raise ValueError(f"Model in {model_dir} is still pickled; retrain it to serve predictions")
+        # Load outside the lock so a cold model does not stall cached ones;
+        # two threads racing on the same model both load it and one copy wins
+        entry = artifacts.load_artifacts(model_dir, self.n_jobs)
+        with self._lock:
+            self._entries[model_dir] = entry
+            self._entries.move_to_end(model_dir)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries), "capacity": self.capacity,
+                "hits": self.hits, "misses": self.misses,
+            }
+
+
+class LatestFeatures:
+    """Most recent feature row per ticker, rebuilt when the ticker's stored bars are rewritten"""
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, ticker, columns):
+        """(date, float64 array of shape (1, len(columns))) for the last stored bar"""
+        # A stat of the store file, not a read: hits must stay cheap
+        version = ohlcv_store.cached_version(ticker)
+        if version is None:
+            raise LookupError(f"No OHLCV data stored for {ticker}")
+        key = (ticker, tuple(columns))
+        with self._lock:
+            cached = self._rows.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        data, _ = ohlcv_store.read_cached(ticker)
+        if data.empty:
+            raise LookupError(f"No OHLCV data stored for {ticker}")
+        # The last bar's features depend only on these rows
+        recent = data.iloc[-FEATURE_LOOKBACK:]
+        data = features.compute_frame_features(recent, features.TRAIN_FEATURES).dropna()
+        if data.empty:
+            raise LookupError(f"Not enough history to compute features for {ticker}")
+        # Keep the row already in model column order so a hit is a dict lookup
+        row = (data.index[-1].strftime('%Y-%m-%d'), data[list(columns)].to_numpy(dtype=np.float64)[-1:])
+        with self._lock:
+            self._rows[key] = (version, row)
+        return row
+
+
+def feature_columns(manifest, model_dir):
+    columns = manifest.get("features") or manifest.get("scaler_features")
+    if not columns:
+        # Converted pickles (needs_retrain) do not record their inputs, which predate the shared feature engine
+        raise ValueError(f"Model in {model_dir} has no feature list; retrain it to serve predictions")
+    return columns
+
+
+class InferenceService:
+    def __init__(self, models_dir=artifacts.MODELS_DIR, baseline_dir=artifacts.BASELINE_DIR,
+                 cache_size=16, n_jobs=1):
+        self.models_dir = models_dir
+        self.baseline_dir = baseline_dir
+        self.models = ModelCache(cache_size, n_jobs)
+        self.latest = LatestFeatures()
+
+    def model_dir(self, ticker):
+        model_dir = os.path.join(self.models_dir, ticker)
+        return model_dir if artifacts.has_artifacts(model_dir) else self.baseline_dir
+
+    def _rows_for(self, ticker, columns, rows):
+        if rows is None:
+            return self.latest.get(ticker, columns)
+        return None, pd.DataFrame(rows)[columns].to_numpy(dtype=np.float64)
+
+    def predict(self, tickers, weights=None, rows=None):
+        rows = rows or {}
+        predictions, errors = {}, {}
+
+        # Group the requested tickers by the model that scores them
+        groups = OrderedDict()
+        for ticker in dict.fromkeys(tickers):
+            groups.setdefault(self.model_dir(ticker), []).append(ticker)
+
+        for model_dir, members in groups.items():
+            try:
+                model, scaler, manifest = self.models.get(model_dir)
+                columns = feature_columns(manifest, model_dir)
+            except Exception as e:
+                errors.update({ticker: str(e) for ticker in members})
+                continue
+
+            batch = []
+            for ticker in members:
+                try:
+                    batch.append((ticker,) + self._rows_for(ticker, columns, rows.get(ticker)))
+                except Exception as e:
+                    errors[ticker] = str(e)
+            if not batch:
+                continue
+
+            X = np.vstack([values for _, _, values in batch])
+            # Same arithmetic as StandardScaler.transform without its per-call input validation
+            proba = model.predict_proba((X - scaler.mean_) / scaler.scale_)
+
+            model_name = "baseline" if model_dir == self.baseline_dir else "ticker"
+            offset = 0
+            for ticker, as_of, values in batch:
+                p = proba[offset:offset + len(values)]
+                offset += len(values)
+                predictions[ticker] = [self._describe(row, model_name) for row in p]
+                if as_of is not None:
+                    predictions[ticker][-1]["asOf"] = as_of
+
+        result = {
+            # Single-row answers are returned as one object, batches as a list
+            "predictions": {t: p[0] if len(p) == 1 else p for t, p in predictions.items()},
+            "errors": errors,
+        }
+        if len(tickers) > 1 or weights:
+            result["portfolio"] = self.portfolio(predictions, weights)
+        return result
+
+    @staticmethod
+    def _describe(proba, model_name):
+        code = int(np.argmax(proba))
+        return {
+            "risk": RISK_LABELS[code],
+            "riskCode": code,
+            "probabilities": {label: float(p) for label, p in zip(RISK_LABELS, proba)},
+            "model": model_name,
+        }
+
+    @staticmethod
+    def portfolio(predictions, weights=None):
+        """Weighted risk distribution over the latest prediction of each ticker"""
+        tickers = [t for t in predictions if not weights or t in weights]
+        if not tickers:
+            return None
+        w = np.array([float(weights[t]) if weights else 1.0 for t in tickers])
+        if w.sum() <= 0:
+            raise ValueError("Portfolio weights must sum to a positive value")
+        w = w / w.sum()
+        proba = np.array([[predictions[t][-1]["probabilities"][label] for label in RISK_LABELS]
+                          for t in tickers])
+        mixed = w @ proba
+        code = int(np.argmax(mixed))
+        return {
+            "risk": RISK_LABELS[code],
+            "riskCode": code,
+            "expectedRiskCode": float(mixed @ np.arange(len(RISK_LABELS))),
+            "probabilities": {label: float(p) for label, p in zip(RISK_LABELS, mixed)},
+            "weights": {t: float(x) for t, x in zip(tickers, w)},
+        }
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections avoid a TCP handshake per request
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY the body
+    # waits for the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    service = None
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send(404, {"error": "Not found"})
+        self._send(200, {"status": "ok", "cache": self.service.models.stats()})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            return self._send(404, {"error": "Not found"})
+        started = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            tickers = request.get("tickers") or list(request.get("weights") or {})
+            if isinstance(tickers, str):
+                tickers = [tickers]
+            if not tickers:
+                return self._send(400, {"error": "No tickers given"})
+            result = self.service.predict(tickers, request.get("weights"), request.get("rows"))
+        except (ValueError, TypeError, KeyError) as e:
+            return self._send(400, {"error": str(e)})
+        except Exception as e:
+            print(f"[ERROR] Prediction failed: {e}")
+            return self._send(500, {"error": str(e)})
+        result["latencyMs"] = round((time.perf_counter() - started) * 1000, 3)
+        self._send(200, result)
+
+    def log_message(self, format, *args):
+        # Per-request access logs would dominate the latency of cached requests
+        pass
+
+
+def serve(host="0.0.0.0", port=5001, cache_size=16, n_jobs=1, preload=False):
+    service = InferenceService(cache_size=cache_size, n_jobs=n_jobs)
+    if preload:
+        for ticker in artifacts.ArtifactStore(service.models_dir).tickers()[:cache_size]:
+            service.models.get(service.model_dir(ticker))
+    handler = type("Handler", (InferenceHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    print(f"[INFO] Inference server listening on {host}:{port} (cache size {cache_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='0.0.0.0', help='Address to bind')
+    parser.add_argument('--port', type=int, default=5001, help='Port to listen on')
+    parser.add_argument('--cache-size', type=int, default=16,
+                        help='Models kept loaded at once (least recently used are dropped)')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='XGBoost threads per prediction (1 is fastest for small batches)')
+    parser.add_argument('--preload', action='store_true',
+                        help='Load up to --cache-size ticker models at startup')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.cache_size, args.threads, args.preload)
@@ -0,0 +1,132 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset')))
+import ohlcv_store
+import artifacts
+import risk_metrics
+from stats_publisher import StatsPublisher
+
+# model_stats documents (risk figures and dashboard charts per ticker).
+# train_update.py builds them after training; refresh() rebuilds them from the
+# saved models' test accuracy and the latest stored prices, without
+# retraining, so the stats can be refreshed after a data update on their own.
+# The pipeline's stats stage builds them the same way.
+
+# Chart windows for the dashboard
+CHART_DAYS = 30
+VOLATILITY_WINDOW = 30
+
+
+def _price_matrix(price_frames):
+    """Right-aligned (bar x ticker) matrix of daily returns, like the feature panel"""
+    tickers = list(price_frames)
+    returns = [price_frames[t]['Close'].pct_change().to_numpy(dtype=np.float64)[1:] for t in tickers]
+    n = max((len(r) for r in returns), default=0)
+    matrix = np.full((n, len(tickers)), np.nan)
+    for j, r in enumerate(returns):
+        if len(r):
+            matrix[n - len(r):, j] = r
+    return tickers, matrix
+
+
+def stats_documents(price_frames, accuracies, method="historical"):
+    """model_stats documents for several tickers from one batched risk computation.
+
+    `price_frames` maps ticker -> OHLCV frame (about a year of bars), `accuracies`
+    maps ticker -> test accuracy in percent.
+    """
+    tickers, returns = _price_matrix(price_frames)
+    metrics = risk_metrics.risk_metrics(returns, method)
+
+    docs = {}
+    for j, ticker in enumerate(tickers):
+        data = price_frames[ticker]
+        close = data['Close']
+        current_price = float(close.iloc[-1])
+        var95_pct, var99_pct, cvar_pct = (metrics['var95'][j], metrics['var99'][j], metrics['cvar95'][j])
+
+        if np.isnan(var95_pct) or np.isnan(var99_pct):
+            print(f"[WARNING] Not enough returns for VaR on {ticker}, using fallback")
+            var95, var99 = current_price * 0.03, current_price * 0.05
+        else:
+            # Magnitude of the loss in price terms, capped at 20% of price as a sanity check
+            var95 = min(abs(var95_pct * current_price), current_price * 0.20)
+            var99 = min(abs(var99_pct * current_price), current_price * 0.20)
+        if np.isnan(cvar_pct):
+            cvar = var95 * 1.2
+        else:
+            cvar = min(abs(cvar_pct * current_price), current_price * 0.25)
+
+        recent = data.index[-CHART_DAYS:]
+        dates = recent.strftime('%Y-%m-%d')
+        price_history = [
+            {"date": d, "price": p}
+            for d, p in zip(dates, close.iloc[-CHART_DAYS:].to_numpy(dtype=float).tolist())
+        ]
+
+        # Dates without a full volatility window get a 2% placeholder
+        volatility = close.pct_change().rolling(window=VOLATILITY_WINDOW).std()
+        volatility = volatility.reindex(recent).fillna(0.02).to_numpy(dtype=float)
+        volatility_data = [{"date": d, "volatility": v} for d, v in zip(dates, volatility.tolist())]
+
+        var_data = [
+            {"loss": f"{loss * 100:.1f}%", "probability": prob}
+            for loss, prob in zip(metrics['loss_grid'][:, j].tolist(),
+                                  np.nan_to_num(metrics['exceedance'][:, j]).tolist())
+        ]
+
+        # Determine risk level based on 5% VaR
+        risk_level = "Medium"
+        if var95 > current_price * 0.03:  # More than 3% loss
+            risk_level = "High"
+        elif var95 < current_price * 0.015:  # Less than 1.5% loss
+            risk_level = "Low"
+
+        docs[ticker] = {
+            "ticker": ticker,
+            "var95": float(var95),
+            "var99": float(var99),
+            "cvar": float(cvar),
+            "riskLevel": risk_level,
+            "accuracy": float(accuracies.get(ticker, 0.0)),
+            "priceHistory": price_history,
+            "volatilityData": volatility_data,
+            "varData": var_data,
+            "updatedAt": datetime.now()
+        }
+    return docs
+
+
+def saved_model_documents(tickers, method="historical"):
+    """model_stats documents for tickers with saved models, from their manifests and recent prices"""
+    end = datetime.today()
+    start = end - timedelta(days=365)
+    frames, accuracies = {}, {}
+    for ticker in tickers:
+        model_dir = artifacts.BASELINE_DIR if ticker == '^BSESN' else os.path.join(artifacts.MODELS_DIR, ticker)
+        manifest = artifacts.read_manifest(model_dir)
+        if manifest is None or 'metrics' not in manifest:
+            print(f"[WARNING] No trained model with metrics for {ticker}; skipping")
+            continue
+        try:
+            data = ohlcv_store.get_ohlcv(ticker, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+        except Exception as e:
+            print(f"[ERROR] Could not load prices for {ticker}: {e}")
+            continue
+        if data.empty:
+            print(f"[WARNING] No recent prices for {ticker}; skipping")
+            continue
+        frames[ticker] = data
+        accuracies[ticker] = float(manifest['metrics']['accuracy']) * 100
+    return stats_documents(frames, accuracies, method)
+
+
+def refresh(tickers, method="historical", publisher=None):
+    """Rebuild and publish model_stats for tickers with saved models; returns the write counts"""
+    publisher = publisher or StatsPublisher()
+    publisher.extend(saved_model_documents(tickers, method).values())
+    return publisher.publish()
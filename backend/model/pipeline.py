@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset')))
+import features
+import feature_store
+import artifacts
+import instrumentation
+from stats_publisher import StatsPublisher, content_hash
+import train_update
+import model_stats
+
+# Incremental pipeline runner: fetch -> features -> label -> train -> stats as
+# a DAG of (ticker, stage) tasks.
+#
+# Every task has an input fingerprint (its stage version, the run parameters
+# and the output fingerprints of the tasks it depends on) and, once it has
+# succeeded, an output fingerprint (a content hash of what it produced). Both
+# are saved per ticker under STATE_DIR after every task, so a rerun
+#   * skips a task whose input fingerprint matches its last success and whose
+#     output still exists (downstream tasks then see the same input too),
+#   * resumes after a crash from the first task that did not finish, and
+#   * after a partial failure only redoes the failed tasks and what depends on them.
+# A skipped task's output is reloaded from the OHLCV store, the feature store or
+# the saved state only when a task that runs needs it.
+#
+# The stats stage builds model_stats from the saved model and the latest stored
+# prices, so a failed stats task is retried on its own by the next run.
+#
+# Tasks whose dependencies are done run concurrently on a thread pool. Company
+# models use the baseline's scaler when the baseline trained, and their own
+# otherwise, so a failed baseline does not stop the other tickers.
+
+STATE_DIR = os.environ.get(
+    "PIPELINE_STATE_DIR",
+    os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset', 'cache', 'pipeline'))
+)
+
+BASELINE_TICKER = '^BSESN'
+
+STAGES = ["fetch", "features", "label", "train", "stats"]
+
+# Bump a stage's version when its code changes in a way that should invalidate
+# the outputs it produced before
+STAGE_VERSIONS = {"fetch": 1, "features": features.ENGINE_VERSION, "label": 1, "train": 1, "stats": 2}
+
+
+def fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def model_dir(ticker):
+    return artifacts.BASELINE_DIR if ticker == BASELINE_TICKER else os.path.join(artifacts.MODELS_DIR, ticker)
+
+
+class StateStore:
+    """Last result of every (ticker, stage), one JSON file per ticker, written after each task"""
+
+    def __init__(self, directory=STATE_DIR):
+        self.directory = directory
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _path(self, ticker):
+        return os.path.join(self.directory, f"{ticker}.json")
+
+    def get(self, ticker, stage):
+        with self._lock:
+            if ticker not in self._states:
+                try:
+                    with open(self._path(ticker)) as f:
+                        self._states[ticker] = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    self._states[ticker] = {}
+            return self._states[ticker].get(stage)
+
+    def put(self, ticker, stage, record):
+        with self._lock:
+            self._states.setdefault(ticker, {})[stage] = record
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self._path(ticker)}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._states[ticker], f, indent=2, default=str)
+            os.replace(tmp_path, self._path(ticker))
+
+
+class Pipeline:
+    def __init__(self, tickers, start, end, workers=1, threads=None, force=False, state=None):
+        self.tickers = list(dict.fromkeys([BASELINE_TICKER] + list(tickers)))
+        self.start, self.end = start, end
+        self.workers, self.n_jobs = train_update.split_thread_budget(workers, threads)
+        self.force = force
+        self.state = state or StateStore()
+        self.values = {}
+        self._value_lock = threading.Lock()
+        self.results = {}
+
+    # Task graph
+
+    def dependencies(self, ticker, stage):
+        deps = {"fetch": [], "features": ["fetch"], "label": ["features"],
+                "train": ["label"], "stats": ["train"]}[stage]
+        deps = [(ticker, d) for d in deps]
+        if stage == "train" and ticker != BASELINE_TICKER:
+            # Ordering only: the baseline's scaler is used when it trained
+            deps.append((BASELINE_TICKER, "train"))
+        return deps
+
+    def input_fingerprint(self, ticker, stage):
+        upstream = {}
+        for dep in self.dependencies(ticker, stage):
+            record = self.state.get(*dep)
+            ok = self.results.get(dep) in ("ran", "skipped")
+            upstream["/".join(dep)] = record["output"] if ok and record else None
+        extra = {}
+        if stage == "fetch":
+            extra = {"start": self.start, "end": self.end}
+        elif stage == "features":
+            extra = {"features": feature_store.feature_set_version(features.TRAIN_FEATURES)}
+        elif stage == "train":
+            extra = {"params": artifacts.read_params(model_dir(ticker))}
+        return fingerprint(ticker, stage, STAGE_VERSIONS[stage], extra, upstream)
+
+    def output_exists(self, ticker, stage):
+        if stage == "features":
+            return feature_store.stored_range(ticker, features.TRAIN_FEATURES) is not None
+        if stage == "train":
+            return artifacts.has_artifacts(model_dir(ticker))
+        return True
+
+    # Stage bodies: each returns (output fingerprint, in-memory value, value saved in the state)
+
+    def run_fetch(self, ticker):
+        data = train_update.fetch_stock_data(ticker, self.start, self.end)
+        return train_update.fingerprint_frame(data), data, None
+
+    def run_features(self, ticker):
+        data = train_update.engineer_features(self.value(ticker, "fetch"))
+        feature_store.write_features(ticker, data, features.TRAIN_FEATURES, self.start, self.end)
+        return train_update.fingerprint_frame(data), data, None
+
+    def run_label(self, ticker):
+        data = train_update.label_risk(self.value(ticker, "features").copy())
+        return train_update.fingerprint_frame(data), data, None
+
+    def run_train(self, ticker):
+        # Trains on the label stage's frame; model_stats are left to the stats stage,
+        # which builds them from the saved model
+        data = self.value(ticker, "label")
+        if ticker == BASELINE_TICKER:
+            train_update.train_baseline_model(self.start, self.end, self.n_jobs, stats=False, data=data)
+        else:
+            scaler = None
+            if self.results.get((BASELINE_TICKER, "train")) in ("ran", "skipped"):
+                scaler = artifacts.load_scaler(artifacts.BASELINE_DIR)
+            train_update.train_company_model(ticker, None, scaler, self.start, self.end, self.n_jobs,
+                                             stats=False, data=data)
+        manifest = artifacts.read_manifest(model_dir(ticker))
+        output = fingerprint(manifest["fingerprint"],
+                             _file_hash(os.path.join(model_dir(ticker), manifest["model_file"])))
+        return output, None, None
+
+    def run_stats(self, ticker):
+        docs = list(model_stats.saved_model_documents([ticker]).values())
+        if not docs:
+            raise ValueError(f"No model_stats document was built for {ticker}")
+        publisher = StatsPublisher()
+        publisher.extend(docs)
+        publisher.publish()
+        return fingerprint([content_hash(doc) for doc in docs]), None, None
+
+    def value(self, ticker, stage):
+        """Output of a finished task: from this run, or reloaded when the task was skipped"""
+        key = (ticker, stage)
+        with self._value_lock:
+            if key in self.values:
+                return self.values[key]
+        if stage == "fetch":
+            value = train_update.fetch_stock_data(ticker, self.start, self.end)
+        elif stage == "features":
+            value = feature_store.read_features(ticker, features.TRAIN_FEATURES, self.start, self.end)
+            if value is None:
+                raise LookupError(f"Stored features for {ticker} no longer cover {self.start} to {self.end}")
+        elif stage == "label":
+            value = train_update.label_risk(self.value(ticker, "features").copy())
+        else:
+            value = self.state.get(ticker, stage)["value"]
+        with self._value_lock:
+            self.values[key] = value
+        return value
+
+    # Scheduling
+
+    def execute(self, ticker, stage):
+        """Run or skip one task; returns 'ran', 'skipped', 'failed' or 'blocked'"""
+        key = (ticker, stage)
+        hard = [d for d in self.dependencies(ticker, stage) if d[0] == ticker]
+        if any(self.results.get(d) not in ("ran", "skipped") for d in hard):
+            return "blocked"
+
+        input_fp = self.input_fingerprint(ticker, stage)
+        record = self.state.get(ticker, stage)
+        if (not self.force and record and record.get("status") == "ok" and record.get("input") == input_fp
+                and self.output_exists(ticker, stage)):
+            return "skipped"
+
+        started = time.perf_counter()
+        try:
+            with instrumentation.stage(f"pipeline_{stage}", ticker):
+                output, value, saved = getattr(self, f"run_{stage}")(ticker)
+        except Exception as e:
+            print(f"[ERROR] {stage} failed for {ticker}: {e}")
+            self.state.put(ticker, stage, {
+                "status": "failed", "input": input_fp, "error": str(e),
+                "finished_at": datetime.now().isoformat(timespec='seconds'),
+            })
+            return "failed"
+        with self._value_lock:
+            self.values[key] = value
+        self.state.put(ticker, stage, {
+            "status": "ok", "input": input_fp, "output": output, "value": saved,
+            "seconds": round(time.perf_counter() - started, 3),
+            "finished_at": datetime.now().isoformat(timespec='seconds'),
+        })
+        return "ran"
+
+    def run(self):
+        """Execute every task once its dependencies are finished; returns {(ticker, stage): outcome}"""
+        tasks = [(t, s) for t in self.tickers for s in STAGES]
+        remaining = {task: set(self.dependencies(*task)) for task in tasks}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            running = {}
+            while remaining or running:
+                ready = [task for task, deps in remaining.items() if all(d in self.results for d in deps)]
+                for task in ready:
+                    del remaining[task]
+                    running[pool.submit(self.execute, *task)] = task
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        self.results[task] = future.result()
+                    except Exception as e:
+                        print(f"[ERROR] {task[1]} crashed for {task[0]}: {e}")
+                        self.results[task] = "failed"
+        return self.results
+
+    def summary(self):
+        counts = {stage: {} for stage in STAGES}
+        for (ticker, stage), outcome in self.results.items():
+            counts[stage][outcome] = counts[stage].get(outcome, 0) + 1
+        failed = sorted({t for (t, _), outcome in self.results.items() if outcome == "failed"})
+        return {"stages": counts, "failed": failed}
+
+
+def main(tickers, start, end, workers=1, threads=None, force=False):
+    pipeline = Pipeline(tickers, start, end, workers, threads, force)
+    instrumentation.start_run("pipeline")
+    status = "failed"
+    try:
+        pipeline.run()
+        summary = pipeline.summary()
+        for stage, outcomes in summary["stages"].items():
+            print(f"[INFO] {stage:<9} " + ", ".join(f"{n} {outcome}" for outcome, n in sorted(outcomes.items())))
+        if summary["failed"]:
+            print(f"[WARNING] Failed tickers: {', '.join(summary['failed'])}; a rerun retries only their failed stages")
+        status = "failed" if summary["failed"] else "ok"
+        return summary
+    finally:
+        instrumentation.finish_run(status, workers=pipeline.workers, threads_per_worker=pipeline.n_jobs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run fetch -> features -> label -> train -> stats per ticker")
+    parser.add_argument('--tickers', nargs='+', default=train_update.DEFAULT_TICKERS,
+                        help='Company tickers (^BSESN is always included)')
+    parser.add_argument('--start', default=feature_store.HISTORY_START, help='Start date')
+    parser.add_argument('--end', default=datetime.today().strftime('%Y-%m-%d'), help='End date')
+    parser.add_argument('--workers', type=int, default=1, help='Tasks run concurrently')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Total thread budget shared by concurrent tasks (default: all cores)')
+    parser.add_argument('--force', action='store_true', help='Ignore fingerprints and rerun every stage')
+    parser.add_argument('--offline', action='store_true', help='Never download; use the local stores only')
+    args = parser.parse_args()
+    if args.offline:
+        os.environ["OHLCV_OFFLINE"] = "1"
+    main(args.tickers, args.start, args.end, args.workers, args.threads, args.force)
@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset')))
+import instrumentation
+import artifacts
+import train_update
+
+# One XGBoost model for every ticker instead of one model per ticker.
+# Each ticker's features are standardized with that ticker's own training-row
+# mean and scale (price levels differ by orders of magnitude), then all tickers
+# are stacked into one panel with Ticker and Sector as native categorical
+# features. Every ticker keeps the train/test split its per-ticker model uses,
+# so the per-ticker accuracy of both approaches is measured on the same rows.
+
+BASELINE_TICKER = '^BSESN'
+
+SECTORS = {
+    "^BSESN": "Index",
+    "RELIANCE.NS": "Energy",
+    "TCS.NS": "Technology", "INFY.NS": "Technology", "HCLTECH.NS": "Technology",
+    "WIPRO.NS": "Technology", "NIITLTD.NS": "Technology", "AAPL": "Technology", "SMSN.IL": "Technology",
+    "HDFCBANK.NS": "Financials", "KOTAKBANK.NS": "Financials", "AXISBANK.NS": "Financials",
+    "BAJFINANCE.NS": "Financials", "BAJAJFINSV.NS": "Financials", "SBIN.NS": "Financials",
+    "HDFCLIFE.NS": "Financials", "INDUSINDBK.NS": "Financials",
+    "HINDUNILVR.NS": "Consumer Staples", "ITC.NS": "Consumer Staples",
+    "TITAN.NS": "Consumer Discretionary",
+    "BHARTIARTL.NS": "Telecom",
+    "MARUTI.NS": "Automobiles", "M&M.NS": "Automobiles", "BAJAJ-AUTO.NS": "Automobiles",
+    "TATAMOTORS.NS": "Automobiles",
+    "LUPIN.NS": "Healthcare", "DRREDDY.NS": "Healthcare", "SUNPHARMA.NS": "Healthcare",
+    "DIVISLAB.NS": "Healthcare",
+    "ULTRACEMCO.NS": "Materials", "ASIANPAINT.NS": "Materials", "JSWSTEEL.NS": "Materials",
+    "NTPC.NS": "Utilities", "POWERGRID.NS": "Utilities",
+}
+DEFAULT_SECTOR = "Other"
+
+
+def sector(ticker):
+    return SECTORS.get(ticker, DEFAULT_SECTOR)
+
+
+def make_pooled_classifier(n_jobs=None):
+    return xgb.XGBClassifier(objective='multi:softmax', num_class=3, eval_metric='mlogloss',
+                             tree_method='hist', enable_categorical=True, n_jobs=n_jobs)
+
+
+def model_input(values, feature_cols, ticker, mean, scale, categories):
+    """Pooled model input for rows of one ticker: scaled features plus Ticker/Sector categories"""
+    frame = pd.DataFrame((np.asarray(values, dtype=np.float64) - mean) / scale, columns=feature_cols)
+    frame["Ticker"] = pd.Categorical.from_codes(
+        np.full(len(frame), categories["Ticker"].index(ticker)), categories["Ticker"])
+    frame["Sector"] = pd.Categorical.from_codes(
+        np.full(len(frame), categories["Sector"].index(sector(ticker))), categories["Sector"])
+    return frame
+
+
+def _scale(X):
+    """Mean and scale like StandardScaler (zero variance scaled by 1)"""
+    mean, std = X.mean(axis=0), X.std(axis=0)
+    return mean, np.where(std > 0, std, 1.0)
+
+
+def build_panel(tickers, start, end):
+    """Per-ticker splits and scaling; returns (parts, feature_cols), skipping tickers that fail"""
+    parts, feature_cols = {}, None
+    for ticker in tickers:
+        try:
+            data = train_update.prepare_training_data(ticker, start, end)
+        except Exception as e:
+            print(f"[ERROR] Skipping {ticker} in the pooled panel: {e}")
+            continue
+        cols = [c for c in data.columns if c != 'Risk']
+        if feature_cols is None:
+            feature_cols = cols
+        elif cols != feature_cols:
+            print(f"[ERROR] Skipping {ticker}: feature columns differ from the rest of the panel")
+            continue
+        X, y = data[feature_cols].to_numpy(dtype=np.float64), data['Risk'].to_numpy()
+        # Same indices as the per-ticker split of X_scaled in train_company_model
+        train_idx, test_idx = train_test_split(
+            np.arange(len(data)), test_size=0.2, stratify=y, random_state=42
+        )
+        mean, scale = _scale(X[train_idx])
+        parts[ticker] = {"X": X, "y": y, "train": train_idx, "test": test_idx, "mean": mean, "scale": scale}
+    return parts, feature_cols
+
+
+def per_ticker_accuracy(ticker, X_test, y_test, feature_cols):
+    """Accuracy of the existing per-ticker (or baseline) model on the same test rows, or None"""
+    model_dir = artifacts.BASELINE_DIR if ticker == BASELINE_TICKER else os.path.join(artifacts.MODELS_DIR, ticker)
+    if not artifacts.has_artifacts(model_dir):
+        return None
+    try:
+        model, scaler, manifest = artifacts.load_artifacts(model_dir)
+    except Exception as e:
+        print(f"[WARNING] Could not load the {ticker} model for comparison: {e}")
+        return None
+    if manifest.get('features') != feature_cols:
+        return None
+    return float(accuracy_score(y_test, model.predict((X_test - scaler.mean_) / scaler.scale_)))
+
+
+def train_pooled(tickers, start, end, n_jobs=None, model_dir=artifacts.POOLED_DIR):
+    """Train the pooled model, save it and compare it per ticker; returns the comparison summary"""
+    parts, feature_cols = build_panel(tickers, start, end)
+    if not parts:
+        raise ValueError("No ticker could be loaded for the pooled model")
+    categories = {"Ticker": list(parts), "Sector": sorted({sector(t) for t in parts})}
+
+    def stacked(split):
+        frames = [model_input(p["X"][p[split]], feature_cols, t, p["mean"], p["scale"], categories)
+                  for t, p in parts.items()]
+        return pd.concat(frames, ignore_index=True), np.concatenate([p["y"][p[split]] for p in parts.values()])
+
+    with instrumentation.stage("scale", rows=sum(len(p["X"]) for p in parts.values())):
+        X_train, y_train = stacked("train")
+        X_test, y_test = stacked("test")
+
+    fit_started = time.perf_counter()
+    with instrumentation.stage("fit", rows=len(X_train)):
+        model = make_pooled_classifier(n_jobs)
+        model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - fit_started
+
+    with instrumentation.stage("evaluate", rows=len(X_test)):
+        pooled_pred = model.predict(X_test)
+        comparison, offset = {}, 0
+        for ticker, p in parts.items():
+            n = len(p["test"])
+            y_t = y_test[offset:offset + n]
+            comparison[ticker] = {
+                "test_rows": int(n),
+                "pooled": float(accuracy_score(y_t, pooled_pred[offset:offset + n])),
+                "per_ticker": per_ticker_accuracy(ticker, p["X"][p["test"]], y_t, feature_cols),
+            }
+            offset += n
+
+    both = [c for c in comparison.values() if c["per_ticker"] is not None]
+    summary = {
+        "tickers": comparison,
+        "pooled_accuracy": float(accuracy_score(y_test, pooled_pred)),
+        "compared_tickers": len(both),
+        "mean_delta": float(np.mean([c["pooled"] - c["per_ticker"] for c in both])) if both else None,
+        "fit_seconds": round(fit_seconds, 3),
+        "train_rows": int(len(X_train)),
+    }
+
+    artifacts.save_pooled_artifacts(
+        model_dir, model, list(parts),
+        [p["mean"] for p in parts.values()], [p["scale"] for p in parts.values()],
+        features=feature_cols,
+        categories=categories,
+        sectors={t: sector(t) for t in parts},
+        training_window={"start": start, "end": end},
+        metrics={"accuracy": summary["pooled_accuracy"], "test_rows": int(len(y_test))},
+        comparison=comparison,
+    )
+    print(f"[INFO] Pooled artifacts saved to {model_dir}")
+    return summary
+
+
+def print_comparison(summary):
+    print(f"{'ticker':<16} {'rows':>6} {'pooled':>8} {'per-ticker':>11} {'delta':>8}")
+    for ticker, c in summary["tickers"].items():
+        own, delta = "n/a", ""
+        if c["per_ticker"] is not None:
+            own = f"{c['per_ticker']:.2%}"
+            delta = f"{(c['pooled'] - c['per_ticker']) * 100:+.1f}pp"
+        print(f"{ticker:<16} {c['test_rows']:>6} {c['pooled']:>8.2%} {own:>11} {delta:>8}")
+    delta = summary["mean_delta"]
+    print(f"[INFO] Pooled accuracy {summary['pooled_accuracy']:.2%} over {len(summary['tickers'])} tickers "
+          f"(one fit, {summary['fit_seconds']}s on {summary['train_rows']} rows)"
+          + ("" if delta is None else
+             f"; {delta * 100:+.2f}pp vs per-ticker models on {summary['compared_tickers']} tickers"))
+
+
+def main(tickers, start, end, threads=None):
+    tickers = list(dict.fromkeys([BASELINE_TICKER] + list(tickers)))
+    instrumentation.start_run("train_pooled")
+    status = "failed"
+    try:
+        summary = train_pooled(tickers, start, end, threads)
+        print_comparison(summary)
+        status = "ok"
+        return summary
+    finally:
+        instrumentation.finish_run(status, tickers=len(tickers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train one pooled model for all tickers")
+    parser.add_argument('--tickers', nargs='+', default=train_update.DEFAULT_TICKERS,
+                        help='Tickers in the pool (default: train_update.DEFAULT_TICKERS; '
+                             '^BSESN is always included)')
+    parser.add_argument('--start', default=train_update.feature_store.HISTORY_START, help='Start date')
+    parser.add_argument('--end', default=pd.Timestamp.today().strftime('%Y-%m-%d'), help='End date')
+    parser.add_argument('--threads', type=int, default=None, help='XGBoost threads (default: all cores)')
+    args = parser.parse_args()
+    main(args.tickers, args.start, args.end, args.threads)
@@ -0,0 +1,321 @@
+import os
+import sys
+import math
+import json
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.covariance import ledoit_wolf
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset')))
+import ohlcv_store
+import sensex_store
+from fetch_latest_data import sensex_companies
+from stats_publisher import StatsPublisher
+
+# Monte Carlo VaR/CVaR for a weighted portfolio of the covered tickers.
+# Scenarios are drawn from the (optionally shrunk) covariance of the stored
+# daily returns through its Cholesky factor, one fixed-size chunk at a time.
+# Only the left tail of the portfolio P&L is kept between chunks: the chunk
+# costs chunk_size x tickers floats and the tail (VaR95 plus the marginal-VaR
+# band, 5.25% of the paths) grows with the number of paths, about 4 MB per
+# million of them.
+# A second pass replays the same seeded chunks to attribute the tail to each
+# ticker (marginal, component VaR and component CVaR).
+
+PORTFOLIO_TICKER = "PORTFOLIO"
+
+CONFIDENCE = {"var95": 0.05, "var99": 0.01}
+
+DEFAULTS = {
+    "window": 500,          # most recent common trading days used for the covariance
+    "min_obs": 250,         # tickers with fewer returns in the window are left out
+    "paths": 1_000_000,
+    "chunk_size": 100_000,  # scenarios generated per chunk (peak memory ~ chunk_size x tickers)
+    "seed": 42,
+    "shrink": True,         # Ledoit-Wolf shrinkage towards a scaled identity
+    "dist": "normal",       # or "t" for fat-tailed scenarios with the same covariance
+    "df": 5,
+    "band": 0.0025,         # half-width (in probability) of the band around VaR95 used for marginal VaR
+    "loss_points": 20,
+}
+
+
+def load_returns(tickers, source="mongo", collection=None):
+    """(date x ticker) frame of daily returns from MongoDB (any sensex_data layout) or the local OHLCV store"""
+    if source == "store":
+        series = {}
+        for ticker in tickers:
+            data, _ = ohlcv_store.read_cached(ticker)
+            if not data.empty:
+                series[ticker] = data['Close'].pct_change()
+        return pd.DataFrame(series).sort_index()
+
+    return sensex_store.load_panel(tickers, ["Return"], collection=collection)["Return"]
+
+
+def prepare_panel(returns, window=DEFAULTS["window"], min_obs=DEFAULTS["min_obs"]):
+    """Recent returns on the dates every kept ticker traded"""
+    recent = returns.iloc[-window:]
+    counts = recent.notna().sum()
+    dropped = sorted(counts.index[counts < min_obs])
+    if dropped:
+        print(f"[WARNING] Not enough return history, leaving out: {', '.join(dropped)}")
+    recent = recent.drop(columns=dropped).dropna()
+    if recent.shape[1] == 0 or len(recent) < 2:
+        raise ValueError("No tickers with enough overlapping return history")
+    return recent
+
+
+def estimate_covariance(returns, shrink=True):
+    """(mean, covariance, shrinkage) of a (date x ticker) return matrix"""
+    X = returns.to_numpy(dtype=np.float64)
+    mean = X.mean(axis=0)
+    if shrink:
+        cov, shrinkage = ledoit_wolf(X)
+        return mean, cov, float(shrinkage)
+    return mean, np.cov(X, rowvar=False), 0.0
+
+
+def cholesky(cov):
+    """Lower Cholesky factor; adds diagonal jitter if the matrix is only semi-definite"""
+    jitter = 0.0
+    scale = float(np.mean(np.diag(cov))) or 1.0
+    for _ in range(6):
+        try:
+            return np.linalg.cholesky(cov + jitter * np.eye(len(cov)))
+        except np.linalg.LinAlgError:
+            jitter = scale * 1e-10 if jitter == 0 else jitter * 100
+    raise ValueError("Covariance matrix is not positive semi-definite")
+
+
+def _chunks(paths, chunk_size, seed):
+    """(size, generator) per chunk; the same seed replays the same scenarios"""
+    n_chunks = math.ceil(paths / chunk_size)
+    children = np.random.SeedSequence(seed).spawn(n_chunks)
+    for i, child in enumerate(children):
+        yield min(chunk_size, paths - i * chunk_size), np.random.default_rng(child)
+
+
+def _scenarios(size, rng, mean, factor, dist, df):
+    z = rng.standard_normal((size, len(mean)))
+    x = z @ factor.T
+    if dist == "t":
+        # Multivariate t scaled to the same covariance: x * sqrt((df - 2) / chi2)
+        x *= np.sqrt((df - 2) / rng.chisquare(df, size))[:, None]
+    x += mean
+    return x
+
+
+def simulate(weights, mean, factor, options=None):
+    """Monte Carlo VaR/CVaR of a portfolio and its per-ticker attribution.
+
+    `weights` are portfolio fractions per ticker (same order as `mean`). VaR and
+    CVaR are returned as positive loss fractions of the portfolio value.
+    """
+    options = {**DEFAULTS, **(options or {})}
+    paths, chunk_size, seed = options["paths"], options["chunk_size"], options["seed"]
+    dist, df, band = options["dist"], options["df"], options["band"]
+    if dist == "t" and df <= 2:
+        raise ValueError("Student-t scenarios need df > 2")
+    weights = np.asarray(weights, dtype=np.float64)
+
+    # Pass 1: keep the smallest `keep` portfolio returns across chunks; exact order
+    # statistics need all of them, so `keep` grows with `paths`
+    tail_q = max(CONFIDENCE.values()) + band
+    keep = min(paths, int(math.ceil(paths * tail_q)) + 1)
+    tail = np.empty(0)
+    for size, rng in _chunks(paths, chunk_size, seed):
+        pnl = _scenarios(size, rng, mean, factor, dist, df) @ weights
+        tail = np.concatenate([tail, pnl])
+        if len(tail) > keep:
+            tail = np.partition(tail, keep - 1)[:keep]
+    tail.sort()
+
+    def order_stat(q):
+        # Same interpolation as np.quantile over all paths
+        pos = q * (paths - 1)
+        lo = int(math.floor(pos))
+        hi = min(lo + 1, len(tail) - 1)
+        return tail[lo] + (tail[hi] - tail[lo]) * (pos - lo)
+
+    var = {name: order_stat(q) for name, q in CONFIDENCE.items()}
+    band_lo, band_hi = order_stat(max(CONFIDENCE["var95"] - band, 0)), order_stat(CONFIDENCE["var95"] + band)
+    grid = np.linspace(0, min(abs(var["var99"]) * 1.5, 0.10), options["loss_points"])
+
+    # Pass 2: replay the scenarios and accumulate conditional sums per ticker
+    tail_sum = np.zeros(len(weights))
+    tail_count = 0
+    band_sum = np.zeros(len(weights))
+    band_count = 0
+    cvar99_sum, cvar99_count = 0.0, 0
+    exceed = np.zeros(len(grid), dtype=np.int64)
+    for size, rng in _chunks(paths, chunk_size, seed):
+        x = _scenarios(size, rng, mean, factor, dist, df)
+        pnl = x @ weights
+        in_tail = pnl <= var["var95"]
+        tail_sum += x[in_tail].sum(axis=0)
+        tail_count += int(in_tail.sum())
+        in_band = (pnl >= band_lo) & (pnl <= band_hi)
+        band_sum += x[in_band].sum(axis=0)
+        band_count += int(in_band.sum())
+        in_tail99 = pnl <= var["var99"]
+        cvar99_sum += float(pnl[in_tail99].sum())
+        cvar99_count += int(in_tail99.sum())
+        exceed += np.searchsorted(np.sort(pnl), -grid, side="right")
+
+    # Euler allocation: component_i = w_i * E[x_i | scenario] sums to the portfolio figure
+    tail_mean = tail_sum / max(tail_count, 1)
+    marginal = -band_sum / max(band_count, 1)
+    return {
+        "var95": -var["var95"],
+        "var99": -var["var99"],
+        "cvar95": -float(weights @ tail_mean),
+        "cvar99": -cvar99_sum / max(cvar99_count, 1),
+        "marginal_var95": marginal,
+        "component_var95": weights * marginal,
+        "component_cvar95": -weights * tail_mean,
+        "loss_grid": grid,
+        "exceedance": exceed / paths,
+        "paths": paths,
+    }
+
+
+def parametric_var(weights, mean, cov, q=CONFIDENCE["var95"]):
+    """Closed-form normal VaR and component VaR, used as a sanity check on the simulation"""
+    from statistics import NormalDist
+    z = NormalDist().inv_cdf(q)
+    sigma = math.sqrt(weights @ cov @ weights)
+    var = -(weights @ mean + z * sigma)
+    components = weights * (-(mean + z * (cov @ weights) / sigma))
+    return var, components
+
+
+def portfolio_document(tickers, weights, result, parametric, as_of, value, options):
+    """model_stats document for the portfolio; amounts are in units of `value`"""
+    var95 = result["var95"] * value
+    risk_level = "Medium"
+    if result["var95"] > 0.03:
+        risk_level = "High"
+    elif result["var95"] < 0.015:
+        risk_level = "Low"
+    components = [
+        {
+            "ticker": t,
+            "weight": float(w),
+            "marginalVar95": float(m),
+            "componentVar95": float(c * value),
+            "componentCvar95": float(cc * value),
+            "contribution": float(c / result["var95"]) if result["var95"] else 0.0,
+        }
+        for t, w, m, c, cc in zip(tickers, weights, result["marginal_var95"],
+                                  result["component_var95"], result["component_cvar95"])
+    ]
+    return {
+        "ticker": PORTFOLIO_TICKER,
+        "portfolioValue": float(value),
+        "var95": float(var95),
+        "var99": float(result["var99"] * value),
+        "cvar": float(result["cvar95"] * value),
+        "cvar99": float(result["cvar99"] * value),
+        "var95Pct": float(result["var95"]),
+        "var99Pct": float(result["var99"]),
+        "parametricVar95": float(parametric[0] * value),
+        "riskLevel": risk_level,
+        "components": components,
+        "varData": [
+            {"loss": f"{loss * 100:.1f}%", "probability": float(p)}
+            for loss, p in zip(result["loss_grid"], result["exceedance"])
+        ],
+        "simulation": {
+            "paths": int(result["paths"]),
+            "chunkSize": int(options["chunk_size"]),
+            "seed": options["seed"],
+            "distribution": options["dist"],
+            "df": options["df"] if options["dist"] == "t" else None,
+            "shrinkage": options.get("shrinkage"),
+            "window": int(options["window"]),
+            "asOf": as_of,
+        },
+        "updatedAt": datetime.now()
+    }
+
+
+def save_portfolio_stats(doc, collection=None):
+    publisher = StatsPublisher(collection)
+    publisher.add(doc)
+    publisher.publish()
+    print(f"[INFO] Saved portfolio VaR to model_stats as '{doc['ticker']}'")
+
+
+def run(weights=None, source="mongo", value=1_000_000, options=None, save=True):
+    """Estimate portfolio VaR for {ticker: weight} (equal weights over sensex_companies by default)"""
+    options = {**DEFAULTS, **(options or {})}
+    tickers = list(weights) if weights else sensex_companies
+
+    returns = prepare_panel(load_returns(tickers, source), options["window"], options["min_obs"])
+    tickers = list(returns.columns)
+    if weights:
+        w = np.array([float(weights[t]) for t in tickers])
+    else:
+        w = np.ones(len(tickers))
+    if w.sum() <= 0:
+        raise ValueError("Portfolio weights must sum to a positive value")
+    w = w / w.sum()
+
+    mean, cov, options["shrinkage"] = estimate_covariance(returns, options["shrink"])
+    result = simulate(w, mean, cholesky(cov), options)
+    parametric = parametric_var(w, mean, cov)
+
+    print(f"[INFO] Portfolio of {len(tickers)} tickers over {len(returns)} days, "
+          f"{options['paths']} paths: VaR95 {result['var95']:.4%}, VaR99 {result['var99']:.4%}, "
+          f"CVaR95 {result['cvar95']:.4%} (parametric VaR95 {parametric[0]:.4%})")
+
+    doc = portfolio_document(tickers, w, result, parametric,
+                             returns.index[-1].strftime('%Y-%m-%d'), value, options)
+    if save:
+        save_portfolio_stats(doc)
+    return doc
+
+
+def _parse_weights(items):
+    weights = {}
+    for item in items or []:
+        ticker, _, weight = item.rpartition('=')
+        if not ticker:
+            raise ValueError(f"Weight '{item}' is not in TICKER=WEIGHT form")
+        weights[ticker] = float(weight)
+    return weights
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--weights', nargs='+', metavar='TICKER=WEIGHT',
+                        help='Position weights (default: equal weights over all covered tickers)')
+    parser.add_argument('--weights-file', help='JSON file with a {ticker: weight} mapping')
+    parser.add_argument('--source', choices=['mongo', 'store'], default='mongo',
+                        help='Read returns from MongoDB ($SENSEX_STORAGE layout) or from the local OHLCV store')
+    parser.add_argument('--value', type=float, default=1_000_000, help='Portfolio value for amounts')
+    parser.add_argument('--paths', type=int, default=DEFAULTS['paths'], help='Simulated scenarios')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULTS['chunk_size'],
+                        help='Scenarios generated at a time (bounds peak memory)')
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'], help='Random seed')
+    parser.add_argument('--window', type=int, default=DEFAULTS['window'],
+                        help='Trading days used to estimate the covariance')
+    parser.add_argument('--no-shrink', action='store_true', help='Use the plain sample covariance')
+    parser.add_argument('--dist', choices=['normal', 't'], default=DEFAULTS['dist'],
+                        help='Scenario distribution')
+    parser.add_argument('--df', type=float, default=DEFAULTS['df'], help='Degrees of freedom for --dist t')
+    parser.add_argument('--dry-run', action='store_true', help='Print the result without saving it')
+    args = parser.parse_args()
+
+    weights = _parse_weights(args.weights)
+    if args.weights_file:
+        with open(args.weights_file) as f:
+            weights.update(json.load(f))
+    run(weights or None, args.source, args.value, {
+        "paths": args.paths, "chunk_size": args.chunk_size, "seed": args.seed,
+        "window": args.window, "shrink": not args.no_shrink, "dist": args.dist, "df": args.df,
+    }, save=not args.dry_run)
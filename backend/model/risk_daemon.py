@@ -0,0 +1,275 @@
+import os
+import sys
+import time
+import argparse
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset')))
+import ohlcv_store
+import instrumentation
+import artifacts
+from incremental_features import TickerState
+from inference_server import InferenceService, feature_columns
+from stats_publisher import StatsPublisher
+import model_stats
+
+# Long-running risk refresher. Bars come from a source (any iterable of
+# (ticker, date, {column: value})); each bar updates the ticker's incremental
+# feature state in constant time, is scored by the ticker's model (the
+# baseline when it has none) and marks the ticker's model_stats document for a
+# refresh. Dirty documents are rebuilt from the recent bars and written in one
+# bulk_write every --stats-interval seconds, with the live prediction under
+# liveRisk.
+#
+# A bar stays provisional until a bar with a later date arrives for the same
+# ticker, so an intraday source can send the current day's bar repeatedly: the
+# provisional bar is scored on a copy of the state and only the final version
+# is committed.
+#
+#   python risk_daemon.py --source replay --file bars.csv --tickers TCS.NS INFY.NS
+#   python risk_daemon.py --source store --interval 300
+
+# Bars kept per ticker for the model_stats charts and VaR (about a year)
+STATS_BARS = 260
+
+
+class FileReplaySource:
+    """Bars from a CSV or JSON-lines file with Ticker, Date and OHLCV columns, in file order"""
+
+    def __init__(self, path, delay=0.0, tickers=None):
+        self.path = path
+        self.delay = delay
+        self.tickers = set(tickers) if tickers else None
+
+    def _frame(self):
+        if self.path.endswith(('.jsonl', '.json')):
+            return pd.read_json(self.path, lines=self.path.endswith('.jsonl'))
+        return pd.read_csv(self.path)
+
+    def __iter__(self):
+        data = self._frame()
+        data["Date"] = pd.to_datetime(data["Date"])
+        columns = [c for c in ohlcv_store.OHLCV_COLUMNS if c in data.columns]
+        values = data[columns].to_numpy(dtype=np.float64)
+        for ticker, date, row in zip(data["Ticker"], data["Date"], values):
+            if self.tickers is not None and ticker not in self.tickers:
+                continue
+            yield ticker, date, dict(zip(columns, row))
+            if self.delay:
+                time.sleep(self.delay)
+
+
+class StoreSource:
+    """Polls the local OHLCV store for new or revised last bars (written by the dataset job)"""
+
+    def __init__(self, tickers, interval=300.0):
+        self.tickers = list(tickers)
+        self.interval = interval
+        self.seen = {}
+
+    def poll(self):
+        for ticker in self.tickers:
+            try:
+                data, _ = ohlcv_store.read_cached(ticker)
+            except Exception as e:
+                print(f"[WARNING] Could not read stored bars for {ticker}: {e}")
+                continue
+            if data is None or data.empty:
+                continue
+            last = self.seen.get(ticker)
+            if last is not None:
+                data = data[data.index >= last[0]]
+            else:
+                # The daemon seeds a ticker's state from the stored bars before the
+                # first one it is given, so only the last bar is streamed
+                data = data.iloc[-1:]
+            columns = [c for c in ohlcv_store.OHLCV_COLUMNS if c in data.columns]
+            for date, row in zip(data.index, data[columns].to_numpy(dtype=np.float64)):
+                if last is not None and date == last[0] and np.array_equal(row, last[1], equal_nan=True):
+                    continue
+                self.seen[ticker] = (date, row)
+                yield ticker, date, dict(zip(columns, row))
+
+    def __iter__(self):
+        while True:
+            yield from self.poll()
+            time.sleep(self.interval)
+
+
+SOURCES = {"replay": FileReplaySource, "store": StoreSource}
+
+
+class RiskDaemon:
+    def __init__(self, publisher=None, service=None, stats_interval=60.0):
+        self.service = service or InferenceService()
+        self.publisher = publisher
+        self.stats_interval = stats_interval
+        self.states = {}
+        self.pending = {}
+        self.recent = {}
+        self.live = {}
+        self.dirty = set()
+        self.last_flush = time.monotonic()
+        self.counts = {"bars": 0, "scored": 0, "stale": 0, "warmup": 0, "errors": 0}
+        self.bar_seconds = 0.0
+
+    def _seed(self, ticker, before):
+        """State and recent bars from the stored history before the first streamed bar"""
+        try:
+            history, _ = ohlcv_store.read_cached(ticker)
+        except Exception:
+            history = None
+        history = history if history is not None else pd.DataFrame(columns=ohlcv_store.OHLCV_COLUMNS)
+        history = history[history.index < before]
+        with instrumentation.stage("seed", ticker, rows=len(history)):
+            self.states[ticker] = TickerState.from_history(ticker, history)
+        self.recent[ticker] = deque(zip(history.index[-STATS_BARS:], history['Close'].iloc[-STATS_BARS:]),
+                                    maxlen=STATS_BARS)
+
+    def on_bar(self, ticker, date, bar):
+        """Update, score and mark one ticker; returns the prediction or None"""
+        self.counts["bars"] += 1
+        date = pd.Timestamp(date)
+        if ticker not in self.states:
+            self._seed(ticker, date)
+        started = time.perf_counter()
+        state = self.states[ticker]
+
+        pending = self.pending.get(ticker)
+        if pending is not None and pending[0] < date:
+            # A later bar arrived, so the pending one is final
+            state.update(pending[1], pending[0])
+            self.recent[ticker].append((pending[0], float(pending[1]["Close"])))
+            del self.pending[ticker]
+        if state.last_date is not None and date <= state.last_date:
+            self.counts["stale"] += 1
+            return None
+
+        self.pending[ticker] = (date, bar)
+        values = state.copy().update(bar, date)
+        prediction = None
+        try:
+            prediction = self.score(ticker, date, bar, values)
+        except Exception as e:
+            self.counts["errors"] += 1
+            print(f"[ERROR] Scoring {ticker} failed: {e}")
+        self.dirty.add(ticker)
+        self.bar_seconds += time.perf_counter() - started
+
+        if time.monotonic() - self.last_flush >= self.stats_interval:
+            self.flush()
+        return prediction
+
+    def score(self, ticker, date, bar, values):
+        model_dir = self.service.model_dir(ticker)
+        model, scaler, manifest = self.service.models.get(model_dir)
+        columns = feature_columns(manifest, model_dir)
+        row = np.array([[values[c] if c in values else bar.get(c, np.nan) for c in columns]], dtype=np.float64)
+        if np.isnan(row).any():
+            # Still inside an indicator's warm-up window
+            self.counts["warmup"] += 1
+            return None
+        proba = model.predict_proba((row - scaler.mean_) / scaler.scale_)[0]
+        model_name = "baseline" if model_dir == self.service.baseline_dir else "ticker"
+        prediction = InferenceService._describe(proba, model_name)
+        accuracy = manifest.get("metrics", {}).get("accuracy")
+        prediction.update(asOf=date.strftime('%Y-%m-%d'), price=float(bar["Close"]),
+                          accuracy=None if accuracy is None else float(accuracy) * 100)
+        self.live[ticker] = prediction
+        self.counts["scored"] += 1
+        return prediction
+
+    def _accuracy(self, ticker):
+        """Test accuracy (%) of the model scoring the ticker, from its manifest when the
+        ticker has not been scored yet (warm-up, errors); None when unknown"""
+        if self.live.get(ticker, {}).get("accuracy") is not None:
+            return self.live[ticker]["accuracy"]
+        manifest = artifacts.read_manifest(self.service.model_dir(ticker))
+        if not manifest or "accuracy" not in manifest.get("metrics", {}):
+            return None
+        return float(manifest["metrics"]["accuracy"]) * 100
+
+    def flush(self):
+        """Rebuild and write the model_stats documents of every ticker that got a bar"""
+        self.last_flush = time.monotonic()
+        tickers = [t for t in self.dirty if len(self.recent[t]) + (t in self.pending) >= 2]
+        self.dirty.clear()
+        if not tickers:
+            return None
+        frames, accuracies = {}, {}
+        for ticker in tickers:
+            bars = list(self.recent[ticker])
+            if ticker in self.pending:
+                bars.append((self.pending[ticker][0], float(self.pending[ticker][1]["Close"])))
+            frames[ticker] = pd.DataFrame({"Close": [c for _, c in bars]},
+                                          index=pd.DatetimeIndex([d for d, _ in bars], name="Date"))
+            accuracy = self._accuracy(ticker)
+            if accuracy is not None:
+                accuracies[ticker] = accuracy
+
+        with instrumentation.stage("stats", rows=len(tickers)):
+            docs = model_stats.stats_documents(frames, accuracies)
+        for ticker, doc in docs.items():
+            if ticker not in accuracies:
+                # Updates $set the fields, so the stored accuracy is kept
+                del doc["accuracy"]
+            if ticker in self.live:
+                doc["liveRisk"] = self.live[ticker]
+        mean_ms = self.bar_seconds / max(self.counts["bars"], 1) * 1000
+        print(f"[INFO] {self.counts['bars']} bars, {self.counts['scored']} scored, "
+              f"{mean_ms:.2f} ms/bar; refreshing {len(docs)} model_stats documents")
+        if self.publisher is None:
+            return docs
+        with instrumentation.stage("write", rows=len(docs)):
+            self.publisher.extend(docs.values())
+            self.publisher.publish()
+        return docs
+
+    def run(self, source):
+        for ticker, date, bar in source:
+            self.on_bar(ticker, date, bar)
+        # Replay sources end; the last bars are still provisional but get published
+        self.flush()
+
+
+def main(source, stats_interval=60.0, dry_run=False, n_jobs=1):
+    run = instrumentation.start_run("stream")
+    daemon = RiskDaemon(None if dry_run else StatsPublisher(), InferenceService(n_jobs=n_jobs), stats_interval)
+    status = "failed"
+    try:
+        daemon.run(source)
+        status = "ok"
+    except KeyboardInterrupt:
+        daemon.flush()
+        status = "ok"
+    finally:
+        instrumentation.finish_run(status, **daemon.counts)
+    return daemon
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming risk refresher")
+    parser.add_argument('--source', choices=list(SOURCES), default='store',
+                        help='replay: bars from --file; store: poll the local OHLCV store')
+    parser.add_argument('--file', help='CSV or JSON-lines bars (Ticker, Date, OHLCV) for --source replay')
+    parser.add_argument('--tickers', nargs='+', help='Tickers to follow (store source) or keep (replay source)')
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds between replayed bars')
+    parser.add_argument('--interval', type=float, default=300.0, help='Seconds between store polls')
+    parser.add_argument('--stats-interval', type=float, default=60.0,
+                        help='Seconds between model_stats refreshes')
+    parser.add_argument('--threads', type=int, default=1, help='XGBoost threads per prediction')
+    parser.add_argument('--dry-run', action='store_true', help='Score and report without writing to MongoDB')
+    args = parser.parse_args()
+
+    if args.source == 'replay':
+        if not args.file:
+            parser.error('--source replay needs --file')
+        source = FileReplaySource(args.file, args.delay, args.tickers)
+    else:
+        if not args.tickers:
+            parser.error('--source store needs --tickers')
+        source = StoreSource(args.tickers, args.interval)
+    main(source, args.stats_interval, args.dry_run, args.threads)
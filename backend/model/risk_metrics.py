@@ -0,0 +1,153 @@
+from statistics import NormalDist
+
+import numpy as np
+
+# Batched risk metrics over a (bar x ticker) matrix of daily returns.
+# Columns may be NaN-padded (shorter histories). Each column is sorted once;
+# VaR reads order statistics, CVaR reads a prefix sum, and the whole loss
+# exceedance curve is one searchsorted call per ticker instead of a full
+# scan of the returns for every grid point.
+
+METHODS = ("historical", "parametric", "cornish_fisher")
+
+# Points on the loss exceedance curve and the largest loss shown (as a return)
+LOSS_POINTS = 20
+MAX_LOSS = 0.10
+
+_NORMAL = NormalDist()
+
+# Tail probabilities used to integrate the Cornish-Fisher quantile for CVaR and
+# to invert it for the exceedance curve
+_CF_TAIL = (np.arange(64) + 0.5) / 64
+_CF_GRID = np.concatenate([np.geomspace(1e-4, 0.01, 32, endpoint=False), np.linspace(0.01, 0.5, 50)])
+
+
+def _as_matrix(returns):
+    returns = np.asarray(returns, dtype=np.float64)
+    return returns[:, None] if returns.ndim == 1 else returns
+
+
+def _moments(returns):
+    valid = ~np.isnan(returns)
+    counts = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, returns, 0.0).sum(axis=0) / counts
+        centred = np.where(valid, returns - mean, 0.0)
+        squared = centred * centred
+        m2 = squared.sum(axis=0) / counts
+        skew = (squared * centred).sum(axis=0) / counts / m2 ** 1.5
+        kurt = (squared * squared).sum(axis=0) / counts / m2 ** 2 - 3
+        std = np.sqrt(m2 * counts / (counts - 1))
+    return mean, std, skew, kurt
+
+
+def _cornish_fisher_z(z, skew, kurt):
+    """Normal quantiles z (any shape, broadcast on the last axis) adjusted for skew and excess kurtosis"""
+    return (z + (z ** 2 - 1) * skew / 6 + (z ** 3 - 3 * z) * kurt / 24
+            - (2 * z ** 3 - 5 * z) * skew ** 2 / 36)
+
+
+def loss_grid(var99, points=LOSS_POINTS, max_loss=MAX_LOSS):
+    """Per-ticker loss grid (points x ticker): 0 to 1.5 x VaR99, capped at max_loss"""
+    top = np.minimum(np.abs(var99) * 1.5, max_loss)
+    top = np.where(np.isnan(top), max_loss, top)
+    return np.linspace(0, 1, points)[:, None] * top[None, :]
+
+
+def _historical(returns, qs, grid_fn):
+    # NaNs sort to the end, so each column's observations are its first `counts` rows
+    ordered = np.sort(returns, axis=0)
+    counts = np.sum(~np.isnan(returns), axis=0)
+    k = ordered.shape[1]
+
+    # Linear interpolation between order statistics, as Series.quantile does
+    pos = np.asarray(qs)[:, None] * np.maximum(counts - 1, 0)[None, :]
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, np.maximum(counts - 1, 0))
+    lo_vals = np.take_along_axis(ordered, lo, axis=0)
+    hi_vals = np.take_along_axis(ordered, hi, axis=0)
+    var = lo_vals + (hi_vals - lo_vals) * (pos - lo)
+    var[:, counts == 0] = np.nan
+
+    grid = grid_fn(var[-1])
+    # One searchsorted per ticker gives the tail size at VaR95 and every grid loss
+    thresholds = np.vstack([var[:1], -grid])
+    below = np.zeros(thresholds.shape, dtype=np.int64)
+    for j in range(k):
+        if counts[j]:
+            below[:, j] = np.searchsorted(ordered[:counts[j], j], thresholds[:, j], side="right")
+
+    prefix = np.cumsum(np.nan_to_num(ordered), axis=0)
+    tail = below[0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cvar = np.where(tail > 0, prefix[np.maximum(tail - 1, 0), np.arange(k)] / tail, np.nan)
+        exceedance = below[1:] / counts
+    return var, cvar, grid, exceedance
+
+
+def _parametric(returns, qs, grid_fn):
+    mean, std, _, _ = _moments(returns)
+    z = np.array([_NORMAL.inv_cdf(q) for q in qs])
+    var = mean + z[:, None] * std
+    # Expected shortfall of a normal: mean - std * pdf(z) / q
+    cvar = mean - std * _NORMAL.pdf(z[0]) / qs[0]
+    grid = grid_fn(var[-1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = (-grid - mean) / std
+    exceedance = np.vectorize(_NORMAL.cdf, otypes=[np.float64])(np.nan_to_num(scores, nan=np.inf))
+    exceedance[:, np.isnan(std)] = np.nan
+    return var, cvar, grid, exceedance
+
+
+def _cornish_fisher(returns, qs, grid_fn):
+    mean, std, skew, kurt = _moments(returns)
+
+    def quantile(ps):
+        z = np.array([_NORMAL.inv_cdf(p) for p in ps])[:, None]
+        return mean + _cornish_fisher_z(z, skew, kurt) * std
+
+    var = quantile(qs)
+    # CVaR as the average quantile over the tail (midpoint rule)
+    cvar = quantile(_CF_TAIL * qs[0]).mean(axis=0)
+
+    # Invert the quantile function on a grid; enforce monotonicity where the
+    # expansion bends back for extreme skew/kurtosis
+    curve = np.maximum.accumulate(quantile(_CF_GRID), axis=0)
+    grid = grid_fn(var[-1])
+    exceedance = np.full(grid.shape, np.nan)
+    for j in np.flatnonzero(~np.isnan(std)):
+        exceedance[:, j] = np.interp(-grid[:, j], curve[:, j], _CF_GRID, left=0.0, right=0.5)
+    return var, cvar, grid, exceedance
+
+
+_ESTIMATORS = {
+    "historical": _historical,
+    "parametric": _parametric,
+    "cornish_fisher": _cornish_fisher,
+}
+
+
+def risk_metrics(returns, method="historical", points=LOSS_POINTS, max_loss=MAX_LOSS):
+    """VaR95, VaR99, CVaR95 and the loss exceedance curve for every column of `returns`.
+
+    `returns` is a 1D series or a (bar x ticker) array of daily returns; columns may
+    be NaN-padded. VaR and CVaR come back as returns (negative values are losses).
+    `loss_grid` and `exceedance` have shape (points, ticker): the probability that a
+    daily return is at or below -loss for each grid loss.
+    """
+    if method not in _ESTIMATORS:
+        raise ValueError(f"Unknown risk method {method!r}; expected one of {', '.join(METHODS)}")
+    returns = _as_matrix(returns)
+    # Order matters: VaR95 first (CVaR tail), VaR99 last (sets the loss grid)
+    qs = np.array([0.05, 0.01])
+    var, cvar, grid, exceedance = _ESTIMATORS[method](
+        returns, qs, lambda var99: loss_grid(var99, points, max_loss)
+    )
+    return {
+        "var95": var[0],
+        "var99": var[1],
+        "cvar95": cvar,
+        "loss_grid": grid,
+        "exceedance": exceedance,
+        "count": np.sum(~np.isnan(returns), axis=0),
+    }
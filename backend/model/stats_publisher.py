@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import hashlib
+
+from pymongo import UpdateOne
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset')))
+import db
+
+# Collects model_stats documents for a run and writes them in one bulk_write.
+# Each stored document carries a hash of its content (everything but the
+# timestamps); documents whose hash matches the stored one are not rewritten,
+# so an unchanged ticker keeps its previous updatedAt.
+
+HASH_FIELD = "contentHash"
+_VOLATILE_FIELDS = ("_id", "updatedAt", HASH_FIELD)
+
+
+def content_hash(doc):
+    content = {k: v for k, v in doc.items() if k not in _VOLATILE_FIELDS}
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class StatsPublisher:
+    def __init__(self, collection=None):
+        self._collection = collection
+        self._docs = {}
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = db.get_collection(db.MODEL_STATS)
+        return self._collection
+
+    def add(self, doc):
+        """Queue one ticker's document; a later document for the same ticker replaces it"""
+        self._docs[doc["ticker"]] = doc
+
+    def extend(self, docs):
+        for doc in docs:
+            self.add(doc)
+
+    def documents(self):
+        return list(self._docs.values())
+
+    def publish(self):
+        """Upsert the queued documents that changed; returns write counts"""
+        counts = {"queued": len(self._docs), "unchanged": 0, "upserted": 0, "modified": 0}
+        if not self._docs:
+            return counts
+
+        hashes = {ticker: content_hash(doc) for ticker, doc in self._docs.items()}
+        stored = {
+            doc["ticker"]: doc.get(HASH_FIELD)
+            for doc in self.collection.find(
+                {"ticker": {"$in": list(self._docs)}}, {"_id": 0, "ticker": 1, HASH_FIELD: 1}
+            )
+        }
+        operations = [
+            UpdateOne({"ticker": ticker}, {"$set": {**doc, HASH_FIELD: hashes[ticker]}}, upsert=True)
+            for ticker, doc in self._docs.items()
+            if stored.get(ticker) != hashes[ticker]
+        ]
+        counts["unchanged"] = len(self._docs) - len(operations)
+
+        if operations:
+            result = self.collection.bulk_write(operations, ordered=False)
+            counts["upserted"] = result.upserted_count
+            counts["modified"] = result.modified_count
+        print(f"[INFO] model_stats: {counts['upserted']} new, {counts['modified']} updated, "
+              f"{counts['unchanged']} unchanged")
+        self._docs = {}
+        return counts
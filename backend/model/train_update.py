@@ -1,61 +1,50 @@
-import yfinance as yf
+import os
+import sys
+
+if __name__ == "__main__":
+    # Options are defined once, in the market_risk CLI (python -m market_risk train).
+    # It imports this module when the command runs, so the script hands over
+    # before pandas, XGBoost and scikit-learn are loaded and --help stays fast.
+    sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..')))
+    from market_risk import cli
+    sys.exit(cli.main(["train", *sys.argv[1:]]))
+
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-import os
-import pickle
-import pymongo
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
 from datetime import datetime
+import time
 import warnings
-import argparse
+import multiprocessing
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset')))
+import ohlcv_store
+import features
+import feature_store
+import artifacts
+from model_stats import stats_documents
+import instrumentation
+from stats_publisher import StatsPublisher
 
 warnings.filterwarnings("ignore")
 
 # Helper Functions
 def fetch_stock_data(ticker, start, end):
-    # Fetch data without auto-adjust
-    data = yf.download(ticker, start=start, end=end, auto_adjust=False)
+    # Served from the local OHLCV store; only missing days are downloaded
+    data = ohlcv_store.get_ohlcv(ticker, start, end)
     if data.empty:
         raise ValueError(f"No data fetched for {ticker} between {start} and {end}.")
     return data
 
 
-def compute_rsi(series, window=14):
-    delta = series.diff()
-    gain = delta.where(delta > 0, 0).rolling(window=window).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-    rs = gain / loss
-    return 100 - (100 / (1 + rs))
-
-
-def compute_macd(series):
-    exp1 = series.ewm(span=12, adjust=False).mean()
-    exp2 = series.ewm(span=26, adjust=False).mean()
-    macd = exp1 - exp2
-    signal = macd.ewm(span=9, adjust=False).mean()
-    return macd, signal
-
-
 def engineer_features(data):
-    # Use Close price for all calculations
-    price_col = 'Close'
-
-    # Basic returns and volatility
-    data['Return'] = data[price_col].pct_change()
-    data['Volatility'] = data['Return'].rolling(window=5).std()
-
-    # Moving averages
-    data['SMA_5'] = data[price_col].rolling(window=5).mean()
-    data['SMA_10'] = data[price_col].rolling(window=10).mean()
-    data['EMA_5'] = data[price_col].ewm(span=5, adjust=False).mean()
-    data['EMA_10'] = data[price_col].ewm(span=10, adjust=False).mean()
-
-    # Momentum and trend indicators
-    data['MACD'], data['MACD_Signal'] = compute_macd(data[price_col])
-    data['RSI'] = compute_rsi(data[price_col])
+    # Same indicator definitions as the dataset job (shared feature registry)
+    data = features.compute_frame_features(data, features.TRAIN_FEATURES)
 
     # Drop any rows with NaNs
     data = data.dropna()
@@ -77,287 +66,430 @@ def label_risk(data):
     return data
 
 
-# Fixed function to save model statistics to MongoDB
-# Fixed function to save model statistics to MongoDB
-def save_model_stats(ticker, model, X_test, y_test, start_date):
+def load_features(ticker, start, end):
+    """Engineered frame for [start, end) from the feature store; computed and stored on a miss"""
+    with instrumentation.stage("load", ticker) as record:
+        data = feature_store.read_features(ticker, features.TRAIN_FEATURES, start, end)
+        record["hit"] = data is not None
+        record["rows"] = 0 if data is None else len(data)
+    if data is not None:
+        return data
+    with instrumentation.stage("fetch", ticker) as record:
+        data = fetch_stock_data(ticker, start, end)
+        record["rows"] = len(data)
+    with instrumentation.stage("features", ticker, rows=len(data)):
+        data = engineer_features(data)
+    feature_store.write_features(ticker, data, features.TRAIN_FEATURES, start, end)
+    return data
+
+
+def prepare_training_data(ticker, start, end):
+    """Engineered and labelled frame for one ticker, each step timed"""
+    data = load_features(ticker, start, end)
+    with instrumentation.stage("label", ticker, rows=len(data)):
+        data = label_risk(data)
+    return data
+
+
+def save_model_stats(ticker, model, X_test, y_test, start_date, method="historical", publisher=None,
+                     accuracy=None):
+    """Build the model_stats document; queued on `publisher`, or written right away without one.
+    `accuracy` (in %) is used as is instead of scoring the model on X_test."""
     print(f"[INFO] Saving model stats for {ticker} to MongoDB")
-    
-    # Connect to MongoDB
-    client = pymongo.MongoClient("mongodb://mongo:27017/")
-    db = client["market_risk_assessment"]
-    stats_collection = db["model_stats"]
-    
+
     # Calculate accuracy
-    y_pred = model.predict(X_test)
-    accuracy = float(accuracy_score(y_test, y_pred) * 100)
-    
+    if accuracy is None:
+        with instrumentation.stage("evaluate", ticker, rows=len(X_test)):
+            y_pred = model.predict(X_test)
+            accuracy = float(accuracy_score(y_test, y_pred) * 100)
+
     # Get recent data for charts (last year)
-    from datetime import datetime, timedelta
     end_date = datetime.today().strftime('%Y-%m-%d')
     chart_start = (datetime.today().replace(year=datetime.today().year-1)).strftime('%Y-%m-%d')
-    
-    try:
-        data = fetch_stock_data(ticker, chart_start, end_date)
-        
-        # Calculate returns for risk metrics (returns in decimal form, e.g. 0.01 for 1%)
-        returns = data['Close'].pct_change().dropna()
-        current_price = float(data['Close'].iloc[-1])
-        
-        # Calculate VaR metrics as percentage of current price
-        try:
-            # Get percentage VaR (negative values represent losses)
-            var95_pct = float(returns.quantile(0.05))
-            var99_pct = float(returns.quantile(0.01))
-            
-            # Convert percentage VaR to absolute rupee amount with reasonable caps
-            # Use absolute values to show the magnitude of potential loss
-            var95 = abs(var95_pct * current_price)
-            var99 = abs(var99_pct * current_price)
-            
-            # Cap at 20% of price as sanity check for unrealistically high values
-            max_reasonable_var = current_price * 0.20
-            var95 = min(var95, max_reasonable_var)
-            var99 = min(var99, max_reasonable_var)
-        except Exception as e:
-            print(f"[WARNING] Error calculating VaR: {e}, using fallback")
-            var95 = current_price * 0.03  # 3% of price as fallback
-            var99 = current_price * 0.05  # 5% of price as fallback
-            var95_pct = -0.03  # Needed for VaR distribution calculation
-            var99_pct = -0.05  # Needed for VaR distribution calculation
 
-        # Conditional VaR with additional error handling
-        try:
-            cvar_returns = returns[returns <= returns.quantile(0.05)]
-            if not cvar_returns.empty:
-                cvar = abs(float(cvar_returns.mean() * current_price))
-                # Cap at 25% of price as sanity check
-                cvar = min(cvar, current_price * 0.25)
-            else:
-                cvar = var95 * 1.2  # Reasonable fallback
-        except Exception as e:
-            print(f"[WARNING] Error calculating CVaR: {e}, using fallback")
-            cvar = var95 * 1.2  # Reasonable fallback
-        
-        # Create price history for chart (last 30 days)
-        price_history = []
-        for idx, row in data.iloc[-30:].iterrows():
-            try:
-                date_str = idx.strftime('%Y-%m-%d') if hasattr(idx, 'strftime') else str(idx).split(' ')[0]
-                price_history.append({
-                    "date": date_str,
-                    "price": float(row['Close'])
-                })
-            except Exception as e:
-                print(f"[WARNING] Error processing price history item: {e}")
-        
-        # Calculate rolling volatility with improved data preparation
-        try:
-            # Calculate rolling volatility (returns in decimal form)
-            volatility = returns.rolling(window=30).std().dropna()
-            volatility_data = []
-            
-            # Make sure we get the most recent 30 days (or as many as available)
-            date_range = data.index[-30:] if len(data) >= 30 else data.index
-            
-            # Create volatility data with proper dates aligned with price history
-            for date in date_range:
-                date_str = date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date).split(' ')[0]
-                
-                # Get volatility value for this date, or estimate if not available
-                try:
-                    if date in volatility.index:
-                        vol_value = float(volatility.loc[date])
-                    else:
-                        # For dates without volatility data, use a reasonable estimate
-                        vol_value = 0.02  # 2% volatility as default
-                except Exception:
-                    vol_value = 0.02  # Fallback value
-                    
-                volatility_data.append({
-                    "date": date_str,
-                    "volatility": vol_value
-                })
-        except Exception as e:
-            print(f"[WARNING] Error calculating volatility data: {e}")
-            # Create volatility entries that match the price history dates
-            volatility_data = []
-            if price_history:
-                for i, price_point in enumerate(price_history):
-                    volatility_data.append({
-                        "date": price_point["date"],
-                        "volatility": 0.02 + (0.002 * (i % 5))  # Some variation
-                    })
-                    
-        # Create VaR distribution data with improved calculations
-        var_data = []
-        try:
-            # Create reasonably spaced loss points from 0 to 1.5*VAR99 (as percentages)
-            max_loss_pct = min(abs(float(var99_pct)) * 1.5, 0.10)  # Cap at 10%
-            loss_range = np.linspace(0, max_loss_pct, 20)
-            
-            for loss_pct in loss_range:
-                # Calculate probability of loss being greater than this percentage
-                prob = float((returns <= -loss_pct).mean())
-                var_data.append({
-                    "loss": f"{loss_pct*100:.1f}%",
-                    "probability": prob
-                })
-        except Exception as e:
-            print(f"[WARNING] Error calculating VaR distribution: {e}")
-            # Fallback dummy data with realistic values
-            for i in range(20):
-                loss_pct = i * 0.005  # 0% to 9.5% in steps of 0.5%
-                var_data.append({
-                    "loss": f"{loss_pct*100:.1f}%",
-                    "probability": float(max(0.5 - i*0.025, 0.001))  # Decreasing probability
-                })
-        
-        # Determine risk level based on 5% VaR
-        risk_level = "Medium"  # Default
-        if var95 > current_price * 0.03:  # More than 3% loss
-            risk_level = "High"
-        elif var95 < current_price * 0.015:  # Less than 1.5% loss
-            risk_level = "Low"
-        
-        # Create model stats document
-        model_stats = {
-            "ticker": ticker,
-            "var95": float(var95),
-            "var99": float(var99),
-            "cvar": float(cvar),
-            "riskLevel": risk_level,
-            "accuracy": float(accuracy),
-            "priceHistory": price_history,
-            "volatilityData": volatility_data,
-            "varData": var_data,
-            "updatedAt": datetime.now()
-        }
-        
-        # Update or insert model stats
-        result = stats_collection.update_one(
-            {"ticker": ticker},
-            {"$set": model_stats},
-            upsert=True
-        )
-        
-        if result.modified_count > 0:
-            print(f"[INFO] Updated existing stats for {ticker}")
-        elif result.upserted_id:
-            print(f"[INFO] Created new stats for {ticker}")
+    try:
+        with instrumentation.stage("stats", ticker) as record:
+            # The stored feature frame carries the OHLCV columns too
+            data = feature_store.read_features(ticker, features.TRAIN_FEATURES, chart_start, end_date)
+            if data is None:
+                data = fetch_stock_data(ticker, chart_start, end_date)
+            model_stats = stats_documents({ticker: data}, {ticker: accuracy}, method)[ticker]
+            record["rows"] = len(data)
+        if publisher is not None:
+            publisher.add(model_stats)
         else:
-            print(f"[INFO] No changes to stats for {ticker}")
-            
+            single = StatsPublisher()
+            single.add(model_stats)
+            single.publish()
     except Exception as e:
         print(f"[ERROR] Failed to save stats for {ticker}: {e}")
 
+# Company models trained by default (the baseline ^BSESN is always trained)
+DEFAULT_TICKERS = [
+    "RELIANCE.NS", "NIITLTD.NS", "TCS.NS", "HDFCBANK.NS", "INFY.NS", "HINDUNILVR.NS", "BHARTIARTL.NS",
+    "KOTAKBANK.NS", "ITC.NS", "AXISBANK.NS", "MARUTI.NS", "BAJFINANCE.NS", "BAJAJFINSV.NS",
+    "HCLTECH.NS", "LUPIN.NS", "ULTRACEMCO.NS", "NTPC.NS", "WIPRO.NS", "M&M.NS", "POWERGRID.NS",
+    "SBIN.NS", "ASIANPAINT.NS", "DRREDDY.NS", "BAJAJ-AUTO.NS", "SUNPHARMA.NS", "JSWSTEEL.NS",
+    "TATAMOTORS.NS", "TITAN.NS", "HDFCLIFE.NS", "INDUSINDBK.NS", "DIVISLAB.NS", "AAPL", "SMSN.IL",
+]
+
+# Incremental retraining defaults
+INCREMENTAL_DEFAULTS = {
+    "full_refit_days": 7,   # full refit at least this often
+    "warm_rounds": 10,      # boosting rounds added per warm update
+    "warm_window": 250,     # recent rows (incl. the new ones) used for a warm update
+    "drift_z": 4.0,         # new-row feature shift (in training std devs) that forces a refit
+    "label_drift": 0.15,    # relative move of the 5%/10% label thresholds that forces a refit
+}
+
 # Training Functions
-def train_baseline_model(start, end):
+BOOSTER_PARAMS = {'objective': 'multi:softmax', 'num_class': 3, 'eval_metric': 'mlogloss', 'tree_method': 'hist'}
+
+
+def make_classifier(n_jobs=None, params=None):
+    # n_jobs=None lets XGBoost use every core; parallel runs pass their share.
+    # `params` are the tuned hyperparameters saved by tuning.py, if any.
+    return xgb.XGBClassifier(**BOOSTER_PARAMS, n_jobs=n_jobs, **(params or {}))
+
+
+def fingerprint_frame(data):
+    """Content hash of a labelled training window"""
+    hashes = pd.util.hash_pandas_object(data, index=True).to_numpy()
+    return hashlib.sha1(hashes.tobytes() + ','.join(map(str, data.columns)).encode()).hexdigest()
+
+
+def plan_update(model_dir, data, feature_cols, options, params=None):
+    """Decide between 'skip', 'warm' and 'full' for one model; returns (action, reason)"""
+    state = artifacts.read_manifest(model_dir)
+    if state is None:
+        return 'full', 'no previous model'
+    if state.get('needs_retrain') or 'fingerprint' not in state:
+        return 'full', f"previous model converted from {state.get('migrated_from', 'an older format')}"
+    if state.get('params') != params:
+        return 'full', 'hyperparameters retuned'
+    if state['fingerprint'] == fingerprint_frame(data):
+        return 'skip', 'training data unchanged'
+    if state['features'] != feature_cols:
+        return 'full', 'feature set changed'
+
+    age = (datetime.today() - datetime.fromisoformat(state['full_refit_at'])).days
+    if age >= options['full_refit_days']:
+        return 'full', f'last full refit {age} days ago'
+
+    new_rows = data[data.index > pd.Timestamp(state['last_date'])]
+    if new_rows.empty:
+        return 'full', 'history revised without new rows'
+
+    q05, q10 = data['Return'].quantile(0.05), data['Return'].quantile(0.10)
+    old_q05, old_q10 = state['label_thresholds']
+    label_shift = max(abs(q05 - old_q05) / abs(old_q05), abs(q10 - old_q10) / abs(old_q10))
+    if label_shift > options['label_drift']:
+        return 'full', f'label thresholds moved {label_shift:.0%}'
+
+    mean, std = np.array(state['feature_mean']), np.array(state['feature_std'])
+    shift = np.abs(new_rows[feature_cols].to_numpy().mean(axis=0) - mean) / np.where(std > 0, std, 1)
+    if shift.max() > options['drift_z']:
+        return 'full', f'feature drift on {feature_cols[int(shift.argmax())]} ({shift.max():.1f} sd)'
+
+    return 'warm', f'{len(new_rows)} new rows'
+
+
+def training_manifest(data, feature_cols, start, end, model, X_test, y_test,
+                      full_refit_at=None, warm_updates=0, previous=None, params=None, metrics=None):
+    """Manifest fields for a freshly trained model: window, fingerprint, metrics, drift references;
+    `metrics` replaces scoring the model on X_test"""
+    manifest = {
+        "features": feature_cols,
+        "params": params,
+        "fingerprint": fingerprint_frame(data),
+        "training_window": {"start": start, "end": end,
+                            "first_date": data.index[0].strftime('%Y-%m-%d')},
+        "rows": len(data),
+        "last_date": data.index[-1].strftime('%Y-%m-%d'),
+        "metrics": metrics or {"accuracy": float(accuracy_score(y_test, model.predict(X_test))),
+                               "test_rows": int(len(y_test))},
+        "full_refit_at": full_refit_at or datetime.today().strftime('%Y-%m-%d'),
+        "warm_updates": warm_updates,
+    }
+    if previous is not None:
+        # Drift references stay anchored to the last full refit
+        for key in ('label_thresholds', 'feature_mean', 'feature_std'):
+            manifest[key] = previous[key]
+    else:
+        X = data[feature_cols]
+        manifest["label_thresholds"] = [float(data['Return'].quantile(0.05)), float(data['Return'].quantile(0.10))]
+        manifest["feature_mean"] = X.mean().tolist()
+        manifest["feature_std"] = X.std().tolist()
+    return manifest
+
+
+def warm_update_model(model_dir, data, feature_cols, options, n_jobs=None, tuned=None):
+    """Continue boosting the saved model on the most recent rows"""
+    old_model, scaler, _ = artifacts.load_artifacts(model_dir, n_jobs)
+
+    recent = data.iloc[-options['warm_window']:]
+    dtrain = xgb.DMatrix(scaler.transform(recent[feature_cols]), label=recent['Risk'])
+    params = dict(BOOSTER_PARAMS, **{k: v for k, v in (tuned or {}).items() if k != 'n_estimators'})
+    if n_jobs:
+        params['nthread'] = n_jobs
+    # xgb.train copies the booster, so the loaded model is left untouched
+    booster = xgb.train(params, dtrain, num_boost_round=options['warm_rounds'],
+                        xgb_model=old_model.get_booster())
+
+    model = make_classifier(n_jobs, tuned)
+    model.load_model(bytearray(booster.save_raw('ubj')))
+    return model, scaler
+
+
+def _run_incremental(name, model_dir, data, feature_cols, start, end, incremental, n_jobs):
+    """Shared skip/warm handling; returns (action, model, scaler, accuracy in %)"""
+    options = dict(INCREMENTAL_DEFAULTS, **incremental)
+    params = artifacts.read_params(model_dir)
+    action, reason = plan_update(model_dir, data, feature_cols, options, params)
+    print(f"[INFO] {name}: {action} ({reason})")
+    if action == 'skip':
+        model, scaler, _ = artifacts.load_artifacts(model_dir, n_jobs)
+        return action, model, scaler, None
+    if action == 'warm':
+        with instrumentation.stage("fit", name, rows=min(len(data), options['warm_window'])) as record:
+            record["mode"] = "warm"
+            model, scaler = warm_update_model(model_dir, data, feature_cols, options, n_jobs, params)
+        previous = artifacts.read_manifest(model_dir)
+        # The warm update boosts on the most recent rows, new ones included, so no
+        # row is out of sample for it; the accuracy stays the one measured on the
+        # last full refit's held-out rows
+        artifacts.save_artifacts(model_dir, model, scaler, **training_manifest(
+            data, feature_cols, start, end, model, None, None,
+            previous['full_refit_at'], previous['warm_updates'] + 1, previous, params, previous['metrics']
+        ))
+        return action, model, scaler, previous['metrics']['accuracy'] * 100
+    return action, None, None, None
+
+
+def train_baseline_model(start, end, n_jobs=None, incremental=None, publisher=None, stats=True, data=None):
+    """Train (or with `incremental`, skip / warm-update) the baseline; `stats=False` leaves
+    model_stats to the caller, `data` is an already labelled frame to train on"""
     print(f"[INFO] Training baseline model on ^BSESN from {start} to {end}")
-    data = fetch_stock_data('^BSESN', start, end)
-    data = engineer_features(data)
-    data = label_risk(data)
+    if data is None:
+        data = prepare_training_data('^BSESN', start, end)
 
     feature_cols = [c for c in data.columns if c not in ['Risk']]
+    baseline_dir = os.path.normpath(
+        os.path.join(os.path.dirname(__file__), '..', 'model', 'baseline')
+    )
+
+    if incremental is not None:
+        action, model, scaler, accuracy = _run_incremental(
+            '^BSESN', baseline_dir, data, feature_cols, start, end, incremental, n_jobs
+        )
+        if action == 'skip':
+            return model, scaler
+        if action == 'warm':
+            if stats:
+                save_model_stats('^BSESN', model, None, None, start, publisher=publisher, accuracy=accuracy)
+            return model, scaler
+
     X = data[feature_cols]
     y = data['Risk']
 
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    with instrumentation.stage("scale", '^BSESN', rows=len(X)):
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
 
     X_train, X_test, y_train, y_test = train_test_split(
         X_scaled, y, test_size=0.2, stratify=y, random_state=42
     )
 
-    model = xgb.XGBClassifier(objective='multi:softmax', num_class=3, eval_metric='mlogloss')
-    model.fit(X_train, y_train)
+    params = artifacts.read_params(baseline_dir)
+    with instrumentation.stage("fit", '^BSESN', rows=len(X_train)):
+        model = make_classifier(n_jobs, params)
+        model.fit(X_train, y_train)
 
     # Save baseline model and scaler
-    baseline_dir = os.path.normpath(
-        os.path.join(os.path.dirname(__file__), '..', 'model', 'baseline')
-    )
-    os.makedirs(baseline_dir, exist_ok=True)
-    with open(os.path.join(baseline_dir, 'baseline_model.pkl'), 'wb') as f:
-        pickle.dump(model, f)
-    with open(os.path.join(baseline_dir, 'scaler.pkl'), 'wb') as f:
-        pickle.dump(scaler, f)
+    artifacts.save_artifacts(baseline_dir, model, scaler, **training_manifest(
+        data, feature_cols, start, end, model, X_test, y_test, params=params
+    ))
 
     print(f"[INFO] Baseline artifacts saved to {baseline_dir}")
     
     # Save model stats to MongoDB
-    save_model_stats('^BSESN', model, X_test, y_test, start)
+    if stats:
+        save_model_stats('^BSESN', model, X_test, y_test, start, publisher=publisher)
     
     return model, scaler
 
 
-def train_company_model(ticker, baseline_model, scaler, start, end):
+def train_company_model(ticker, baseline_model, scaler, start, end, n_jobs=None, incremental=None,
+                        publisher=None, stats=True, data=None):
+    """Train (or with `incremental`, skip / warm-update) one company model; None when skipped.
+    `stats=False` leaves model_stats to the caller, `data` is an already labelled frame to train on"""
     print(f"[INFO] Training model for {ticker}")
-    data = fetch_stock_data(ticker, start, end)
-    data = engineer_features(data)
-    data = label_risk(data)
+    if data is None:
+        data = prepare_training_data(ticker, start, end)
 
     feature_cols = [c for c in data.columns if c not in ['Risk']]
+    company_dir = os.path.normpath(
+        os.path.join(os.path.dirname(__file__), '..', 'model', 'models', ticker)
+    )
+
+    if incremental is not None:
+        action, model, _, accuracy = _run_incremental(
+            ticker, company_dir, data, feature_cols, start, end, incremental, n_jobs
+        )
+        if action == 'skip':
+            return None
+        if action == 'warm':
+            if stats:
+                save_model_stats(ticker, model, None, None, start, publisher=publisher, accuracy=accuracy)
+            return model
+
     X = data[feature_cols]
     y = data['Risk']
 
     # Transform or refit scaler
-    try:
-        X_scaled = scaler.transform(X)
-    except ValueError:
-        print(f"[WARNING] Feature mismatch for {ticker}, refitting scaler")
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+    with instrumentation.stage("scale", ticker, rows=len(X)):
+        try:
+            if scaler is None:
+                raise ValueError("no baseline scaler")
+            X_scaled = scaler.transform(X)
+        except ValueError as e:
+            print(f"[WARNING] Refitting the scaler for {ticker}: {e}")
+            scaler = StandardScaler()
+            X_scaled = scaler.fit_transform(X)
 
     X_train, X_test, y_train, y_test = train_test_split(
         X_scaled, y, test_size=0.2, stratify=y, random_state=42
     )
 
-    model = xgb.XGBClassifier(objective='multi:softmax', num_class=3, eval_metric='mlogloss')
-    model.fit(X_train, y_train)
+    params = artifacts.read_params(company_dir)
+    with instrumentation.stage("fit", ticker, rows=len(X_train)):
+        model = make_classifier(n_jobs, params)
+        model.fit(X_train, y_train)
 
     # Save company model and scaler
-    company_dir = os.path.normpath(
-        os.path.join(os.path.dirname(__file__), '..', 'model', 'models', ticker)
-    )
-    os.makedirs(company_dir, exist_ok=True)
-    with open(os.path.join(company_dir, 'model.pkl'), 'wb') as f:
-        pickle.dump(model, f)
-    with open(os.path.join(company_dir, 'scaler.pkl'), 'wb') as f:
-        pickle.dump(scaler, f)
+    artifacts.save_artifacts(company_dir, model, scaler, **training_manifest(
+        data, feature_cols, start, end, model, X_test, y_test, params=params
+    ))
 
     print(f"[INFO] Artifacts for {ticker} saved to {company_dir}")
     
     # Save model stats to MongoDB
-    save_model_stats(ticker, model, X_test, y_test, start)
+    if stats:
+        save_model_stats(ticker, model, X_test, y_test, start, publisher=publisher)
     
     return model
 
 
+def _train_company_job(ticker, baseline_model, scaler, start, end, n_jobs, incremental=None, run_id=None):
+    """Train one ticker and report the outcome instead of raising"""
+    started = time.perf_counter()
+    result = {"ticker": ticker, "status": "ok", "error": None, "pid": os.getpid()}
+    # Stats and stage timings go back to the parent, which writes every ticker at once
+    publisher = StatsPublisher()
+    with instrumentation.activate(instrumentation.Run("train", run_id)) as run:
+        try:
+            if train_company_model(ticker, baseline_model, scaler, start, end, n_jobs, incremental,
+                                   publisher) is None:
+                result["status"] = "skipped"
+        except Exception as e:
+            print(f"[ERROR] Failed model for {ticker}: {e}")
+            result.update(status="failed", error=str(e))
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    result["stats"] = publisher.documents()
+    result["stages"] = run.records
+    return result
+
+
+def split_thread_budget(workers, threads=None):
+    """Split a global thread budget into (process workers, XGBoost n_jobs per worker)"""
+    threads = threads or os.cpu_count() or 1
+    workers = max(1, min(workers, threads))
+    return workers, max(1, threads // workers)
+
+
 # Main Execution
-def main(tickers, start, end):
+def main(tickers, start, end, workers=1, threads=None, incremental=None):
+    workers, n_jobs = split_thread_budget(workers, threads)
+    summary = {
+        "start": start,
+        "end": end,
+        "workers": workers,
+        "threads_per_worker": n_jobs,
+        "started_at": datetime.now().isoformat(timespec='seconds'),
+        "baseline": None,
+        "tickers": [],
+    }
+    run_started = time.perf_counter()
+    publisher = StatsPublisher()
+    run = instrumentation.start_run("train")
+
+    # The baseline runs alone, so it gets the whole thread budget
+    baseline_started = time.perf_counter()
     try:
-        baseline_model, scaler = train_baseline_model(start, end)
-        for ticker in tickers:
-            try:
-                train_company_model(ticker, baseline_model, scaler, start, end)
-            except Exception as e:
-                print(f"[ERROR] Failed model for {ticker}: {e}")
-        print("[INFO] All company models trained successfully.")
+        baseline_model, scaler = train_baseline_model(start, end, n_jobs * workers, incremental, publisher)
+        summary["baseline"] = {"ticker": '^BSESN', "status": "ok", "error": None}
+    except Exception as e:
+        # Company models do not need the baseline; they fit their own scaler instead
+        print(f"[ERROR] Baseline training failed: {e}")
+        baseline_model, scaler = None, None
+        summary["baseline"] = {"ticker": '^BSESN', "status": "failed", "error": str(e)}
+    summary["baseline"]["seconds"] = round(time.perf_counter() - baseline_started, 3)
+
+    try:
+        if workers == 1:
+            for ticker in tickers:
+                summary["tickers"].append(
+                    _train_company_job(ticker, baseline_model, scaler, start, end, n_jobs, incremental,
+                                       run.run_id)
+                )
+        else:
+            # spawn rather than fork: the parent has already started OpenMP threads
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {
+                    pool.submit(_train_company_job, ticker, baseline_model, scaler, start, end, n_jobs,
+                                incremental, run.run_id): ticker
+                    for ticker in tickers
+                }
+                for future in as_completed(futures):
+                    try:
+                        summary["tickers"].append(future.result())
+                    except Exception as e:
+                        # The worker process itself died
+                        print(f"[ERROR] Worker failed for {futures[future]}: {e}")
+                        summary["tickers"].append({
+                            "ticker": futures[future], "status": "failed", "error": str(e),
+                            "pid": None, "seconds": None,
+                        })
     except Exception as e:
         print(f"[ERROR] Training aborted: {e}")
+        summary["aborted"] = str(e)
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--tickers', nargs='+',
-         default=[
-           "RELIANCE.NS","NIITLTD.NS","TCS.NS","HDFCBANK.NS","INFY.NS","HINDUNILVR.NS","BHARTIARTL.NS",
-           "KOTAKBANK.NS","ITC.NS","AXISBANK.NS","MARUTI.NS","BAJFINANCE.NS","BAJAJFINSV.NS",
-           "HCLTECH.NS","LUPIN.NS","ULTRACEMCO.NS","NTPC.NS","WIPRO.NS","M&M.NS","POWERGRID.NS",
-           "SBIN.NS","ASIANPAINT.NS","DRREDDY.NS","BAJAJ-AUTO.NS","SUNPHARMA.NS","JSWSTEEL.NS",
-           "TATAMOTORS.NS","TITAN.NS","HDFCLIFE.NS","INDUSINDBK.NS","DIVISLAB.NS","AAPL","SMSN.IL"
-         ],
-         help='List of tickers'
+    for result in summary["tickers"]:
+        publisher.extend(result.pop("stats", None) or [])
+        run.extend(result.pop("stages", None) or [])
+    try:
+        with instrumentation.stage("write", rows=len(publisher.documents())):
+            summary["stats"] = publisher.publish()
+    except Exception as e:
+        print(f"[ERROR] Failed to publish model stats: {e}")
+        summary["stats"] = {"error": str(e)}
+
+    summary["seconds"] = round(time.perf_counter() - run_started, 3)
+    summary["finished_at"] = datetime.now().isoformat(timespec='seconds')
+    summary["succeeded"] = [r["ticker"] for r in summary["tickers"] if r["status"] == "ok"]
+    summary["skipped"] = [r["ticker"] for r in summary["tickers"] if r["status"] == "skipped"]
+    summary["failed"] = [r["ticker"] for r in summary["tickers"] if r["status"] == "failed"]
+
+    print(f"[INFO] Trained {len(summary['succeeded'])}/{len(tickers)} company models "
+          f"({len(summary['skipped'])} unchanged) in "
+          f"{summary['seconds']}s ({workers} workers x {n_jobs} threads)")
+    if summary["failed"]:
+        print(f"[WARNING] Failed tickers: {', '.join(summary['failed'])}")
+    baseline_failed = summary["baseline"] is None or summary["baseline"]["status"] != "ok"
+    instrumentation.finish_run(
+        "failed" if baseline_failed or summary["failed"] or "aborted" in summary else "ok",
+        succeeded=summary["succeeded"], skipped=summary["skipped"], failed=summary["failed"],
+        workers=workers, threads_per_worker=n_jobs,
     )
-    parser.add_argument('--start', type=str, default='2015-01-01', help='Start date')
-    parser.add_argument('--end', type=str, default=datetime.today().strftime('%Y-%m-%d'), help='End date')
-    args = parser.parse_args()
-    main(args.tickers, args.start, args.end)
\ No newline at end of file
+    return summary
@@ -0,0 +1,184 @@
+import os
+import sys
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import xgboost as xgb
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'dataset')))
+import instrumentation
+import artifacts
+import train_update
+
+# Hyperparameter search for the baseline and per-ticker classifiers
+# (train_update.py --tune). For each ticker:
+#   * the labelled history is split in time order, the last 20% validating;
+#     the training rows become one QuantileDMatrix (histogram bins computed
+#     once) that every trial shares, and the validation rows reuse its bins
+#   * random configurations race by successive halving: every survivor boosts
+#     up to the rung's round budget, continuing its own booster, and only the
+#     best 1/halving by validation log loss move on to the next, larger rung
+#   * each trial early-stops when the validation loss stops improving
+#   * trials of a rung run on a thread pool; the thread budget is split
+#     between parallel trials and XGBoost threads per trial
+# The winner's parameters, with n_estimators set to its best iteration, are
+# saved as params.json next to the ticker's model and used by the next training
+# run (the manifest records them, so an incremental run refits on a change).
+
+SEARCH_DEFAULTS = {
+    "trials": 27,            # random configurations per ticker (first rung)
+    "halving": 3,            # keep the best 1/halving of the trials at each rung
+    "min_rounds": 25,        # round budget of the first rung
+    "max_rounds": 675,       # round budget of the last rung
+    "early_stopping": 20,    # rounds without validation improvement before a trial stops
+    "validation": 0.2,       # most recent fraction of rows used for validation
+    "max_bin": 256,
+    "seed": 42,
+}
+
+# XGBoost's own defaults; always tried first so tuning never loses to them on validation
+DEFAULT_CONFIG = {"learning_rate": 0.3, "max_depth": 6, "min_child_weight": 1.0, "subsample": 1.0,
+                  "colsample_bytree": 1.0, "reg_lambda": 1.0, "gamma": 0.0}
+
+
+def sample_config(rng):
+    return {
+        "learning_rate": float(math.exp(rng.uniform(math.log(0.02), math.log(0.3)))),
+        "max_depth": int(rng.integers(2, 11)),
+        "min_child_weight": float(math.exp(rng.uniform(0.0, math.log(20.0)))),
+        "subsample": float(rng.uniform(0.5, 1.0)),
+        "colsample_bytree": float(rng.uniform(0.4, 1.0)),
+        "reg_lambda": float(math.exp(rng.uniform(math.log(0.1), math.log(10.0)))),
+        "gamma": float(rng.choice([0.0, 0.0, 0.1, 0.5, 1.0])),
+    }
+
+
+def time_split(data, validation):
+    """(X_train, y_train, X_valid, y_valid) with the most recent rows held out for validation"""
+    feature_cols = [c for c in data.columns if c != 'Risk']
+    X = data[feature_cols].to_numpy(dtype=np.float32)
+    y = data['Risk'].to_numpy()
+    cut = int(len(data) * (1 - validation))
+    return X[:cut], y[:cut], X[cut:], y[cut:]
+
+
+class Trial:
+    """One configuration and the booster it has grown so far"""
+
+    def __init__(self, number, config):
+        self.number = number
+        self.config = config
+        self.booster = None
+        self.losses = []
+
+    @property
+    def rounds(self):
+        return len(self.losses)
+
+    @property
+    def best_loss(self):
+        return min(self.losses) if self.losses else math.inf
+
+    @property
+    def best_rounds(self):
+        return int(np.argmin(self.losses)) + 1
+
+    def stopped(self, patience):
+        return bool(self.losses) and self.rounds - self.best_rounds >= patience
+
+    def grow(self, dtrain, dvalid, budget, options, nthread):
+        """Boost up to `budget` rounds in total, stopping early on the validation loss"""
+        patience = options["early_stopping"]
+        if self.rounds >= budget or self.stopped(patience):
+            return self
+        params = dict(train_update.BOOSTER_PARAMS, nthread=nthread, seed=options["seed"],
+                      max_bin=options["max_bin"], **self.config)
+        history = {}
+        # Continuing from the previous rung's booster; early stopping here restarts its own
+        # counter, so the patience is also checked across rungs above
+        self.booster = xgb.train(
+            params, dtrain, num_boost_round=budget - self.rounds, xgb_model=self.booster,
+            evals=[(dvalid, 'valid')], evals_result=history, early_stopping_rounds=patience,
+            verbose_eval=False,
+        )
+        self.losses.extend(history['valid']['mlogloss'])
+        return self
+
+
+def successive_halving(dtrain, dvalid, configs, options, workers, nthread):
+    """Race the configurations; returns every trial, best first"""
+    trials = [Trial(i, config) for i, config in enumerate(configs)]
+    alive, budget = trials, options["min_rounds"]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            list(pool.map(lambda t: t.grow(dtrain, dvalid, budget, options, nthread), alive))
+            alive = sorted(alive, key=lambda t: t.best_loss)
+            if budget >= options["max_rounds"] or len(alive) == 1:
+                break
+            alive = alive[:max(1, len(alive) // options["halving"])]
+            budget = min(options["max_rounds"], budget * options["halving"])
+    return sorted(trials, key=lambda t: t.best_loss)
+
+
+def tune_ticker(ticker, model_dir, start, end, options=None, workers=1, nthread=1):
+    """Search hyperparameters for one ticker and save the best to model_dir; returns a summary"""
+    options = dict(SEARCH_DEFAULTS, **(options or {}))
+    data = train_update.prepare_training_data(ticker, start, end)
+    X_train, y_train, X_valid, y_valid = time_split(data, options["validation"])
+
+    # Binned once; every trial and rung trains on the same quantized matrix
+    dtrain = xgb.QuantileDMatrix(X_train, label=y_train, max_bin=options["max_bin"], nthread=nthread * workers)
+    dvalid = xgb.QuantileDMatrix(X_valid, label=y_valid, ref=dtrain, nthread=nthread * workers)
+
+    rng = np.random.default_rng(options["seed"])
+    configs = [DEFAULT_CONFIG] + [sample_config(rng) for _ in range(options["trials"] - 1)]
+
+    with instrumentation.stage("tune", ticker, rows=len(X_train)) as record:
+        trials = successive_halving(dtrain, dvalid, configs, options, workers, nthread)
+        record["trials"] = len(trials)
+        record["boosting_rounds"] = sum(t.rounds for t in trials)
+
+    best, default = trials[0], next(t for t in trials if t.number == 0)
+    params = dict(best.config, n_estimators=best.best_rounds, max_bin=options["max_bin"])
+    summary = {
+        "ticker": ticker,
+        "validation_mlogloss": round(best.best_loss, 6),
+        "default_mlogloss": round(default.best_loss, 6),
+        "trials": len(trials),
+        "boosting_rounds": sum(t.rounds for t in trials),
+        "train_rows": int(len(X_train)),
+        "validation_rows": int(len(X_valid)),
+    }
+    artifacts.save_params(model_dir, params, search=options, training_window={"start": start, "end": end},
+                          **{k: v for k, v in summary.items() if k != "ticker"})
+    return summary
+
+
+def main(tickers, start, end, workers=1, threads=None, options=None):
+    """Tune the baseline and every ticker in turn; each ticker's trials share the thread budget"""
+    workers, nthread = train_update.split_thread_budget(workers, threads)
+    tickers = list(dict.fromkeys(['^BSESN'] + list(tickers)))
+    instrumentation.start_run("tune")
+    started, results, failed = time.perf_counter(), [], []
+    try:
+        for ticker in tickers:
+            model_dir = artifacts.BASELINE_DIR if ticker == '^BSESN' else os.path.join(artifacts.MODELS_DIR, ticker)
+            ticker_started = time.perf_counter()
+            try:
+                summary = tune_ticker(ticker, model_dir, start, end, options, workers, nthread)
+            except Exception as e:
+                print(f"[ERROR] Tuning failed for {ticker}: {e}")
+                failed.append(ticker)
+                continue
+            results.append(summary)
+            print(f"[INFO] {ticker}: validation mlogloss {summary['validation_mlogloss']:.4f} "
+                  f"(defaults {summary['default_mlogloss']:.4f}), {summary['boosting_rounds']} rounds "
+                  f"over {summary['trials']} trials in {time.perf_counter() - ticker_started:.1f}s")
+    finally:
+        print(f"[INFO] Tuned {len(results)}/{len(tickers)} models in {time.perf_counter() - started:.1f}s "
+              f"({workers} trials x {nthread} threads); the next training run uses the saved parameters")
+        instrumentation.finish_run("failed" if failed else "ok", tuned=[r["ticker"] for r in results],
+                                   failed=failed, workers=workers, threads_per_worker=nthread)
+    return results